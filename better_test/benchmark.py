@@ -0,0 +1,287 @@
+"""
+Benchmarks of the test runner's own overhead: synthetic test suites run in
+each mode, measuring what the runner costs on top of the tests themselves.
+"""
+from __future__ import absolute_import
+from contextlib import contextmanager
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from . import core
+from .parallel import Pool
+from .parallel import SilentMultiProcessingTextTestResult
+from .utils import simple_weighted_partition
+from .utils import weighted_partition
+
+MODES = {
+    'standard': core.STANDARD,
+    'parallel': core.PARALLEL,
+    'isolated': core.ISOLATED,
+}
+
+NOOP_CLASS = '''
+
+class Tests{index}(unittest.TestCase):
+{methods}
+'''
+
+NOOP_METHOD = '''    def test_{index}(self):
+        pass
+'''
+
+SETUP_CLASS = '''
+
+class Tests{index}(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(Tests{index}, cls).setUpClass()
+        time.sleep({setup})
+{methods}
+'''
+
+DATABASE_CLASS = '''
+
+class Tests{index}(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+{methods}
+'''
+
+DATABASE_METHOD = '''    def test_{index}(self):
+        with connection.cursor() as cursor:
+            for _ in range({queries}):
+                cursor.execute('SELECT 1')
+'''
+
+HEADERS = {
+    'noop': 'import unittest\n',
+    'setup': 'import time\nimport unittest\n',
+    'database': (
+        'from django.db import connection\nfrom django.test import TestCase\n'
+    ),
+}
+
+
+def generate_suites(directory, scale=1.0):
+    """
+    Write the benchmark suites as modules into `directory`. Returns
+    `{suite: (module, number of tests)}`.
+
+    - `noop`: 10000 tests that do nothing, in classes of 100
+    - `small_classes`: the same number of tests in classes of 2
+    - `setup`: 40 classes of 5 tests with a `setUpClass` that takes 50ms
+    - `database`: 50 Django test cases of 10 tests making 5 queries each
+    """
+    size = lambda count: max(1, int(count * scale))
+    suites = {
+        'noop': ('noop', size(100), 100, {}),
+        'small_classes': ('noop', size(5000), 2, {}),
+        'setup': ('setup', size(40), 5, {'setup': 0.05}),
+        'database': ('database', size(50), 10, {'queries': 5}),
+    }
+    generated = {}
+    for suite, (kind, classes, methods, options) in suites.items():
+        module = 'better_test_benchmark_{0}'.format(suite)
+        with open(os.path.join(directory, module + '.py'), 'w') as fobj:
+            fobj.write(HEADERS[kind])
+            for index in range(classes):
+                fobj.write(_generate_class(kind, index, methods, options))
+        generated[suite] = (module, classes * methods)
+    return generated
+
+
+def _generate_class(kind, index, methods, options):
+    if kind == 'database':
+        template, method = DATABASE_CLASS, DATABASE_METHOD
+    else:
+        template = SETUP_CLASS if kind == 'setup' else NOOP_CLASS
+        method = NOOP_METHOD
+    return template.format(
+        index=index,
+        methods='\n'.join(
+            method.format(index=number, **options)
+            for number in range(methods)
+        ),
+        **options
+    )
+
+
+@contextmanager
+def measure_pool():
+    """
+    Count the results the pool handles in `handle_results`, and the time it
+    spends receiving and handling them, not counting the time it waits for
+    them.
+    """
+    stats = {'results': 0, 'seconds': 0.0}
+    receive = Pool.receive
+    handle_result = Pool.handle_result
+
+    def timed_receive(self, worker):
+        start = time.time()
+        try:
+            return receive(self, worker)
+        finally:
+            stats['seconds'] += time.time() - start
+
+    def counted_handle_result(self, worker, record):
+        stats['results'] += 1
+        return handle_result(self, worker, record)
+
+    Pool.receive = timed_receive
+    Pool.handle_result = counted_handle_result
+    try:
+        yield stats
+    finally:
+        Pool.receive = receive
+        Pool.handle_result = handle_result
+
+
+def partition_quality(timings, partitions):
+    """
+    How much longer than the ideal the slowest of `partitions` would take,
+    when the tests with `timings` are split up front: 1.0 is perfect.
+    """
+    if not timings:
+        return {}
+    data = [(timing, label) for label, timing in timings.items()]
+    ideal = max(
+        sum(timings.values()) / partitions, max(timings.values())
+    ) or 1.0
+    quality = {}
+    for name, partition in (
+            ('simple_weighted_partition', simple_weighted_partition),
+            ('weighted_partition', weighted_partition)):
+        start = time.time()
+        parts = partition(data, partitions)
+        quality[name] = {
+            'makespan': max(sum(timings[label] for label in part)
+                            for part in parts) / ideal,
+            'seconds': time.time() - start,
+        }
+    return quality
+
+
+def run_benchmark(suite, label, tests, mode, processes, test_runner_class,
+                  limit=None):
+    """
+    Run the tests of module `label` in `mode`, the first `limit` only if
+    given, and measure the runner.
+    """
+    labels = [label]
+    select = None
+    if limit is not None and limit < tests:
+        select = lambda labels: labels[:limit]
+        tests = limit
+    config = core.Config(
+        test_runner_class=test_runner_class,
+        mode=MODES[mode],
+        timings={},
+        processes=processes,
+        verbosity=0,
+        select=select,
+    )
+    with measure_pool() as pool_stats:
+        result = core.run(
+            labels, {'verbosity': 0, 'interactive': False}, config,
+            real_result_class=SilentMultiProcessingTextTestResult
+        )
+    workers = processes if mode != 'standard' else 1
+    test_time = sum(result.timings.values())
+    startup = [times['total'] for times in result.startup_times]
+    return {
+        'suite': suite,
+        'mode': mode,
+        'tests': tests,
+        'tests_run': result.tests_run,
+        'success': result.success,
+        'wall_time': result.time_taken,
+        'test_time': test_time,
+        'overhead_per_test': (
+            (result.time_taken * workers - test_time) /
+            max(result.tests_run, 1)
+        ),
+        'parent_cpu': result.coordinator_cpu,
+        'results_handled': pool_stats['results'],
+        'handling_time': pool_stats['seconds'],
+        'throughput': (
+            pool_stats['results'] / pool_stats['seconds']
+            if pool_stats['seconds'] else None
+        ),
+        'predicted_time': result.predicted_time,
+        'worker_startup': sum(startup) / len(startup) if startup else None,
+        'partition': partition_quality(result.timings, workers),
+    }
+
+
+def benchmark(test_runner_class, suites=None, modes=None, processes=2,
+              scale=1.0, isolated_limit=500, repeat=1):
+    """
+    Run the benchmarks, returns their results in a JSON serializable form.
+    Each suite and mode is run `repeat` times, keeping the fastest run.
+    Isolated mode only runs the first `isolated_limit` tests of a suite.
+    """
+    import django
+    started = time.time()
+    directory = tempfile.mkdtemp()
+    sys.path.insert(0, directory)
+    try:
+        generated = generate_suites(directory, scale)
+        results = []
+        for suite in sorted(suites or generated):
+            label, tests = generated[suite]
+            for mode in modes or sorted(MODES):
+                limit = isolated_limit if mode == 'isolated' else None
+                runs = [
+                    run_benchmark(
+                        suite, label, tests, mode, processes,
+                        test_runner_class, limit
+                    )
+                    for _ in range(repeat)
+                ]
+                results.append(min(runs, key=lambda run: run['wall_time']))
+    finally:
+        sys.path.remove(directory)
+        shutil.rmtree(directory)
+    return {
+        'started': started,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'processes': processes,
+        'scale': scale,
+        'results': results,
+    }
+
+
+def compare(old, new):
+    """
+    `(suite, mode, metric, old value, new value)` of the wall time, parent
+    CPU, overhead per test and worker startup time of the benchmarks in both
+    `old` and `new`.
+    """
+    previous = dict(
+        ((result['suite'], result['mode']), result)
+        for result in old['results']
+    )
+    changes = []
+    for result in new['results']:
+        before = previous.get((result['suite'], result['mode']))
+        if before is None:
+            continue
+        for metric in ('wall_time', 'parent_cpu', 'overhead_per_test',
+                       'worker_startup'):
+            # Results written before worker startup was measured lack it
+            if before.get(metric) is None or result[metric] is None:
+                continue
+            changes.append((
+                result['suite'], result['mode'], metric, before[metric],
+                result[metric]
+            ))
+    return changes
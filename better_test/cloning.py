@@ -0,0 +1,181 @@
+from __future__ import absolute_import
+import os
+import shutil
+import sqlite3
+import tempfile
+
+
+def is_in_memory_sqlite(connection):
+    name = connection.settings_dict['NAME'] or ''
+    return (
+        connection.vendor == 'sqlite' and
+        (name == ':memory:' or 'mode=memory' in name)
+    )
+
+
+def _mirrors():
+    from django.db import connections
+    return dict(
+        (alias, connections[alias].settings_dict.get('TEST', {}).get('MIRROR'))
+        for alias in connections
+        if connections[alias].settings_dict.get('TEST', {}).get('MIRROR')
+    )
+
+
+class DatabaseTemplate(object):
+    """
+    Test databases built once in the parent process and cloned for every
+    worker, instead of each worker building its own (and running all
+    migrations to do so).
+
+    In-memory sqlite databases are dumped to a file once using the sqlite
+    backup API and restored into each worker's own in-memory database. Other
+    databases are cloned using the backend's `clone_test_db` (a file copy for
+    sqlite, `CREATE DATABASE ... TEMPLATE` for PostgreSQL).
+
+    Only the databases of `aliases` are cloned, all of them by default.
+    """
+    def __init__(self, runner_class, runner_options, aliases=None):
+        self.runner = runner_class(**runner_options)
+        self.aliases = aliases
+        self.verbosity = self.runner.verbosity
+        self.old_config = None
+        self.dump_dir = None
+        self.dumps = {}
+        self.clones = {}
+
+    @staticmethod
+    def supported():
+        """
+        Whether all test databases can be cloned. Cloning anything but
+        in-memory sqlite databases needs Django 1.9 or later, and backend
+        support.
+        """
+        from django.db import connections
+        mirrors = _mirrors()
+        for alias in connections:
+            if alias in mirrors:
+                continue
+            connection = connections[alias]
+            test_name = connection.settings_dict.get('TEST', {}).get('NAME')
+            if connection.vendor == 'sqlite' and test_name in (
+                    None, '', ':memory:'):
+                continue
+            if not hasattr(connection.creation, 'clone_test_db'):
+                return False
+            if connection.vendor not in ('sqlite', 'postgresql', 'mysql'):
+                return False
+        return True
+
+    def setup(self):
+        from django.db import connections
+        self.old_config = self.runner.setup_databases()
+        mirrors = _mirrors()
+        for alias in connections:
+            if alias in mirrors or not self.cloned(alias):
+                continue
+            connection = connections[alias]
+            if is_in_memory_sqlite(connection):
+                if self.dump_dir is None:
+                    self.dump_dir = tempfile.mkdtemp(prefix='better-test-')
+                path = os.path.join(self.dump_dir, alias + '.sqlite3')
+                connection.ensure_connection()
+                target = sqlite3.connect(path)
+                try:
+                    copy_sqlite(connection.connection, target)
+                finally:
+                    target.close()
+                self.dumps[alias] = path
+            else:
+                # PostgreSQL refuses to use a database with open connections
+                # as a template.
+                connection.close()
+
+    def clone(self, slot):
+        """
+        Clone the template databases for the worker in `slot`, replacing any
+        clone an earlier worker in that slot left behind. Returns the settings
+        the worker has to use for each database alias.
+        """
+        from django.db import connections
+        mirrors = _mirrors()
+        clones = {}
+        for alias in connections:
+            if alias in mirrors or not self.cloned(alias):
+                continue
+            connection = connections[alias]
+            clone = {
+                'NAME': connection.settings_dict['NAME'],
+                'SERIALIZED': getattr(
+                    connection, '_test_serialized_contents', None
+                ),
+                'RESTORE': self.dumps.get(alias),
+            }
+            if alias not in self.dumps:
+                suffix = str(slot)
+                # Without keepdb, an existing clone is dropped and replaced,
+                # it may hold the data of a crashed or recycled worker, or
+                # the schema of an earlier run.
+                connection.creation.clone_test_db(
+                    suffix, self.verbosity, autoclobber=True, keepdb=False
+                )
+                connection.close()
+                clone['NAME'] = connection.creation.get_test_db_clone_settings(
+                    suffix
+                )['NAME']
+                self.clones.setdefault(alias, set()).add(clone['NAME'])
+            clones[alias] = clone
+        for alias, target in mirrors.items():
+            if target in clones:
+                clones[alias] = clones[target]
+        return clones
+
+    def destroy_clones(self):
+        from django.db import connections
+        for alias, names in self.clones.items():
+            for name in names:
+                connections[alias].creation._destroy_test_db(
+                    name, self.verbosity
+                )
+        self.clones = {}
+
+    def cloned(self, alias):
+        return self.aliases is None or alias in self.aliases
+
+    def teardown(self):
+        self.destroy_clones()
+        if self.dump_dir is not None:
+            shutil.rmtree(self.dump_dir, ignore_errors=True)
+        self.runner.teardown_databases(self.old_config)
+
+
+def copy_sqlite(source, target):
+    """
+    Copy the contents of one sqlite connection's database into another's.
+    """
+    if hasattr(source, 'backup'):
+        source.backup(target)
+    else:
+        target.executescript('\n'.join(source.iterdump()))
+
+
+def use_clones(clones):
+    """
+    Point this worker's connections at the databases cloned for it.
+    """
+    from django.conf import settings
+    from django.db import connections
+    for alias, clone in clones.items():
+        connection = connections[alias]
+        connection.close()
+        settings.DATABASES[alias]['NAME'] = clone['NAME']
+        connection.settings_dict['NAME'] = clone['NAME']
+        if clone['SERIALIZED'] is not None:
+            connection._test_serialized_contents = clone['SERIALIZED']
+        if clone['RESTORE'] is not None:
+            connection.ensure_connection()
+            source = sqlite3.connect(clone['RESTORE'])
+            try:
+                copy_sqlite(source, connection.connection)
+            finally:
+                source.close()
@@ -15,7 +15,19 @@ else:
     import unittest
 
 
+try:
+    from multiprocessing.connection import wait as wait_for_connections
+except ImportError:
+    wait_for_connections = None
+
+
 try:
     get_multiprocessing_context = multiprocessing.get_context
 except AttributeError:
     get_multiprocessing_context = lambda method: multiprocessing
+
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
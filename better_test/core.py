@@ -1,10 +1,15 @@
 from __future__ import absolute_import
+import os
 import time
 
 from .parallel import Pool
 from .parallel import MultiProcessingTextTestResult
+from .scheduler import ChunkScheduler
+from .scheduler import WorkStealingScheduler
+from .utils import prioritize
+from .utils import shard
 from .utils import suite_to_labels
-from .utils import simple_weighted_partition
+from .utils import weighted_partition
 from .compat import unittest
 
 ISOLATED = 1
@@ -15,7 +20,11 @@ STANDARD = 0
 class Result(object):
     def __init__(self, tests_run, time_taken, timings, failures, errors,
                  skipped, expected_failures, unexpected_successes,
-                 failed_executors, successes, test_labels):
+                 failed_executors, successes, test_labels,
+                 predicted_time=None, ideal_time=None, coordinator_cpu=None,
+                 not_run=(), class_timings=None, memory=None, queries=None,
+                 processes=None, peak_rss=None, startup_times=(),
+                 class_queries=None):
         self.tests_run = tests_run
         self.time_taken = time_taken
         self.timings = timings
@@ -27,6 +36,26 @@ class Result(object):
         self.failed_executors = failed_executors
         self.successes = successes
         self.test_labels = test_labels
+        self.predicted_time = predicted_time
+        self.ideal_time = ideal_time
+        self.coordinator_cpu = coordinator_cpu
+        # Labels of the tests that were not run because of failfast
+        self.not_run = not_run
+        # {class: {phase: seconds}} spent in class fixtures
+        self.class_timings = class_timings or {}
+        # {test: [rss delta, rss, traced peak]} in bytes, if measured
+        self.memory = memory or {}
+        # {test: [queries, seconds]} of database queries, if counted
+        self.queries = queries or {}
+        # {class: [queries, seconds]} made in class fixtures, if counted
+        self.class_queries = class_queries or {}
+        # Number of local worker processes the run was allowed
+        self.processes = processes
+        # The most memory any local worker used, in bytes
+        self.peak_rss = peak_rss
+        # [{'slot', 'total', 'django', 'databases'}] seconds each worker took
+        # to start
+        self.startup_times = startup_times
 
     @property
     def total_results(self):
@@ -62,7 +91,12 @@ class Result(object):
 
 class Config(object):
     def __init__(self, test_runner_class, mode, timings, processes,
-                 verbosity=1, debug=False, start_method='spawn'):
+                 verbosity=1, debug=False, start_method='spawn',
+                 max_tests_per_worker=0, max_worker_memory=0, recorder=None,
+                 probes=(), select=None, priority=(), failfast=False,
+                 timeout=0, listen=None, authkey=None, shard=None,
+                 discovery_cache=None, setup_costs=None, profile=None,
+                 auto_processes=False, pin_workers=False):
         self.test_runner_class = test_runner_class
         self.mode = mode
         self.timings = timings
@@ -70,54 +104,132 @@ class Config(object):
         self.verbosity = verbosity
         self.debug = debug
         self.start_method = start_method
+        self.max_tests_per_worker = max_tests_per_worker
+        self.max_worker_memory = max_worker_memory
+        self.recorder = recorder
+        self.probes = probes
+        # Picks the tests to run out of all the discovered ones
+        self.select = select
+        # Labels of tests (or their classes, modules or apps) to run first
+        self.priority = priority
+        self.failfast = failfast
+        self.timeout = timeout
+        # `(host, port)` to accept agents running workers on other machines on
+        self.listen = listen
+        self.authkey = authkey
+        # `(index, count)` to only run one of `count` balanced shards
+        self.shard = shard
+        # A discovery.DiscoveryCache to get the labels from without importing
+        # all test modules
+        self.discovery_cache = discovery_cache
+        # Seconds the fixtures of each test class take to set up and tear
+        # down
+        self.setup_costs = setup_costs or {}
+        # A profiling.ProfileCollector to profile the tests into
+        self.profile = profile
+        # Whether `processes` was picked to fit the machine, in which case no
+        # more workers are started than there are units of work to give them
+        self.auto_processes = auto_processes
+        # Pin each local worker to its own CPU
+        self.pin_workers = pin_workers
 
 
 def run(test_labels, test_runner_options, config,
         real_result_class=MultiProcessingTextTestResult):
     test_runner = config.test_runner_class(**test_runner_options)
 
-    suite = test_runner.build_suite(test_labels)
-
     # Get an actual result class we can use
     pseudo_runner = unittest.TextTestRunner(
         resultclass=real_result_class,
         verbosity=config.verbosity,
     )
     real_result = pseudo_runner._makeResult()
+    real_result.recorder = config.recorder
+    real_result.profiler = config.profile
 
-    all_test_labels = suite_to_labels(suite, real_result)
+    if config.discovery_cache is not None:
+        all_test_labels = config.discovery_cache.discover(
+            test_runner, test_labels, real_result
+        )
+    else:
+        suite = test_runner.build_suite(test_labels)
+        all_test_labels = suite_to_labels(suite, real_result)
+    if config.recorder is not None:
+        config.recorder.forget_missing(test_labels, all_test_labels)
+    if config.select is not None:
+        all_test_labels = config.select(all_test_labels)
+    if config.shard is not None:
+        all_test_labels = shard(
+            all_test_labels, config.timings, *config.shard,
+            setup_costs=config.setup_costs
+        )
+    first = prioritize(all_test_labels, config.priority)
+    if first:
+        rest = set(all_test_labels) - set(first)
+        all_test_labels = first + [
+            label for label in all_test_labels if label in rest
+        ]
 
+    probes = tuple(config.probes)
+    if config.profile is not None:
+        probes += (config.profile.get_probe(all_test_labels, config.timings), )
+
+    processes = config.processes
+    predicted_time = ideal_time = None
     if config.mode == ISOLATED:
         # Isolate means one test (label) per task process.
-        chunks = [
+        scheduler = ChunkScheduler([
             [label] for label in all_test_labels
-        ]
+        ])
+        if config.auto_processes:
+            processes = max(1, min(processes, len(all_test_labels)))
     elif config.mode == PARALLEL:
-        # Try to distribute the test labels equally across the available
-        # CPU cores
-        chunk_count = config.processes
-        weighted_chunks = [
-            (config.timings.get(label, 0), label)
-            for label in all_test_labels
-        ]
-        # Try to split the tests into chunks of equal time, not equal size
-        chunks = simple_weighted_partition(weighted_chunks, chunk_count)
-
-        # filter empty chunks
-        chunks = list(filter(bool, chunks))
+        # Workers pull batches from a shared queue, longest tests first, so
+        # they all finish at about the same time even if the timings are off.
+        scheduler = WorkStealingScheduler(
+            config.timings, all_test_labels, processes, first=first,
+            setup_costs=config.setup_costs
+        )
+        if config.auto_processes:
+            processes = max(1, min(processes, len(scheduler.unit_weights)))
+            scheduler.workers = processes
+        predicted_time, ideal_time = predict_time(
+            scheduler.unit_weights, processes
+        )
     elif config.mode == STANDARD:
-        chunks = [all_test_labels]
+        # An empty list of labels would make the worker discover all tests
+        scheduler = ChunkScheduler([all_test_labels] if all_test_labels else [])
     else:
         raise ValueError("Unknown mode: {0}".format(config.mode))
 
     start_time = time.time()
-    pool = Pool(real_result, config.processes, config.start_method)
+    start_cpu = sum(os.times()[:2])
+    pool = Pool(
+        real_result,
+        processes,
+        config.start_method,
+        # Isolation needs a fresh process for every chunk
+        reuse_workers=config.mode != ISOLATED,
+        max_tests_per_worker=config.max_tests_per_worker,
+        max_worker_memory=config.max_worker_memory,
+        # Import everything once and fork each isolated test from there
+        preload_labels=all_test_labels if config.mode == ISOLATED else None,
+        # Build the test databases once and clone them for each worker
+        clone_databases=config.mode != STANDARD,
+        probes=probes,
+        failfast=config.failfast,
+        timeout=config.timeout,
+        listen=config.listen,
+        authkey=config.authkey,
+        pin_workers=config.pin_workers,
+    )
     failed_executors = pool.run(
-        chunks,
+        scheduler,
         config.test_runner_class,
         test_runner_options
     )
     end_time = time.time()
+    coordinator_cpu = sum(os.times()[:2]) - start_cpu
 
     # Report result, this is mostly taken from TextTestRunner.run
     time_taken = end_time - start_time
@@ -136,4 +248,33 @@ def run(test_labels, test_runner_options, config,
         failed_executors=failed_executors,
         successes=real_result.successes,
         test_labels=all_test_labels,
+        predicted_time=predicted_time,
+        ideal_time=ideal_time,
+        coordinator_cpu=coordinator_cpu,
+        not_run=pool.not_run,
+        class_timings=real_result.class_timings,
+        memory=real_result.memory,
+        queries=real_result.queries,
+        processes=processes,
+        peak_rss=pool.peak_rss,
+        startup_times=pool.startup_times,
+        class_queries=real_result.class_queries,
+    )
+
+
+def predict_time(weights, processes):
+    """
+    Predict how long running the units of work (tests, or classes of tests)
+    with the estimated durations in `weights` takes on `processes` workers,
+    and how long it would take if the work could be split perfectly.
+    """
+    if not weights:
+        return 0, 0
+    partitions = weighted_partition(
+        [(weight, label) for label, weight in weights.items()], processes
+    )
+    predicted = max(
+        sum(weights[label] for label in partition) for partition in partitions
     )
+    ideal = max(sum(weights.values()) / processes, max(weights.values()))
+    return predicted, ideal
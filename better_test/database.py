@@ -1,23 +1,723 @@
 import json
+import math
 import os
+import sqlite3
+import time
+
+from .impact import git_blob
+from .utils import fixture_names
+from .utils import name_to_label
+
+
+# Bump when changing SCHEMA, databases of other versions are rebuilt
+SCHEMA_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    finished REAL,
+    success INTEGER,
+    config TEXT
+);
+CREATE TABLE IF NOT EXISTS tests (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    timing REAL,
+    samples INTEGER NOT NULL DEFAULT 0,
+    mean REAL,
+    variance REAL,
+    p50 REAL,
+    p95 REAL,
+    recent TEXT,
+    -- 1 if the coverage was recorded, -1 if another tracer was in the way
+    traced INTEGER NOT NULL DEFAULT 0,
+    last_outcome TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL,
+    test_id INTEGER NOT NULL,
+    outcome TEXT NOT NULL,
+    duration REAL,
+    PRIMARY KEY (run_id, test_id)
+);
+-- Only failures are indexed, which keeps writing results cheap. Queries
+-- must spell out the same outcomes for sqlite to use it.
+CREATE INDEX IF NOT EXISTS failed_results ON results (run_id, test_id)
+    WHERE outcome IN ('failure', 'error', 'unexpected_success');
+DROP INDEX IF EXISTS results_by_test;
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS coverage (
+    test_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    blob TEXT,
+    lines TEXT NOT NULL,
+    PRIMARY KEY (test_id, file_id)
+);
+CREATE INDEX IF NOT EXISTS coverage_by_file ON coverage (file_id);
+CREATE TABLE IF NOT EXISTS queries (
+    test_id INTEGER PRIMARY KEY,
+    queries INTEGER NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS class_timings (
+    name TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    timing REAL NOT NULL,
+    samples INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    PRIMARY KEY (name, phase)
+);
+CREATE TABLE IF NOT EXISTS worker_memory (
+    run_id INTEGER PRIMARY KEY,
+    rss INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS discovery (
+    key TEXT PRIMARY KEY,
+    used REAL NOT NULL,
+    data TEXT NOT NULL
+);
+'''
+
+FAILED_OUTCOMES = ('failure', 'error', 'unexpected_success')
+
+STATISTICS = ('timing', 'mean', 'p50', 'p95')
+
+# Weight of the newest duration in the moving mean and variance
+ALPHA = 0.3
+# Number of recent durations the percentiles are taken over
+WINDOW = 20
 
 
 def _get_default_path():
     return os.path.join(os.getcwd(), '.better_test.db')
 
 
-def read_database(path=None):
-    if path is None:
-        path = _get_default_path()
-    if os.path.exists(path):
-        with open(path) as fobj:
-            return json.load(fobj)
+class Database(object):
+    """
+    Timings and history of test runs, stored in a sqlite database.
+
+    `tests` holds one row per test with its latest timing, which is all the
+    schedulers need to read. `results` holds the outcome and duration of each
+    test for each of the last `keep_runs` runs, older runs are compacted away
+    when a run finishes.
+    """
+    def __init__(self, path=None, keep_runs=100):
+        if path is None:
+            path = _get_default_path()
+        self.path = path
+        self.keep_runs = keep_runs
+        legacy = _read_legacy(path)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self._drop_tables()
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(
+            'PRAGMA user_version = {0}'.format(SCHEMA_VERSION)
+        )
+        if legacy is not None:
+            self._import_legacy(legacy)
+
+    def close(self):
+        self.connection.close()
+
+    def _drop_tables(self):
+        tables = [name for name, in self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )]
+        for table in tables:
+            self.connection.execute('DROP TABLE {0}'.format(table))
+
+    def _import_legacy(self, data):
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO tests (name, timing, samples, mean, '
+                'variance, p50, p95, recent) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(name, timing) + update_statistics(None, timing)
+                 for name, timing in data.get('timings', {}).items()]
+            )
+            if 'last_run' in data:
+                cursor = self.connection.execute(
+                    'INSERT INTO runs (started, finished, success, config) '
+                    'VALUES (?, ?, ?, ?)',
+                    (0, 0, not data.get('failed'),
+                     json.dumps(data['last_run']))
+                )
+                self.connection.executemany(
+                    'INSERT OR IGNORE INTO tests (name) VALUES (?)',
+                    [(name, ) for name in data.get('failed', [])]
+                )
+                self.connection.executemany(
+                    'INSERT INTO results (run_id, test_id, outcome) '
+                    'SELECT ?, id, ? FROM tests WHERE name = ?',
+                    [(cursor.lastrowid, 'failure', name)
+                     for name in data.get('failed', [])]
+                )
+                self.connection.executemany(
+                    'UPDATE tests SET last_outcome = ? WHERE name = ?',
+                    [('failure', name) for name in data.get('failed', [])]
+                )
+
+    def __bool__(self):
+        return bool(self.connection.execute(
+            'SELECT EXISTS (SELECT 1 FROM tests)'
+        ).fetchone()[0])
+    __nonzero__ = __bool__
+
+    def timings(self, statistic='timing'):
+        """
+        Duration of each test, either the last one recorded (`timing`) or one
+        of its moving statistics (`mean`, `p50` or `p95`).
+        """
+        if statistic not in STATISTICS:
+            raise ValueError("Unknown statistic: {0}".format(statistic))
+        return dict(self.connection.execute(
+            'SELECT name, {0} FROM tests WHERE {0} IS NOT NULL'.format(
+                statistic
+            )
+        ))
+
+    def statistics(self):
+        """
+        Statistics of each test's duration:
+        `{name: (last, samples, mean, variance, p50, p95)}`.
+        """
+        return dict(
+            (row[0], row[1:]) for row in self.connection.execute(
+                'SELECT name, timing, samples, mean, variance, p50, p95 '
+                'FROM tests WHERE samples > 0'
+            )
+        )
+
+    def queries(self):
+        """
+        The number of database queries each test (or the fixtures of each
+        test class) made the last time they were counted, and the time spent
+        on them: `{name: (queries, seconds)}`.
+        """
+        return dict(
+            (row[0], row[1:]) for row in self.connection.execute(
+                'SELECT tests.name, queries.queries, queries.duration '
+                'FROM queries JOIN tests ON tests.id = queries.test_id'
+            )
+        )
+
+    def class_timings(self):
+        """
+        Statistics of the time each test class spends in each phase of its
+        fixtures (see `fixtures.PHASES`):
+        `{class: {phase: (last, samples, mean)}}`.
+        """
+        timings = {}
+        for name, phase, last, samples, mean in self.connection.execute(
+                'SELECT name, phase, timing, samples, mean '
+                'FROM class_timings'):
+            timings.setdefault(name, {})[phase] = (last, samples, mean)
+        return timings
+
+    def setup_costs(self):
+        """
+        Moving mean of the time it takes to set up and tear down each test
+        class, all phases together.
+        """
+        return dict(self.connection.execute(
+            'SELECT name, SUM(mean) FROM class_timings GROUP BY name'
+        ))
+
+    def worker_rss(self, runs=10):
+        """
+        The most memory, in bytes, any worker used in the last `runs` runs
+        that recorded it, or `None`.
+        """
+        return self.connection.execute(
+            'SELECT MAX(rss) FROM ('
+            '    SELECT rss FROM worker_memory ORDER BY run_id DESC LIMIT ?'
+            ')',
+            (runs, )
+        ).fetchone()[0]
+
+    def last_run(self):
+        """
+        The configuration of the last finished run, or `None`.
+        """
+        row = self.connection.execute(
+            'SELECT config FROM runs WHERE finished IS NOT NULL '
+            'AND config IS NOT NULL ORDER BY id DESC LIMIT 1'
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def failed(self):
+        """
+        Names of the tests that failed, errored or unexpectedly succeeded the
+        last time they ran.
+        """
+        return [name for name, in self.connection.execute(
+            'SELECT name FROM tests WHERE last_outcome IN (?, ?, ?) '
+            'ORDER BY name',
+            FAILED_OUTCOMES
+        )]
+
+    def recently_failed(self, runs=10):
+        """
+        Names of the tests that failed in any of the last `runs` runs, most
+        recent failures first.
+        """
+        return [name for name, _ in self.connection.execute(
+            'SELECT tests.name, MAX(results.run_id) AS run_id FROM results '
+            'JOIN tests ON tests.id = results.test_id '
+            'WHERE results.run_id >= ('
+            '    SELECT MIN(id) FROM ('
+            '        SELECT id FROM runs ORDER BY id DESC LIMIT ?'
+            '    )'
+            ') AND results.outcome IN '
+            "('failure', 'error', 'unexpected_success') "
+            'GROUP BY tests.id ORDER BY run_id DESC, tests.name',
+            (runs, )
+        )]
+
+    def coverage(self, paths):
+        """
+        The recorded coverage of the files in `paths`, as
+        `{path: [(test name, git blob of the file, lines)]}`.
+        """
+        coverage = {}
+        for path in paths:
+            rows = self.connection.execute(
+                'SELECT tests.name, coverage.blob, coverage.lines '
+                'FROM files '
+                'JOIN coverage ON coverage.file_id = files.id '
+                'JOIN tests ON tests.id = coverage.test_id '
+                'WHERE files.path = ?',
+                (path, )
+            ).fetchall()
+            if rows:
+                coverage[path] = rows
+        return coverage
+
+    def traced(self):
+        """
+        Names of the tests whose coverage was recorded.
+        """
+        return set(name for name, in self.connection.execute(
+            'SELECT name FROM tests WHERE traced = 1'
+        ))
+
+    def untraced(self):
+        """
+        Names of the tests and test classes whose coverage could not be
+        recorded, because another tracer was active.
+        """
+        return set(name for name, in self.connection.execute(
+            'SELECT name FROM tests WHERE traced = -1'
+        ))
+
+    def results(self, run_id):
+        """
+        The results of a run, as `[(name, outcome, duration)]`.
+        """
+        return self.connection.execute(
+            'SELECT tests.name, results.outcome, results.duration '
+            'FROM results JOIN tests ON tests.id = results.test_id '
+            'WHERE results.run_id = ? ORDER BY tests.name',
+            (run_id, )
+        ).fetchall()
+
+    def import_results(self, results):
+        """
+        Record `(name, outcome, duration)` results of a run made elsewhere,
+        such as the shards of a run on CI. Imported runs are not re-run by
+        ``--retest``.
+        """
+        run = self.start_run()
+        for name, outcome, duration in results:
+            run.record_outcome(name, outcome)
+            if duration is not None:
+                run.record_timing(name, duration)
+        run.finish(
+            not any(outcome in FAILED_OUTCOMES for _, outcome, _ in results),
+            None
+        )
+
+    def start_run(self, record_statistics=True):
+        """
+        Start recording a run. Without `record_statistics`, its durations
+        and class fixture timings are only kept as its results, and don't
+        update the statistics later runs are scheduled by.
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (started) VALUES (?)', (time.time(), )
+            )
+        return Run(self, cursor.lastrowid, record_statistics=record_statistics)
+
+    def discovery(self, key):
+        """
+        The discovery results stored under `key`, or `None`.
+        """
+        row = self.connection.execute(
+            'SELECT data FROM discovery WHERE key = ?', (key, )
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def store_discovery(self, key, data, keep=20):
+        """
+        Store discovery results under `key`, keeping those of the `keep` most
+        recently stored keys.
+        """
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO discovery (key, used, data) '
+                'VALUES (?, ?, ?)',
+                (key, time.time(), json.dumps(data))
+            )
+            self.connection.execute(
+                'DELETE FROM discovery WHERE key NOT IN ('
+                '    SELECT key FROM discovery ORDER BY used DESC LIMIT ?'
+                ')',
+                (keep, )
+            )
+
+    def compact(self):
+        """
+        Forget all but the last `keep_runs` runs.
+        """
+        row = self.connection.execute(
+            'SELECT id FROM runs ORDER BY id DESC LIMIT 1 OFFSET ?',
+            (self.keep_runs - 1, )
+        ).fetchone()
+        if row is None:
+            return
+        with self.connection:
+            self.connection.execute(
+                'DELETE FROM results WHERE run_id < ?', (row[0], )
+            )
+            self.connection.execute(
+                'DELETE FROM worker_memory WHERE run_id < ?', (row[0], )
+            )
+            self.connection.execute('DELETE FROM runs WHERE id < ?', (row[0], ))
+
+
+class Run(object):
+    """
+    Records the results of one test run as they arrive, writing them out in
+    batches of `batch_size`.
+    """
+    def __init__(self, database, run_id, batch_size=500,
+                 record_statistics=True):
+        self.database = database
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.record_statistics = record_statistics
+        self.outcomes = {}
+        self.pending = []
+        self.coverage = []
+        self.queries = []
+        self.class_timings = []
+        self.blobs = {}
+
+    def record_outcome(self, name, outcome):
+        """
+        Record the outcome of a test. Tests that ran have their duration
+        recorded afterwards, fixture errors never do and are written when the
+        run finishes.
+        """
+        self.outcomes[name] = outcome
+
+    def record_timing(self, name, duration):
+        self.pending.append((
+            name, self.outcomes.pop(name, 'success'), duration
+        ))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def forget_missing(self, requested, discovered):
+        """
+        Forget the failures of tests that should have been `discovered` for
+        the `requested` labels (all tests if there are none) but weren't, as
+        they no longer exist.
+        """
+        failed = self.database.failed()
+        if not failed:
+            return
+        known = set()
+        for label in discovered:
+            while label and label not in known:
+                known.add(label)
+                label = label.rpartition('.')[0]
+        missing = []
+        for name in failed:
+            label = name_to_label(name)
+            if label is None or label in known:
+                continue
+            if requested and not any(
+                    label == requested_label or
+                    label.startswith(requested_label + '.')
+                    for requested_label in requested):
+                continue
+            missing.append((name, ))
+        with self.database.connection:
+            self.database.connection.executemany(
+                'UPDATE tests SET last_outcome = NULL WHERE name = ?',
+                missing
+            )
+
+    def record_metrics(self, name, metrics):
+        if 'coverage' in metrics:
+            self.coverage.append((name, metrics['coverage']))
+        if 'queries' in metrics:
+            self.queries.append((name, metrics['queries']))
+
+    def record_class_timings(self, class_timings):
+        """
+        Record the `{class: {phase: seconds}}` a worker spent in class
+        fixtures.
+        """
+        self.class_timings.extend(
+            (name, phase, duration)
+            for name, phases in class_timings.items()
+            for phase, duration in phases.items()
+        )
+
+    def flush(self):
+        pending = self.pending + [
+            (name, outcome, None) for name, outcome in self.outcomes.items()
+        ]
+        self.pending = []
+        self.outcomes = {}
+        class_timings = self.class_timings
+        self.class_timings = []
+        coverage = self.coverage
+        self.coverage = []
+        queries = self.queries
+        self.queries = []
+        if not (pending or class_timings or coverage or queries):
+            return
+        connection = self.database.connection
+        with connection:
+            connection.executemany(
+                'INSERT OR IGNORE INTO tests (name) VALUES (?)',
+                [(name, ) for name, _, _ in pending]
+            )
+            # Look the tests up once, the writes below go by id
+            tests = self._read_tests(name for name, _, _ in pending)
+            updates = []
+            outcomes = []
+            for name, outcome, duration in pending:
+                test_id, statistics = tests[name]
+                if duration is None or not self.record_statistics:
+                    outcomes.append((outcome, test_id))
+                    continue
+                statistics = update_statistics(statistics, duration)
+                tests[name] = test_id, statistics
+                updates.append(
+                    (duration, ) + statistics + (outcome, test_id)
+                )
+            connection.executemany(
+                'UPDATE tests SET timing = ?, samples = ?, mean = ?, '
+                'variance = ?, p50 = ?, p95 = ?, recent = ?, '
+                'last_outcome = ? WHERE id = ?',
+                updates
+            )
+            connection.executemany(
+                'UPDATE tests SET last_outcome = ? WHERE id = ?', outcomes
+            )
+            # Tests that ran had working class and module fixtures, so
+            # earlier errors in those are fixed.
+            classes = dict(
+                (name.rpartition('.')[0], name)
+                for name, _, duration in pending if duration is not None
+            )
+            fixtures = set(
+                fixture for name in classes.values()
+                for fixture in fixture_names(name)
+            ) - set(name for name, _, _ in pending)
+            connection.executemany(
+                'UPDATE tests SET last_outcome = NULL WHERE name = ?',
+                [(name, ) for name in fixtures]
+            )
+            connection.executemany(
+                'INSERT OR REPLACE INTO results '
+                '(run_id, test_id, outcome, duration) VALUES (?, ?, ?, ?)',
+                [(self.run_id, tests[name][0], outcome, duration)
+                 for name, outcome, duration in pending]
+            )
+            if coverage:
+                self._write_coverage(coverage)
+            # The queries of class fixtures are recorded under the class's
+            # name
+            connection.executemany(
+                'INSERT OR IGNORE INTO tests (name) VALUES (?)',
+                [(name, ) for name, _ in queries]
+            )
+            connection.executemany(
+                'INSERT OR REPLACE INTO queries (test_id, queries, duration) '
+                'SELECT id, ?, ? FROM tests WHERE name = ?',
+                [(count, duration, name)
+                 for name, (count, duration) in queries]
+            )
+            if class_timings and self.record_statistics:
+                self._write_class_timings(class_timings)
+
+    def _write_class_timings(self, class_timings):
+        connection = self.database.connection
+        for name, phase, duration in class_timings:
+            connection.execute(
+                'INSERT OR IGNORE INTO class_timings '
+                '(name, phase, timing, samples, mean) VALUES (?, ?, ?, 0, ?)',
+                (name, phase, duration, duration)
+            )
+            connection.execute(
+                'UPDATE class_timings SET timing = ?, samples = samples + 1, '
+                'mean = ? * ? + (1 - ?) * mean WHERE name = ? AND phase = ?',
+                (duration, ALPHA, duration, ALPHA, name, phase)
+            )
+
+    def _write_coverage(self, coverage):
+        connection = self.database.connection
+        # Tests and classes another tracer kept from being traced have no
+        # coverage, and are marked to always be run by --changed
+        untraced = [name for name, files in coverage if files is False]
+        coverage = [
+            (name, files) for name, files in coverage if files is not False
+        ]
+        for _, files in coverage:
+            for path in files:
+                if path not in self.blobs:
+                    self.blobs[path] = git_blob(path)
+        connection.executemany(
+            'INSERT OR IGNORE INTO files (path) VALUES (?)',
+            [(path, ) for path in self.blobs]
+        )
+        names = [name for name, _ in coverage] + untraced
+        # The coverage of class fixtures is recorded under the class's name
+        connection.executemany(
+            'INSERT OR IGNORE INTO tests (name) VALUES (?)',
+            [(name, ) for name in names]
+        )
+        connection.executemany(
+            'DELETE FROM coverage WHERE test_id = '
+            '(SELECT id FROM tests WHERE name = ?)',
+            [(name, ) for name in names]
+        )
+        connection.executemany(
+            'INSERT INTO coverage (test_id, file_id, blob, lines) '
+            'SELECT tests.id, files.id, ?, ? FROM tests, files '
+            'WHERE tests.name = ? AND files.path = ?',
+            [(self.blobs[path], lines, name, path)
+             for name, files in coverage for path, lines in files.items()]
+        )
+        connection.executemany(
+            'UPDATE tests SET traced = 1 WHERE name = ?',
+            [(name, ) for name, _ in coverage]
+        )
+        connection.executemany(
+            'UPDATE tests SET traced = -1 WHERE name = ?',
+            [(name, ) for name in untraced]
+        )
+
+    def _read_tests(self, names, chunk_size=500):
+        """
+        The `{name: (id, statistics)}` of the tests `names`, with `None`
+        statistics for tests that never ran.
+        """
+        names = list(set(names))
+        tests = {}
+        for start in range(0, len(names), chunk_size):
+            chunk = names[start:start + chunk_size]
+            tests.update(
+                (row[0], (row[1], row[2:] if row[2] else None))
+                for row in self.database.connection.execute(
+                    'SELECT name, id, samples, mean, variance, p50, p95, '
+                    'recent FROM tests WHERE name IN ({0})'.format(
+                        ', '.join('?' * len(chunk))
+                    ),
+                    chunk
+                )
+            )
+        return tests
+
+    def record_worker_rss(self, rss):
+        """
+        Record the most memory, in bytes, any worker used in this run.
+        """
+        with self.database.connection:
+            self.database.connection.execute(
+                'INSERT OR REPLACE INTO worker_memory (run_id, rss) '
+                'VALUES (?, ?)',
+                (self.run_id, rss)
+            )
+
+    def finish(self, success, config):
+        self.flush()
+        with self.database.connection:
+            self.database.connection.execute(
+                'UPDATE runs SET finished = ?, success = ?, config = ? '
+                'WHERE id = ?',
+                (time.time(), success,
+                 None if config is None else json.dumps(config), self.run_id)
+            )
+        self.database.compact()
+
+
+def update_statistics(statistics, duration, alpha=ALPHA, window=WINDOW):
+    """
+    Fold a new duration into a test's
+    `(samples, mean, variance, p50, p95, recent)`.
+
+    The mean and variance are exponentially weighted, so older runs fade out.
+    The percentiles are taken over the `window` most recent durations, which
+    are kept in `recent`, so a single slow run only counts for a while.
+    """
+    if statistics is None:
+        samples, mean, variance, recent = 0, duration, 0.0, []
     else:
-        return {}
+        samples, mean, variance, _, _, recent = statistics
+        recent = json.loads(recent)
+    difference = duration - mean
+    increment = alpha * difference
+    mean += increment
+    variance = (1 - alpha) * (variance + difference * increment)
+    recent = (recent + [duration])[-window:]
+    ordered = sorted(recent)
+    return (
+        samples + 1, mean, variance,
+        percentile(ordered, 0.5), percentile(ordered, 0.95),
+        json.dumps(recent)
+    )
 
 
-def write_database(database, path=None):
-    if path is None:
-        path = _get_default_path()
-    with open(path, 'w') as fobj:
-        json.dump(database, fobj)
+def percentile(ordered, fraction):
+    """
+    Linearly interpolated percentile of a sorted, non-empty list.
+    """
+    position = (len(ordered) - 1) * fraction
+    lower = int(math.floor(position))
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (
+        position - lower
+    )
+
+
+def _read_legacy(path):
+    """
+    Read (and remove) a database in the JSON format used up to 0.10.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as fobj:
+        header = fobj.read(16)
+    if header.startswith(b'SQLite format 3') or not header.strip():
+        return None
+    try:
+        with open(path) as fobj:
+            data = json.load(fobj)
+    except ValueError:
+        return None
+    os.remove(path)
+    return data
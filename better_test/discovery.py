@@ -0,0 +1,315 @@
+"""
+Cached test discovery: remember which tests the test modules contain, so the
+main process can get the labels to run without importing every test module.
+"""
+from __future__ import absolute_import
+import hashlib
+import json
+import os
+import sys
+
+from .impact import git_blob
+from .utils import iter_tests
+from .utils import suite_to_labels
+from .utils import test_to_dotted
+
+# Runner attributes that change what is discovered
+DISCOVERY_OPTIONS = (
+    'pattern', 'top_level', 'tags', 'exclude_tags', 'test_name_patterns'
+)
+
+
+class DiscoveryCache(object):
+    """
+    Discovers tests through the test runner, and stores the labels found in
+    each test module in `database`, along with the state of the files
+    involved: the test modules, the project's modules they imported, and the
+    directories they are in.
+
+    The next time the same labels are discovered, the stored labels are used
+    if none of those files changed. A new or removed file in one of the
+    directories, or a change to a module that is not a test module, means
+    everything is discovered again; changed test modules are discovered again
+    on their own. Files are compared by modification time and size first, and
+    by content where those differ.
+
+    With `refresh`, the stored labels are never used, only updated.
+    """
+    def __init__(self, database, refresh=False, root=None):
+        self.database = database
+        self.refresh = refresh
+        self.root = os.path.realpath(root or os.getcwd())
+        # Files of the test modules and their dependencies, as of the last
+        # discovery
+        self.files = set()
+
+    def discover(self, test_runner, test_labels, result):
+        """
+        The labels of the tests `test_runner` finds for `test_labels`, as
+        `suite_to_labels` would return them.
+        """
+        key = self.get_key(test_runner, test_labels)
+        if key is None:
+            return self.discover_all(test_runner, test_labels, result)[0]
+        data = None if self.refresh else self.database.discovery(key)
+        if data is not None:
+            stored = json.dumps(data, sort_keys=True)
+            changed = self.validate(data)
+            if changed is not None and self.update(
+                    data, changed, test_runner, test_labels):
+                if json.dumps(data, sort_keys=True) != stored:
+                    self.database.store_discovery(key, data)
+                self.files = set(data['files'])
+                return assemble(data)
+        labels, data = self.discover_all(test_runner, test_labels, result)
+        if data is not None:
+            self.database.store_discovery(key, data)
+        return labels
+
+    def get_key(self, test_runner, test_labels):
+        """
+        What the discovery depends on besides the files, or `None` if it
+        can't be cached.
+        """
+        if getattr(test_runner, 'reverse', False) or getattr(
+                test_runner, 'shuffle', False):
+            return None
+        import django
+        options = dict(
+            (name, _sorted(getattr(test_runner, name, None)))
+            for name in DISCOVERY_OPTIONS
+        )
+        runner_class = test_runner.__class__
+        return hashlib.sha1(json.dumps([
+            runner_class.__module__ + '.' + runner_class.__name__,
+            list(test_labels),
+            options,
+            self.root,
+            django.get_version(),
+        ], sort_keys=True).encode('utf-8')).hexdigest()
+
+    def discover_all(self, test_runner, test_labels, result):
+        """
+        Discover the tests the regular way. Returns the labels and the data
+        to store, which is `None` if the discovery failed anywhere.
+        """
+        before = set(sys.modules)
+        suite = test_runner.build_suite(test_labels)
+        errors = len(result.errors)
+        labels = suite_to_labels(suite, result)
+        if len(result.errors) > errors or any(
+                label.startswith('unittest.loader.') for label in labels):
+            return labels, None
+        modules, test_files = self.group_tests(test_runner, suite, labels)
+        if modules is None:
+            return labels, None
+        data = {
+            'modules': modules,
+            'test_files': sorted(test_files),
+            'files': {},
+            'directories': {},
+        }
+        self.track(data, test_files | self.imported_since(before))
+        self.files = set(data['files'])
+        return labels, data
+
+    def imported_since(self, before):
+        """
+        Files of the project's modules imported since `before` was taken
+        from `sys.modules`.
+        """
+        files = set()
+        for name in set(sys.modules) - before:
+            path = _module_file(sys.modules[name])
+            if path is not None and self.in_project(path):
+                files.add(path)
+        return files
+
+    def track(self, data, paths):
+        """
+        Add the state of the files at `paths`, and of the directories they
+        are in up to the project's root, to `data`.
+        """
+        for path in paths:
+            state = _file_state(path)
+            if state is None:
+                continue
+            data['files'].setdefault(path, state)
+            directory = os.path.dirname(path)
+            while directory not in data['directories']:
+                data['directories'][directory] = _directory_state(directory)
+                if directory == self.root or not self.in_project(directory):
+                    break
+                directory = os.path.dirname(directory)
+
+    def group_tests(self, test_runner, suite, labels):
+        """
+        The labels grouped by module as `[[module, path, [[label, group]]]]`,
+        in the order of `labels`, and the paths of the test modules. The group
+        is the position of the test's type in the runner's `reorder_by`,
+        which decides the order of tests across modules.
+        """
+        reorder_by = tuple(getattr(test_runner, 'reorder_by', ()))
+        tests = dict(
+            (test_to_dotted(test), test) for test in iter_tests(suite)
+        )
+        modules = []
+        positions = {}
+        for label in labels:
+            test = tests.get(label)
+            if test is None:
+                return None, None
+            name = test.__class__.__module__
+            path = _module_file(sys.modules.get(name))
+            if path is None:
+                return None, None
+            group = len(reorder_by)
+            for index, test_type in enumerate(reorder_by):
+                if isinstance(test, test_type):
+                    group = index
+                    break
+            if name not in positions:
+                positions[name] = len(modules)
+                modules.append([name, path, []])
+            modules[positions[name]][2].append([label, group])
+        return modules, set(path for _, path, _ in modules)
+
+    def in_project(self, path):
+        return (
+            (path + os.sep).startswith(self.root + os.sep) and
+            'site-packages' not in path and 'dist-packages' not in path
+        )
+
+    def validate(self, data):
+        """
+        The paths of the test modules that changed, or `None` if the stored
+        labels can't be used at all.
+        """
+        for path, (mtime, entries) in data['directories'].items():
+            state = _directory_state(path, mtime, entries)
+            if state is None:
+                return None
+            data['directories'][path] = state
+        test_files = set(data['test_files'])
+        changed = []
+        for path, (mtime, size, blob) in data['files'].items():
+            state = _file_state(path, mtime, size, blob)
+            if state is None:
+                return None
+            if state[2] != blob:
+                if path not in test_files:
+                    return None
+                changed.append(path)
+            data['files'][path] = state
+        return changed
+
+    def update(self, data, changed, test_runner, test_labels):
+        """
+        Discover the `changed` test modules again, replacing their labels in
+        `data`. Returns whether that worked.
+        """
+        modules = [entry for entry in data['modules'] if entry[1] in changed]
+        if len(modules) != len(changed):
+            return False
+        for entry in modules:
+            name, path, _ = entry
+            before = set(sys.modules)
+            suite = test_runner.build_suite([name])
+            labels = [test_to_dotted(test) for test in iter_tests(suite)]
+            if any(label.startswith('unittest.loader.') for label in labels):
+                return False
+            labels = [
+                label for label in labels
+                if _requested(label, path, test_labels)
+            ]
+            found, _ = self.group_tests(test_runner, suite, labels)
+            if found is None or any(other[0] != name for other in found):
+                return False
+            entry[2] = found[0][2] if found else []
+            self.track(data, self.imported_since(before))
+        return True
+
+
+def assemble(data):
+    """
+    The labels stored in discovery `data`, ordered by group, then module.
+    """
+    labels = [
+        (group, label) for _, _, tests in data['modules']
+        for label, group in tests
+    ]
+    # sorted() is stable, so the order within groups is kept
+    return [label for _, label in sorted(labels, key=lambda item: item[0])]
+
+
+def _requested(label, path, test_labels):
+    """
+    Whether the test `label` in the module at `path` was asked for with
+    `test_labels`, which can be dotted names or paths.
+    """
+    for requested in test_labels or ['.']:
+        if os.path.exists(requested):
+            directory = os.path.realpath(requested)
+            if path == directory or (path + os.sep).startswith(
+                    directory + os.sep):
+                return True
+        elif label == requested or label.startswith(requested + '.'):
+            return True
+    return False
+
+
+def _module_file(module):
+    filename = getattr(module, '__file__', None)
+    if not filename:
+        return None
+    if filename.endswith(('.pyc', '.pyo')):
+        filename = filename[:-1]
+    return os.path.realpath(filename)
+
+
+def _sorted(value):
+    if isinstance(value, (set, frozenset, list, tuple)):
+        return sorted(value)
+    return value
+
+
+def _file_state(path, mtime=None, size=None, blob=None):
+    """
+    `[mtime, size, blob]` of a file, `None` if it is gone. The blob is only
+    computed again if the modification time or size differ from the given
+    ones.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if stat.st_mtime == mtime and stat.st_size == size:
+        return [mtime, size, blob]
+    return [stat.st_mtime, stat.st_size, git_blob(path)]
+
+
+def _directory_state(path, mtime=None, entries=None):
+    """
+    `[mtime, entries]` of a directory, the entries being the names of its
+    Python files and subdirectories. `None` if those differ from the given
+    `entries` (or the directory is gone).
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if stat.st_mtime == mtime:
+        return [mtime, entries]
+    try:
+        names = os.listdir(path)
+    except OSError:
+        return None
+    current = sorted(
+        name for name in names
+        if not name.startswith('.') and name != '__pycache__' and (
+            name.endswith('.py') or os.path.isdir(os.path.join(path, name))
+        )
+    )
+    if entries is not None and current != entries:
+        return None
+    return [stat.st_mtime, current]
@@ -0,0 +1,136 @@
+"""
+Timing of class fixtures: how long each test class takes to set up and tear
+down, which unittest and Django do outside of any test's start and stop.
+"""
+from __future__ import absolute_import
+import time
+
+# Methods timed on each test class, and the phase their time is recorded as
+CLASS_METHODS = (
+    ('setUpClass', 'setUpClass'),
+    ('setUpTestData', 'setUpTestData'),
+    ('tearDownClass', 'tearDownClass'),
+)
+
+# Phases in the order they happen, loading fixtures is part of Django's
+# TestCase.setUpClass
+PHASES = ('setUpClass', 'fixtures', 'setUpTestData', 'tearDownClass')
+
+
+class FixtureTimer(object):
+    """
+    Times the class-level methods of the test classes it instruments inside a
+    worker process, and the fixtures Django loads for them. Each phase gets
+    the time spent in it, but not in the other phases it calls into, so
+    `setUpClass` is what is left after loading fixtures and `setUpTestData`.
+
+    The `probes` are told when a class starts and stops running its
+    fixtures, so they can measure those too, and `before` (if given) is
+    called before a class starts.
+    """
+    def __init__(self, probes=(), before=None):
+        self.probes = probes
+        self.before = before
+        self.instrumented = set()
+        # [class name, phase, started, time spent in nested phases]
+        self.stack = []
+        self.timings = {}
+
+    def setup(self):
+        """
+        Time the fixtures Django's test cases load.
+        """
+        try:
+            from django.test import testcases
+        except ImportError:
+            return
+        call_command = getattr(testcases, 'call_command', None)
+        if call_command is None:
+            return
+
+        def timed_call_command(name, *args, **kwargs):
+            if name != 'loaddata' or not self.stack:
+                return call_command(name, *args, **kwargs)
+            return self.timed(
+                self.stack[-1][0], 'fixtures', call_command, name, *args,
+                **kwargs
+            )
+        testcases.call_command = timed_call_command
+
+    def instrument(self, tests):
+        """
+        Time the class-level methods of the classes of `tests`.
+        """
+        for test in tests:
+            cls = test.__class__
+            if cls in self.instrumented:
+                continue
+            self.instrumented.add(cls)
+            for method_name, phase in CLASS_METHODS:
+                method = getattr(cls, method_name, None)
+                if getattr(method, '__self__', None) is not cls:
+                    continue
+                setattr(cls, method_name, classmethod(
+                    self._wrap(method.__func__, phase)
+                ))
+
+    def _wrap(self, function, phase):
+        def wrapper(cls, *args, **kwargs):
+            return self.timed(
+                class_name(cls), phase, function, cls, *args, **kwargs
+            )
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+    def timed(self, name, phase, function, *args, **kwargs):
+        # Overridden methods calling the ones they override count once
+        if self.stack and self.stack[-1][:2] == [name, phase]:
+            return function(*args, **kwargs)
+        outermost = not self.stack
+        if outermost:
+            if self.before is not None:
+                self.before()
+            for probe in self.probes:
+                probe.start_fixture(name)
+        frame = [name, phase, time.time(), 0.0]
+        self.stack.append(frame)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.stack.pop()
+            elapsed = time.time() - frame[2]
+            if self.stack:
+                self.stack[-1][3] += elapsed
+            phases = self.timings.setdefault(name, {})
+            phases[phase] = phases.get(phase, 0.0) + elapsed - frame[3]
+            if outermost:
+                for probe in self.probes:
+                    probe.stop_fixture(name)
+
+    def collect(self):
+        """
+        The timings taken since the last call, as `{class: {phase: seconds}}`.
+        """
+        timings = self.timings
+        self.timings = {}
+        return timings
+
+    def collect_metrics(self):
+        """
+        What the probes measured in class fixtures since the last call, as
+        `{class: {probe name: metric}}`.
+        """
+        metrics = {}
+        for probe in self.probes:
+            for name, metric in probe.collect_fixtures().items():
+                metrics.setdefault(name, {})[probe.name] = metric
+        return metrics
+
+
+def class_name(cls):
+    """
+    The dotted name of a test class, the label of its tests without the
+    method.
+    """
+    return '{module}.{name}'.format(module=cls.__module__, name=cls.__name__)
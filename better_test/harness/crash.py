@@ -1,4 +1,5 @@
 from __future__ import absolute_import
+import os
 
 from ..compat import unittest
 
@@ -7,3 +8,31 @@ class Tests(unittest.TestCase):
     def test_segfault(self):
         from segfault import segfault
         segfault()
+
+
+class ChunkTests(unittest.TestCase):
+    def test_a(self):
+        pass
+
+    def test_abort(self):
+        os.abort()
+
+    def test_c(self):
+        pass
+
+    def test_d(self):
+        pass
+
+
+class PassingTests(unittest.TestCase):
+    def test_pass(self):
+        pass
+
+
+class SetUpClassTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.abort()
+
+    def test_unreached(self):
+        pass
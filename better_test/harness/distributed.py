@@ -0,0 +1,24 @@
+from __future__ import absolute_import
+import time
+
+from ..compat import unittest
+
+
+class DistributedTests(unittest.TestCase):
+    def test_a(self):
+        time.sleep(0.1)
+
+    def test_b(self):
+        time.sleep(0.1)
+
+    def test_c(self):
+        time.sleep(0.1)
+
+    def test_d(self):
+        time.sleep(0.1)
+
+    def test_e(self):
+        time.sleep(0.1)
+
+    def test_f(self):
+        time.sleep(0.1)
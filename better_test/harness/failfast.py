@@ -0,0 +1,23 @@
+from __future__ import absolute_import
+import time
+
+from ..compat import unittest
+
+
+class FailFastTests(unittest.TestCase):
+    def test_fail(self):
+        self.fail('fail')
+
+    def test_hang(self):
+        time.sleep(30)
+
+
+def make_test(index):
+    def test(self):
+        time.sleep(0.05)
+    test.__name__ = 'test_{0:02d}'.format(index)
+    return test
+
+
+for index in range(20):
+    setattr(FailFastTests, 'test_{0:02d}'.format(index), make_test(index))
@@ -0,0 +1,37 @@
+from __future__ import absolute_import
+import time
+
+from ..compat import unittest
+
+
+class Tests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(Tests, cls).setUpClass()
+        time.sleep(0.2)
+
+    @classmethod
+    def tearDownClass(cls):
+        time.sleep(0.1)
+        super(Tests, cls).tearDownClass()
+
+    def test_a(self):
+        pass
+
+    def test_b(self):
+        pass
+
+
+class QueryTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from django.db import connection
+        super(QueryTests, cls).setUpClass()
+        with connection.cursor() as cursor:
+            for number in range(3):
+                cursor.execute('SELECT %s', [number])
+
+    def test_query(self):
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
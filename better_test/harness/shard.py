@@ -0,0 +1,33 @@
+from __future__ import absolute_import
+import time
+
+from ..compat import unittest
+
+
+class ATests(unittest.TestCase):
+    def test_a(self):
+        time.sleep(0.2)
+
+    def test_b(self):
+        pass
+
+
+class BTests(unittest.TestCase):
+    def test_a(self):
+        pass
+
+
+class CTests(unittest.TestCase):
+    def test_a(self):
+        pass
+
+    def test_b(self):
+        pass
+
+    def test_c(self):
+        pass
+
+
+class DTests(unittest.TestCase):
+    def test_a(self):
+        time.sleep(0.1)
@@ -0,0 +1,20 @@
+from __future__ import absolute_import
+import time
+
+from ..compat import unittest
+from ..utils import timeout
+
+
+class TimeoutTests(unittest.TestCase):
+    def test_a(self):
+        pass
+
+    @timeout(0.5)
+    def test_hang(self):
+        time.sleep(30)
+
+    def test_c(self):
+        pass
+
+    def test_d(self):
+        pass
@@ -0,0 +1,393 @@
+"""
+Test impact analysis: record which lines of the project's code each test
+executes, and use that to select the tests affected by a change.
+"""
+from __future__ import absolute_import
+import ast
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import threading
+import warnings
+
+from .probes import Probe
+
+
+class ImpactProbe(Probe):
+    """
+    Traces the lines of Python files below `root` executed during each test.
+    Installed packages and better-test itself are left out. Tracing slows the
+    tests down, so this is only used when asked for.
+
+    The class fixtures of each test class are traced as well, and sent as the
+    coverage of the class: a change to code only they run affects all of its
+    tests.
+
+    The metric is `{path: lines}`, or `False` if another tracer (coverage, a
+    debugger) kept the probe from tracing all of the test, which is then
+    always affected.
+    """
+    name = 'coverage'
+
+    def __init__(self, root):
+        self.root = os.path.realpath(root) + os.sep
+        self.excluded = (
+            os.path.dirname(os.path.realpath(__file__)) + os.sep,
+        )
+        self.included = {}
+        self.lines = {}
+        # {class: {filename: lines}} run in class fixtures
+        self.fixture_lines = {}
+        # Classes whose fixtures could not be traced
+        self.untraced = set()
+        self.warned = False
+
+    def _include(self, filename):
+        # Code without a file, like `<frozen os>` or `<string>`
+        if filename.startswith('<'):
+            return False
+        path = os.path.realpath(filename)
+        return (
+            path.startswith(self.root) and
+            not path.startswith(self.excluded) and
+            'site-packages' not in path and
+            'dist-packages' not in path
+        )
+
+    def _trace(self, frame, event, arg):
+        filename = frame.f_code.co_filename
+        include = self.included.get(filename)
+        if include is None:
+            include = self.included[filename] = self._include(filename)
+        if not include:
+            return None
+        lines = self.lines.get(filename)
+        if lines is None:
+            lines = self.lines[filename] = set()
+        lines.add(frame.f_lineno)
+
+        def trace_lines(frame, event, arg):
+            if event == 'line':
+                lines.add(frame.f_lineno)
+            return trace_lines
+        return trace_lines
+
+    def start_test(self, test):
+        self.lines = {}
+        self._start()
+
+    def stop_test(self, test):
+        if not self._stop():
+            return False
+        return self._format(self.lines)
+
+    def start_fixture(self, name):
+        self.lines = self.fixture_lines.setdefault(name, {})
+        self._start()
+
+    def stop_fixture(self, name):
+        if not self._stop():
+            self.untraced.add(name)
+
+    def collect_fixtures(self):
+        fixture_lines = self.fixture_lines
+        untraced = self.untraced
+        self.fixture_lines = {}
+        self.untraced = set()
+        coverage = dict(
+            (name, self._format(lines))
+            for name, lines in fixture_lines.items() if lines
+        )
+        coverage.update((name, False) for name in untraced)
+        return coverage
+
+    def _start(self):
+        if sys.gettrace() is None:
+            threading.settrace(self._trace)
+            sys.settrace(self._trace)
+
+    def _stop(self):
+        """
+        Stop tracing, returns whether this probe was tracing, which it wasn't
+        if another tracer was set before or meanwhile.
+        """
+        if sys.gettrace() != self._trace:
+            if not self.warned:
+                self.warned = True
+                warnings.warn(
+                    "Another tracer is active, so the impact of some tests "
+                    "can't be recorded; --changed will always run them",
+                    RuntimeWarning
+                )
+            return False
+        sys.settrace(None)
+        threading.settrace(None)
+        return True
+
+    def _format(self, lines):
+        return dict(
+            (os.path.realpath(filename), format_lines(file_lines))
+            for filename, file_lines in lines.items()
+        )
+
+
+def format_lines(lines):
+    """
+    Compress a set of line numbers into ranges, `1-3,7,9-10`.
+    """
+    ranges = []
+    for line in sorted(lines):
+        if ranges and ranges[-1][1] == line - 1:
+            ranges[-1][1] = line
+        else:
+            ranges.append([line, line])
+    return ','.join(
+        str(start) if start == end else '{0}-{1}'.format(start, end)
+        for start, end in ranges
+    )
+
+
+def parse_lines(text):
+    lines = set()
+    for part in text.split(','):
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        lines.update(range(int(start), int(end or start) + 1))
+    return lines
+
+
+def git_blob(path):
+    """
+    The id git would give the contents of `path`, or `None` if it can't be
+    read.
+    """
+    try:
+        with open(path, 'rb') as fobj:
+            data = fobj.read()
+    except (IOError, OSError):
+        return None
+    header = 'blob {0}\0'.format(len(data)).encode('ascii')
+    return hashlib.sha1(header + data).hexdigest()
+
+
+def _git(*args):
+    return subprocess.check_output(('git', ) + args).decode('utf-8')
+
+
+HUNK = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@')
+
+
+class Hunk(object):
+    """
+    A change of `count` lines starting at line `start` of the old version of
+    a file, or an insertion after line `start` if `count` is 0.
+    """
+    def __init__(self, start, count):
+        self.start = start
+        self.count = count
+        self.added = []
+
+    @property
+    def lines(self):
+        return range(self.start, self.start + self.count)
+
+
+def get_changes(rev):
+    """
+    The Python files changed in the working tree since `rev`, as
+    `{path: (blob at rev, hunks)}`. The hunks are `None` for files that were
+    added or deleted.
+    """
+    root = _git('rev-parse', '--show-toplevel').strip()
+    diff = _git(
+        'diff', '-U0', '--no-color', '--no-renames', '--no-ext-diff', rev,
+        '--', '*.py'
+    )
+    changes = {}
+    path = hunk = None
+    for line in diff.splitlines():
+        if line.startswith('diff --git '):
+            path = hunk = None
+        elif line.startswith('--- ') and hunk is None:
+            old = line[4:]
+            path = None if old == '/dev/null' else old[2:]
+            if path is not None:
+                changes[path] = []
+        elif line.startswith('+++ ') and hunk is None:
+            new = line[4:]
+            if path is None and new != '/dev/null':
+                changes[new[2:]] = None
+        elif line.startswith('@@') and path is not None:
+            match = HUNK.match(line)
+            hunk = Hunk(
+                int(match.group(1)),
+                1 if match.group(2) is None else int(match.group(2))
+            )
+            changes[path].append(hunk)
+        elif line.startswith('+') and hunk is not None:
+            hunk.added.append(line[1:])
+    blobs = {}
+    existing = [path for path, hunks in changes.items() if hunks is not None]
+    if existing:
+        for line in _git('ls-tree', '-r', rev, '--', *existing).splitlines():
+            info, _, path = line.partition('\t')
+            blobs[path] = info.split()[2]
+    return dict(
+        (os.path.realpath(os.path.join(root, path)),
+         (blobs.get(path), hunks))
+        for path, hunks in changes.items()
+    )
+
+
+def _imported_files():
+    files = set()
+    for module in list(sys.modules.values()):
+        filename = getattr(module, '__file__', None)
+        if filename:
+            if filename.endswith(('.pyc', '.pyo')):
+                filename = filename[:-1]
+            files.add(os.path.realpath(filename))
+    return files
+
+
+def _is_code(line):
+    line = line.strip()
+    return bool(line) and not line.startswith('#')
+
+
+def _get_functions(source):
+    """
+    `(first line, last line, indentation)` of every function in `source`, or
+    `None` if that can't be told.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+    function_types = tuple(
+        getattr(ast, name) for name in ('FunctionDef', 'AsyncFunctionDef')
+        if hasattr(ast, name)
+    )
+    functions = []
+    for node in ast.walk(tree):
+        if isinstance(node, function_types):
+            if getattr(node, 'end_lineno', None) is None:
+                return None
+            start = min(
+                [node.lineno] + [
+                    decorator.lineno for decorator in node.decorator_list
+                ]
+            )
+            functions.append((start, node.end_lineno, node.col_offset))
+    return functions
+
+
+def _changed_functions(source, hunks):
+    """
+    The functions (as returned by `_get_functions`) of the old `source` of a
+    file that `hunks` touch. `None` if any code outside of functions changed,
+    as that runs at import time and can affect any test.
+    """
+    functions = _get_functions(source)
+    if functions is None:
+        return None
+    lines = source.splitlines()
+
+    def innermost(line, indentation=None):
+        # Code inserted after the last line of a function only belongs to it
+        # if it is indented deeper than the function's definition.
+        found = None
+        for function in functions:
+            start, end, column = function
+            if not start <= line <= end:
+                continue
+            if indentation is not None and line == end and (
+                    indentation <= column):
+                continue
+            if found is None or start >= found[0]:
+                found = function
+        return found
+
+    changed = set()
+    for hunk in hunks:
+        if hunk.count:
+            for line in hunk.lines:
+                function = innermost(line)
+                if function is not None:
+                    changed.add(function)
+                elif line <= len(lines) and _is_code(lines[line - 1]):
+                    return None
+            continue
+        added = [line for line in hunk.added if _is_code(line)]
+        if not added:
+            continue
+        function = innermost(
+            hunk.start, len(added[0]) - len(added[0].lstrip())
+        )
+        if function is None:
+            return None
+        changed.add(function)
+    return changed
+
+
+def select_tests(labels, database, changes, rev, imported=()):
+    """
+    Select the tests out of `labels` affected by `changes` (as returned by
+    `get_changes`), using the coverage recorded in `database`.
+
+    A change inside a function affects the tests that executed the function.
+    Code outside of functions is run at import time, so changing it affects
+    all tests, as does changing an imported file no test executed. Where the
+    coverage was recorded for another version of a file than the one at
+    `rev`, every test that executed any line of the file is affected. Tests
+    without recorded coverage are always selected. The coverage of a test
+    class's fixtures is recorded under the name of the class, and affects
+    all of its tests; if they could not be traced, all of its tests are
+    selected.
+
+    Files in `imported` count as imported, besides those of the modules in
+    `sys.modules`.
+    """
+    coverage = database.coverage(changes)
+    imported = _imported_files() | set(imported)
+    root = os.path.realpath(_git('rev-parse', '--show-toplevel').strip())
+    affected = set()
+    for path, (blob, hunks) in changes.items():
+        entries = coverage.get(path)
+        if not entries:
+            if path in imported:
+                return list(labels)
+            continue
+        if hunks is None:
+            affected.update(name for name, _, _ in entries)
+            continue
+        current = [entry for entry in entries if entry[1] == blob]
+        affected.update(
+            name for name, recorded_blob, _ in entries
+            if recorded_blob != blob
+        )
+        if not current:
+            continue
+        source = _git('show', '{0}:{1}'.format(
+            rev, os.path.relpath(path, root)
+        ))
+        functions = _changed_functions(source, hunks)
+        if functions is None:
+            return list(labels)
+        for name, _, lines in current:
+            lines = parse_lines(lines)
+            if any(
+                any(start <= line <= end for line in lines)
+                for start, end, _ in functions
+            ):
+                affected.add(name)
+    traced = database.traced()
+    untraced = database.untraced()
+    return [
+        label for label in labels
+        if label in affected or label.rpartition('.')[0] in affected or
+        label not in traced or label.rpartition('.')[0] in untraced
+    ]
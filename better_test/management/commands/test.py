@@ -1,17 +1,35 @@
 from __future__ import absolute_import
 from optparse import make_option
+import json
 import os
-import multiprocessing
-import itertools
+import subprocess
 import sys
 import warnings
 
+from django.core.management.base import CommandError
 from django.core.management.commands.test import Command as DjangoTest
 from django.conf import settings
 
-from ...database import read_database
+from ...compat import tracemalloc
+from ...compat import wait_for_connections
+from ...database import Database
+from ...discovery import DiscoveryCache
+from ...fixtures import PHASES
+from ...impact import ImpactProbe
+from ...impact import get_changes
+from ...impact import select_tests
+from ...memory import MemoryProbe
+from ...profiling import ProfileCollector
+from ...queries import QueryProbe
+from ...resources import auto_processes
 from ...utils import DisableMigrations
+from ...utils import get_authkey
 from ...utils import get_test_runner
+from ...utils import is_loopback
+from ...utils import name_to_label
+from ...utils import parse_address
+from ...utils import parse_processes
+from ...utils import parse_shard
 from ...core import Config
 from ...core import run
 from ...core import ISOLATED
@@ -25,6 +43,10 @@ SEPARATOR_2 = '-' * 70
 
 def args_builder(factory, parallel=True):
     args = []
+    # optparse has no optional option values
+    optional = lambda const: (
+        {} if factory is make_option else {'nargs': '?', 'const': const}
+    )
     if parallel:
         args.append(factory(
             '--parallel',
@@ -38,9 +60,31 @@ def args_builder(factory, parallel=True):
         factory('--failed',
                 action='store_true', dest='failed', default=False,
                 help='Re-run tests that failed the last time.'),
+        factory('--failed-first',
+                action='store_true', dest='failed_first', default=False,
+                help='Run tests that failed recently before all others.'),
         factory('--list-slow',
                 type=int, dest='list_slow', default=0,
                 help='Amount of slow tests to print.'),
+        factory('--list-slow-by', dest='list_slow_by', default='time',
+                help='Order --list-slow by duration, or by the number or time '
+                     'of database queries (see --count-queries).',
+                choices=['time', 'queries', 'query-time']),
+        factory('--count-queries',
+                action='store_true', dest='count_queries', default=False,
+                help='Count the database queries of each test and the time '
+                     'they take.'),
+        factory('--list-memory',
+                type=int, dest='list_memory', default=0,
+                help='Amount of tests that grew their worker the most to '
+                     'print.'),
+        factory('--trace-memory',
+                action='store_true', dest='trace_memory', default=False,
+                help='Also measure the peak of the memory each test '
+                     'allocates with tracemalloc (slow).'),
+        factory('--list-startup',
+                action='store_true', dest='list_startup', default=False,
+                help='Print how long each worker took to start.'),
         factory('--retest',
                 action='store_true', dest='retest', default=False,
                 help='Re-run the tests using the last configuration.'),
@@ -53,6 +97,64 @@ def args_builder(factory, parallel=True):
         factory('--migrate',
                 action='store_true', dest='migrate', default=False,
                 help='Run migrations (slow)'),
+        factory('--recycle-after',
+                type=int, dest='recycle_after', default=0,
+                help='Replace a worker process after it ran this many tests.'),
+        factory('--recycle-memory',
+                type=int, dest='recycle_memory', default=0,
+                help='Replace a worker process once it uses this many MB.'),
+        factory('--timeout',
+                type=float, dest='timeout', default=0,
+                help='Fail tests that take longer than this many seconds.'),
+        factory('--rediscover',
+                action='store_true', dest='rediscover', default=False,
+                help='Discover all tests instead of using the ones found '
+                     'last time.'),
+        factory('--shard', dest='shard', default=None, metavar='I/N',
+                help='Only run the I-th of N shards of the tests, balanced by '
+                     'their recorded durations.'),
+        factory('--export-timings', dest='export_timings', default=None,
+                metavar='FILE',
+                help='Write the timings and outcomes of this run to FILE, to '
+                     'be merged with testinfo --merge.'),
+        factory('--listen', dest='listen', default=None, metavar='ADDRESS',
+                help='Also run tests on the workers of agents that connect to '
+                     'host:port (see the test_worker command). Anyone who '
+                     'can connect and knows the key can run code here.'),
+        factory('--authkey', dest='authkey', default=None,
+                help='Key agents authenticate with, SECRET_KEY by default. '
+                     'Required to listen on other interfaces than loopback.'),
+        factory('--record-impact',
+                action='store_true', dest='record_impact', default=False,
+                help='Record which lines of code each test executes (slow).'),
+        factory('--changed', dest='changed', default=None, metavar='REV',
+                help='Only run tests affected by changes since the git '
+                     'revision REV (HEAD by default), and tests without '
+                     'recorded impact.',
+                **optional('HEAD')),
+        factory('--profile', dest='profile', default=None, metavar='FILE',
+                help='Profile the tests and write the merged profile to FILE '
+                     '(better_test.pstats by default).',
+                **optional('better_test.pstats')),
+        factory('--profile-above', type=float, dest='profile_above',
+                default=0, metavar='SECONDS',
+                help='Only profile tests expected to take at least this '
+                     'long.'),
+        factory('--profile-top', type=int, dest='profile_top', default=10,
+                help='Number of slowest profiled tests, and of their hottest '
+                     'functions, to print.'),
+        factory('--estimate', dest='estimate', default='p95',
+                help='Statistic of the recorded durations used to schedule '
+                     'tests.',
+                choices=['timing', 'mean', 'p50', 'p95']),
+        factory('--processes', dest='processes', default='auto',
+                metavar='N',
+                help='Number of worker processes, or auto (the default) for '
+                     'as many as the CPU quota, the available memory and the '
+                     'tests allow.'),
+        factory('--pin-workers',
+                action='store_true', dest='pin_workers', default=False,
+                help='Pin each worker process to its own CPU.'),
         factory('--start-method', dest='start_method', default='spawn',
                 help='Select multiprocessing spawn method',
                 choices=['fork', 'spawn', 'forkserver'])
@@ -84,15 +186,30 @@ class Command(DjangoTest):
         if options['vanilla']:
             return DjangoTest().handle(*test_labels, **options)
         else:
-            database = read_database()
+            database = Database()
+            if options['failed'] and not get_failed_labels(
+                    database.failed(), test_labels):
+                self.stdout.write("No failed tests to re-run\n")
+                database.close()
+                return
             test_runner_options = get_test_runner_options(options)
             test_labels, config = get_config(database, options, test_labels)
             patch_settings(options)
             result = run(test_labels, test_runner_options, config)
             display_result(self.stdout, result)
             if options['list_slow']:
-                list_slow(self.stdout, result, options['list_slow'])
-            save_result(result, database, options)
+                list_slow(
+                    self.stdout, result, options['list_slow'],
+                    options['list_slow_by']
+                )
+            if options['list_memory']:
+                list_memory(self.stdout, result, options['list_memory'])
+            if options['list_startup']:
+                list_startup(self.stdout, result)
+            if config.profile is not None:
+                write_profile(self.stdout, config.profile)
+            save_result(result, config.recorder, options)
+            database.close()
             sys.exit(result.total_failures)
 
 
@@ -114,8 +231,8 @@ def get_config(database, options, test_labels):
     """
     test_runner = get_test_runner(options.get('testrunner'))
 
-    if options['retest'] and database.get('last_run', None):
-        last_run = database['last_run']
+    last_run = database.last_run()
+    if options['retest'] and last_run:
         if last_run['isolate']:
             mode = ISOLATED
         elif last_run['parallel']:
@@ -123,24 +240,149 @@ def get_config(database, options, test_labels):
         else:
             mode = STANDARD
         test_labels = last_run['labels']
+    elif options['failed']:
+        mode = get_mode(options)
+        test_labels = get_failed_labels(database.failed(), test_labels)
     else:
-        if options['isolate']:
-            mode = ISOLATED
-        elif options['parallel']:
-            mode = PARALLEL
-        else:
-            mode = STANDARD
+        mode = get_mode(options)
+
+    discovery_cache = DiscoveryCache(database, refresh=options['rediscover'])
+
+    select = None
+    if options['changed']:
+        try:
+            changes = get_changes(options['changed'])
+        except (OSError, subprocess.CalledProcessError) as err:
+            raise CommandError(
+                "Could not get the changes since {rev}: {err}".format(
+                    rev=options['changed'], err=err
+                )
+            )
+        # Test modules whose tests were found in the discovery cache were
+        # not imported, but still count
+        select = lambda labels: select_tests(
+            labels, database, changes, options['changed'],
+            imported=discovery_cache.files
+        )
+
+    priority = ()
+    if options['failed_first']:
+        priority = get_failed_labels(database.recently_failed())
+
+    shard = None
+    if options['shard']:
+        try:
+            shard = parse_shard(options['shard'])
+        except ValueError as err:
+            raise CommandError(str(err))
+
+    listen = None
+    if options['listen']:
+        try:
+            listen = parse_address(options['listen'])
+        except ValueError as err:
+            raise CommandError(str(err))
+        if wait_for_connections is None:
+            raise CommandError("--listen needs Python 3.3 or later")
+        # The test run unpickles what the workers send it, so whoever can
+        # connect with the key can run code on this machine
+        if options['authkey'] is None and not is_loopback(listen[0]):
+            raise CommandError(
+                "--listen on {0} needs an --authkey: anyone who can connect "
+                "and knows the key can run code on this machine".format(
+                    listen[0]
+                )
+            )
+
+    try:
+        processes = parse_processes(options['processes'])
+    except ValueError as err:
+        raise CommandError(str(err))
+    if processes is None:
+        # Leave room for workers as large as they recently got
+        processes = auto_processes(database.worker_rss())
+
+    probes = []
+    if options['record_impact']:
+        probes.append(ImpactProbe(os.getcwd()))
+
+    if options['trace_memory'] and tracemalloc is None:
+        raise CommandError("--trace-memory needs Python 3.4 or later")
+    if (options['list_memory'] or options['trace_memory'] or
+            options['recycle_memory']):
+        probes.append(MemoryProbe(
+            trace=options['trace_memory'],
+            max_rss=options['recycle_memory'] * 1024 * 1024
+        ))
+
+    if options['count_queries']:
+        import django
+        if django.VERSION < (2, 0):
+            raise CommandError("--count-queries needs Django 2.0 or later")
+        probes.append(QueryProbe())
+
+    profile = None
+    if options['profile']:
+        profile = ProfileCollector(
+            options['profile'], options['profile_above'],
+            options['profile_top']
+        )
 
     return test_labels, Config(
         test_runner_class=test_runner,
         mode=mode,
-        timings=database.get('timings', {}),
-        processes=multiprocessing.cpu_count(),
+        timings=database.timings(options['estimate']),
+        processes=processes,
         verbosity=int(options['verbosity']),
-        start_method=options['start_method']
+        start_method=options['start_method'],
+        max_tests_per_worker=options['recycle_after'],
+        max_worker_memory=options['recycle_memory'],
+        # Shards must all be split by the same timings, which are only
+        # updated once their results are merged
+        recorder=database.start_run(record_statistics=shard is None),
+        probes=probes,
+        select=select,
+        priority=priority,
+        failfast=options.get('failfast', False),
+        timeout=options['timeout'],
+        listen=listen,
+        authkey=get_authkey(options['authkey']),
+        shard=shard,
+        discovery_cache=discovery_cache,
+        setup_costs=database.setup_costs(),
+        profile=profile,
+        auto_processes=options['processes'] == 'auto',
+        pin_workers=options['pin_workers'],
     )
 
 
+def get_mode(options):
+    if options['isolate']:
+        return ISOLATED
+    elif options['parallel']:
+        return PARALLEL
+    else:
+        return STANDARD
+
+
+def get_failed_labels(names, test_labels=()):
+    """
+    Turn the names of failed tests into labels to run them, restricted to the
+    given `test_labels` if there are any.
+    """
+    labels = []
+    for name in names:
+        label = name_to_label(name)
+        if label is None or label in labels:
+            continue
+        if test_labels and not any(
+                label == test_label or label.startswith(test_label + '.')
+                for test_label in test_labels):
+            continue
+        labels.append(label)
+    return labels
+
+
 def patch_settings(options):
     """
     Patch Django settings/environment.
@@ -188,6 +430,13 @@ def display_result(stream, result):
         writeln(SEPARATOR_2)
         writeln(str(chunk))
     writeln(SEPARATOR_2)
+    if result.predicted_time is not None:
+        writeln(
+            "Predicted {predicted:.3f}s (ideal {ideal:.3f}s)".format(
+                predicted=result.predicted_time,
+                ideal=result.ideal_time
+            )
+        )
     writeln(
         "Ran {number} test{plural} in {time:.3f}s".format(
             number=result.tests_run,
@@ -195,6 +444,29 @@ def display_result(stream, result):
             time=result.time_taken
         )
     )
+    if result.not_run:
+        writeln(
+            "Stopped after the first failure, {number} test{plural} not "
+            "run".format(
+                number=len(result.not_run),
+                plural=len(result.not_run) != 1 and "s were" or " was"
+            )
+        )
+    if result.coordinator_cpu is not None:
+        writeln("Coordinator CPU time {cpu:.3f}s".format(
+            cpu=result.coordinator_cpu
+        ))
+    if result.startup_times:
+        totals = [times['total'] for times in result.startup_times]
+        writeln(
+            "Started {number} worker{plural} in {mean:.3f}s on average "
+            "(slowest {slowest:.3f}s)".format(
+                number=len(totals),
+                plural=len(totals) != 1 and "s" or "",
+                mean=sum(totals) / len(totals),
+                slowest=max(totals)
+            )
+        )
     writeln('')
 
     # Display info about failures etc
@@ -233,45 +505,133 @@ def display_result(stream, result):
         writeln('')
 
 
-def list_slow(stream, result, num):
+def list_slow(stream, result, num, by='time'):
     """
-    List the `num` slowest tests.
+    List the `num` slowest tests, and test classes by the time their
+    fixtures took. Tests and classes are ordered `by` their duration
+    (`time`), or by the number of database queries they made (`queries`) or
+    the time those took (`query-time`), if they were counted.
     """
     writeln = lambda s: stream.write('{0}\n'.format(s))
     writeln("Slowest tests:")
+    queries = result.queries
+    if by == 'time':
+        key = lambda test: result.timings[test]
+    else:
+        index = 0 if by == 'queries' else 1
+        key = lambda test: queries.get(test, (0, 0.0))[index]
+    slowest = sorted(result.timings, key=key, reverse=True)
+    for test in slowest[:num]:
+        line = " {timing:.3f}s: {test}".format(
+            timing=result.timings[test], test=test
+        )
+        if test in queries:
+            line += " ({count} queries, {duration:.3f}s)".format(
+                count=queries[test][0], duration=queries[test][1]
+            )
+        writeln(line)
+    writeln('')
+    if not result.class_timings:
+        return
+    writeln("Slowest class fixtures:")
+    class_queries = result.class_queries
+    if by == 'time':
+        key = lambda item: item[0]
+    else:
+        key = lambda item: class_queries.get(item[1], (0, 0.0))[index]
     slowest = sorted(
-        ((timing, test) for test, timing in result.timings.items()),
+        ((sum(phases.values()), name, phases)
+         for name, phases in result.class_timings.items()),
+        key=key, reverse=True
+    )
+    for total, name, phases in slowest[:num]:
+        line = " {total:.3f}s: {name} ({phases})".format(
+            total=total, name=name, phases=', '.join(
+                '{phase} {timing:.3f}s'.format(
+                    phase=phase, timing=phases[phase]
+                ) for phase in PHASES if phase in phases
+            )
+        )
+        if name in class_queries:
+            line += " ({count} queries, {duration:.3f}s)".format(
+                count=class_queries[name][0],
+                duration=class_queries[name][1]
+            )
+        writeln(line)
+    writeln('')
+
+
+def list_memory(stream, result, num):
+    """
+    List the `num` tests that grew the resident set size of their worker the
+    most.
+    """
+    writeln = lambda s: stream.write('{0}\n'.format(s))
+    megabyte = 1024.0 * 1024
+    writeln("Tests using the most memory:")
+    largest = sorted(
+        ((delta, test, rss, peak)
+         for test, (delta, rss, peak) in result.memory.items()),
         reverse=True
     )
-    for timing, test in slowest[:num]:
-        writeln(" {timing:.3f}s: {test}".format(timing=timing, test=test))
+    for delta, test, rss, peak in largest[:num]:
+        line = " {delta:+.1f} MB: {test} ({rss:.1f} MB".format(
+            delta=delta / megabyte, test=test, rss=rss / megabyte
+        )
+        if peak is not None:
+            line += ', {peak:.1f} MB traced peak'.format(peak=peak / megabyte)
+        writeln(line + ')')
     writeln('')
 
 
-def save_result(result, database, options):
+def list_startup(stream, result):
     """
-    Persist the result and the options to the database.
+    List how long each worker took to start, and how much of that it spent
+    setting up Django and the test databases.
     """
-    # Record timings to database
-    data = {
-        'timings': database.get('timings', {}),
-    }
-    for test, timing in result.timings.items():
-        data['timings'][test] = timing
-
-    # Record failed tests to database
-    data['failed'] = [
-        test.qualname for test, _ in itertools.chain(
-            result.failures,
-            result.errors,
-            [(test, None) for test in result.unexpected_successes]
+    writeln = lambda s: stream.write('{0}\n'.format(s))
+    writeln("Worker startup:")
+    writeln("  slot     total    django  databases")
+    for times in result.startup_times:
+        writeln(
+            "{slot:6d} {total:8.3f}s {django:8.3f}s {databases:9.3f}s".format(
+                **times
+            )
         )
-    ]
+    writeln('')
 
-    # Record config to database
-    data['last_run'] = {
+
+def write_profile(stream, profile):
+    """
+    Write the merged profile of the tests, and list the hottest functions of
+    the slowest ones.
+    """
+    writeln = lambda s: stream.write('{0}\n'.format(s))
+    if not profile.save():
+        writeln("No tests were profiled")
+        return
+    writeln("Hottest functions of the slowest profiled tests:")
+    writeln('')
+    profile.report(stream)
+    writeln("Profile of {number} tests written to {path}".format(
+        number=len(profile.hot), path=profile.path
+    ))
+
+
+def save_result(result, recorder, options):
+    """
+    Finish recording the run, storing the options to re-run it with, and
+    export its results if asked to.
+    """
+    if result.peak_rss:
+        recorder.record_worker_rss(result.peak_rss)
+    recorder.finish(result.success, {
         'isolate': options['isolate'],
         'parallel': options['parallel'],
         'list_slow': options['list_slow'],
         'labels': result.test_labels,
-    }
+    })
+    if options['export_timings']:
+        results = recorder.database.results(recorder.run_id)
+        with open(options['export_timings'], 'w') as fobj:
+            json.dump({'results': results}, fobj)
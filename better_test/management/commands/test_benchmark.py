@@ -0,0 +1,114 @@
+from __future__ import absolute_import
+from optparse import make_option
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from ...benchmark import MODES
+from ...benchmark import benchmark
+from ...benchmark import compare
+from ...resources import get_cpu_count
+from ...utils import get_test_runner
+
+
+def args_builder(factory):
+    return [
+        factory('--output', dest='output', default=None, metavar='FILE',
+                help='Write the results to FILE as JSON.'),
+        factory('--compare', dest='compare', default=None, metavar='FILE',
+                help='Compare the results to those written to FILE by an '
+                     'earlier run.'),
+        factory('--suite', action='append', dest='suites', default=None,
+                help='Only run this suite (noop, small_classes, setup or '
+                     'database), can be given several times.'),
+        factory('--mode', action='append', dest='modes', default=None,
+                choices=sorted(MODES),
+                help='Only run in this mode, can be given several times.'),
+        factory('--processes', type=int, dest='processes',
+                default=None,
+                help='Number of worker processes, one per CPU by default.'),
+        factory('--scale', type=float, dest='scale', default=1.0,
+                help='Scale the number of tests of the suites by this.'),
+        factory('--isolated-limit', type=int, dest='isolated_limit',
+                default=500,
+                help='Number of tests of each suite to run in isolated mode.'),
+        factory('--repeat', type=int, dest='repeat', default=1,
+                help='Run each benchmark this many times and keep the '
+                     'fastest run.'),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the test runner's own overhead."
+
+    if hasattr(BaseCommand, 'option_list'):
+        option_list = BaseCommand.option_list + tuple(args_builder(make_option))
+
+    def add_arguments(self, parser):
+        args_builder(parser.add_argument)
+
+    def handle(self, *args, **options):
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as fobj:
+                    previous = json.load(fobj)
+            except (IOError, OSError, ValueError) as err:
+                raise CommandError("Could not read {path}: {err}".format(
+                    path=options['compare'], err=err
+                ))
+        processes = options['processes']
+        if processes is None:
+            processes = get_cpu_count()
+        results = benchmark(
+            get_test_runner(),
+            suites=options['suites'],
+            modes=options['modes'],
+            processes=processes,
+            scale=options['scale'],
+            isolated_limit=options['isolated_limit'],
+            repeat=options['repeat'],
+        )
+        self.write_results(results)
+        if previous is not None:
+            self.write_comparison(compare(previous, results))
+        if options['output']:
+            with open(options['output'], 'w') as fobj:
+                json.dump(results, fobj, indent=2, sort_keys=True)
+
+    def write_results(self, results):
+        self.stdout.write(
+            "suite          mode        tests     wall  per test  parent cpu "
+            "  results/s  partition  startup\n"
+        )
+        for result in results['results']:
+            partition = result['partition'].get('simple_weighted_partition')
+            self.stdout.write(
+                "{suite:<14} {mode:<9} {tests:7d} {wall:7.2f}s "
+                "{overhead:7.2f}ms {cpu:10.2f}s {throughput:>11} "
+                "{partition:>10} {startup:>8}\n".format(
+                    suite=result['suite'], mode=result['mode'],
+                    tests=result['tests_run'], wall=result['wall_time'],
+                    overhead=result['overhead_per_test'] * 1000,
+                    cpu=result['parent_cpu'],
+                    throughput='-' if result['throughput'] is None else
+                    '{0:.0f}'.format(result['throughput']),
+                    partition='-' if partition is None else
+                    '{0:.3f}'.format(partition['makespan']),
+                    startup='-' if result['worker_startup'] is None else
+                    '{0:.2f}s'.format(result['worker_startup']),
+                )
+            )
+
+    def write_comparison(self, changes):
+        self.stdout.write("\nCompared to the earlier results\n\n")
+        for suite, mode, metric, before, after in changes:
+            change = (after - before) / before * 100 if before else 0.0
+            self.stdout.write(
+                "{suite:<14} {mode:<9} {metric:<18} {before:9.3f} "
+                "{after:9.3f} {change:+7.1f}%\n".format(
+                    suite=suite, mode=mode, metric=metric, before=before,
+                    after=after, change=change
+                )
+            )
@@ -0,0 +1,65 @@
+from __future__ import absolute_import
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from ...compat import wait_for_connections
+from ...parallel import run_agent
+from ...resources import get_cpu_count
+from ...utils import get_authkey
+from ...utils import parse_address
+
+
+def args_builder(factory):
+    return [
+        factory('--connect', dest='connect', default=None, metavar='ADDRESS',
+                help='host:port of the test run to work for (see the --listen '
+                     'option of the test command).'),
+        factory('--processes', type=int, dest='processes',
+                default=None,
+                help='Number of worker processes to run, one per CPU by '
+                     'default.'),
+        factory('--authkey', dest='authkey', default=None,
+                help='Key to authenticate with, SECRET_KEY by default.'),
+        factory('--retry', type=float, dest='retry', default=30,
+                help='Seconds to keep trying to connect.'),
+        factory('--start-method', dest='start_method', default='spawn',
+                help='Select multiprocessing spawn method',
+                choices=['fork', 'spawn', 'forkserver']),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Run tests for a test run on another machine.'
+
+    if hasattr(BaseCommand, 'option_list'):
+        option_list = BaseCommand.option_list + tuple(args_builder(make_option))
+
+    def add_arguments(self, parser):
+        args_builder(parser.add_argument)
+
+    def handle(self, *args, **options):
+        if not options['connect']:
+            raise CommandError("--connect is required")
+        if wait_for_connections is None:
+            raise CommandError("Agents need Python 3.3 or later")
+        try:
+            address = parse_address(options['connect'])
+        except ValueError as err:
+            raise CommandError(str(err))
+        processes = options['processes']
+        if processes is None:
+            processes = get_cpu_count()
+        try:
+            run_agent(
+                address,
+                get_authkey(options['authkey']),
+                processes,
+                start_method=options['start_method'],
+                retry=options['retry'],
+            )
+        except (IOError, OSError) as err:
+            raise CommandError("Could not connect to {address}: {err}".format(
+                address=options['connect'], err=err
+            ))
@@ -1,28 +1,142 @@
 from __future__ import absolute_import
+from optparse import make_option
+import json
+import math
+import os
 
 from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
 
-from ...database import read_database
+from ...database import Database
+from ...database import _get_default_path
+from ...fixtures import PHASES
+
+# Statistics the timings can be ordered by
+SORT_ORDERS = ['p95', 'queries', 'query-time']
 
 
 class Command(BaseCommand):
+    if hasattr(BaseCommand, 'option_list'):
+        option_list = BaseCommand.option_list + (
+            make_option('--merge',
+                        action='store_true', dest='merge', default=False,
+                        help='Merge the results exported by test '
+                             '--export-timings in the given files.'),
+            make_option('--sort-by', dest='sort_by', default='p95',
+                        help='Order tests by this statistic.',
+                        choices=SORT_ORDERS),
+        )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*')
+        parser.add_argument('--merge',
+                            action='store_true', dest='merge', default=False,
+                            help='Merge the results exported by test '
+                                 '--export-timings in the given files.')
+        parser.add_argument('--sort-by', dest='sort_by', default='p95',
+                            help='Order tests by this statistic.',
+                            choices=SORT_ORDERS)
+
     def handle(self, *args, **options):
-        database = read_database()
+        files = list(args) + list(options.get('files') or [])
+        if options['merge']:
+            self.merge(files)
+            return
+        # Opening the database would create an empty one
+        if not os.path.exists(_get_default_path()):
+            self.stdout.write("No database found\n")
+            return
+        database = Database()
         if not database:
             self.stdout.write("No database found\n")
+            database.close()
             return
         self.stdout.write("Last run test results\n")
         self.stdout.write("=====================\n\n")
         self.stdout.write("\n")
         self.stdout.write("Timings\n\n")
-        for test, duration in sorted(database.get('timings', {}).items(),
-                                     key=lambda x: -x[1]):
+        self.stdout.write(
+            "   last    mean  stddev     p50     p95  runs queries db time "
+            "test\n"
+        )
+        queries = database.queries()
+        statistics = database.statistics()
+        if options['sort_by'] == 'p95':
+            key = lambda test: statistics[test][5]
+        else:
+            index = 0 if options['sort_by'] == 'queries' else 1
+            key = lambda test: queries.get(test, (-1, -1.0))[index]
+        for test in sorted(statistics, key=key, reverse=True):
+            last, samples, mean, variance, p50, p95 = statistics[test]
+            if test in queries:
+                count, duration = queries[test]
+                counted = "{0:7d} {1:7.3f}".format(count, duration)
+            else:
+                counted = "{0:>7} {0:>7}".format('-')
             self.stdout.write(
-                "{duration:-7.3f} {test}\n".format(
-                    test=test, duration=duration
+                "{last:-7.3f} {mean:-7.3f} {stddev:-7.3f} {p50:-7.3f} "
+                "{p95:-7.3f} {samples:5d} {counted} {test}\n".format(
+                    test=test, last=last, mean=mean,
+                    stddev=math.sqrt(variance), p50=p50, p95=p95,
+                    samples=samples, counted=counted
                 )
             )
         self.stdout.write("\n")
+        self.write_class_timings(database.class_timings(), queries)
         self.stdout.write("Failed tests:\n\n")
-        for failed in database.get('failed', []):
+        for failed in database.failed():
             self.stdout.write('    ' + failed + '\n')
+        database.close()
+
+    def write_class_timings(self, class_timings, queries):
+        """
+        The mean time spent in each phase of the test classes' fixtures, and
+        the database queries they made the last time those were counted.
+        """
+        if not class_timings:
+            return
+        self.stdout.write("Class fixtures (mean)\n\n")
+        self.stdout.write(
+            "".join("{0:>14} ".format(phase) for phase in PHASES) +
+            "  total queries db time class\n"
+        )
+        rows = sorted(
+            (sum(mean for _, _, mean in phases.values()), name, phases)
+            for name, phases in class_timings.items()
+        )
+        for total, name, phases in reversed(rows):
+            if name in queries:
+                count, duration = queries[name]
+                counted = "{0:7d} {1:7.3f}".format(count, duration)
+            else:
+                counted = "{0:>7} {0:>7}".format('-')
+            self.stdout.write("".join(
+                "{0:14.3f} ".format(phases[phase][2]) if phase in phases
+                else "{0:>14} ".format('-')
+                for phase in PHASES
+            ) + "{total:7.3f} {counted} {name}\n".format(
+                total=total, counted=counted, name=name
+            ))
+        self.stdout.write("\n")
+
+    def merge(self, files):
+        """
+        Record the results of the shards of a run as a single run.
+        """
+        if not files:
+            raise CommandError("No files to merge")
+        results = []
+        for path in files:
+            try:
+                with open(path) as fobj:
+                    results.extend(json.load(fobj)['results'])
+            except (IOError, OSError, ValueError, KeyError) as err:
+                raise CommandError("Could not read {path}: {err}".format(
+                    path=path, err=err
+                ))
+        database = Database()
+        database.import_results(results)
+        database.close()
+        self.stdout.write("Merged {number} results from {files} files\n".format(
+            number=len(results), files=len(files)
+        ))
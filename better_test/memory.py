@@ -0,0 +1,52 @@
+"""
+Measure how much memory each test makes its worker process use.
+"""
+from __future__ import absolute_import
+
+from .compat import tracemalloc
+from .probes import Probe
+from .utils import get_rss
+
+
+class MemoryProbe(Probe):
+    """
+    Measures the worker's resident set size after each test, and how much it
+    grew during the test. With `trace`, tracemalloc also measures the peak of
+    the memory Python allocated during the test.
+
+    The metric is `[rss delta, rss, traced peak or None]`, in bytes.
+
+    Once the worker uses `max_rss` bytes or more, it stops taking tests, so
+    the pool can replace it without waiting for the end of its chunk.
+    """
+    name = 'memory'
+
+    def __init__(self, trace=False, max_rss=0):
+        self.trace = trace
+        self.max_rss = max_rss
+        self.rss = 0
+        self.traced = 0
+
+    def setup(self):
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start_test(self, test):
+        if self.trace:
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.clear_traces()
+            self.traced = tracemalloc.get_traced_memory()[0]
+        self.rss = get_rss()
+
+    def stop_test(self, test):
+        start = self.rss
+        self.rss = get_rss()
+        peak = None
+        if self.trace:
+            peak = max(tracemalloc.get_traced_memory()[1] - self.traced, 0)
+        return [self.rss - start, self.rss, peak]
+
+    def exhausted(self):
+        return bool(self.max_rss) and self.rss >= self.max_rss
@@ -1,20 +1,53 @@
 from __future__ import absolute_import
 
+import os
+import shutil
+import signal
+import socket
+import sys
+import itertools
+import tempfile
+import threading
 import time
 import multiprocessing
+from multiprocessing.connection import Client
+from multiprocessing.connection import Listener
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import faulthandler
+except ImportError:
+    faulthandler = None
 
 from .compat import unittest
 from .compat import PY_26
+from .compat import queue
 from .compat import get_multiprocessing_context
+from .compat import wait_for_connections
+from .cloning import DatabaseTemplate
+from .cloning import use_clones
+from .fixtures import FixtureTimer
+from .resources import get_cpu_count
+from .resources import get_cpus
+from .resources import pin_process
 from .utils import null_stdout
 from .utils import serialize
-from .utils import get_settings_dict
+from .utils import get_settings_bootstrap
+from .utils import get_rss
+from .utils import get_timeout
+from .utils import iter_tests
+from .utils import test_to_dotted
 
 
 try:
     from coverage.collector import Collector
     from coverage.control import coverage
-    if Collector._collectors:
+    coverage_active = bool(Collector._collectors)
+    if coverage_active:
         def mixin_coverage(cls):
             original = cls._bootstrap
             class Process(cls):
@@ -30,71 +63,886 @@ try:
     else:
         mixin_coverage = lambda cls: cls
 except ImportError:
+    coverage_active = False
     mixin_coverage = lambda cls: cls
 
 
+# Dumping a worker's stack on request needs faulthandler and SIGUSR1
+can_dump_stacks = faulthandler is not None and hasattr(signal, 'SIGUSR1')
+
+# Seconds between checks whether a worker finished dumping its stack
+STACK_DUMP_INTERVAL = 0.05
+
+
+# Forking workers from a preloaded zygote needs fork and a way to wait for the
+# zygote's connection and SIGCHLD at once. Forked workers exit without
+# running coverage's hooks, so the zygote is not used under coverage either.
+can_use_zygote = (
+    hasattr(os, 'fork') and fcntl is not None and
+    wait_for_connections is not None and not coverage_active
+)
+
+
+class Worker(object):
+    """
+    A long-lived task process of the pool. Chunks of test labels are sent to it
+    through its end of a pipe, results come back through the same pipe.
+    """
+    def __init__(self, process, connection, slot, created=None):
+        self.process = process
+        self.connection = connection
+        self.slot = slot
+        # When the process was started, to measure how long it takes until
+        # it is ready to run tests
+        self.created = time.time() if created is None else created
+        self.chunk = None
+        self.current = None
+        self.current_id = None
+        self.started_at = None
+        self.timeout = None
+        self.deadline = None
+        # [test id, when to give up, size so far, when to look again] while
+        # the worker dumps its stack, see `Pool.dump_stack`
+        self.stack_dump = None
+        self.finished = set()
+        self.tests = {}
+        self.tests_run = 0
+        # Resident set size in bytes, as of the last test that reported it
+        self.rss = None
+        self.retiring = False
+        self.releasing = False
+        self.terminated = False
+        self.disconnected = False
+
+    @property
+    def idle(self):
+        return self.chunk is None and not (self.retiring or self.terminated)
+
+    @property
+    def unstarted(self):
+        """
+        Labels of the current chunk that have neither finished nor started.
+        """
+        if self.chunk is None or self.releasing:
+            return []
+        return [
+            label for label in self.chunk
+            if label not in self.finished and label != self.current
+        ]
+
+    @property
+    def unfinished(self):
+        """
+        Labels of the current chunk that did not finish (yet).
+        """
+        if self.chunk is None:
+            return []
+        return [label for label in self.chunk if label not in self.finished]
+
+    def send_chunk(self, chunk):
+        self.chunk = chunk
+        self.current = None
+        self.current_id = None
+        self.deadline = None
+        self.finished = set()
+        self.connection.send(('run', chunk))
+
+    def release(self):
+        """
+        Ask the worker to stop after its current test and hand back the labels
+        of its chunk it did not start yet.
+        """
+        self.releasing = True
+        self.connection.send(('release', ()))
+
+    def retire(self):
+        """
+        Ask the worker to tear down its test databases and exit once it is
+        done with its current chunk.
+        """
+        self.retiring = True
+        self.connection.send(('exit', ()))
+
+    def terminate(self):
+        """
+        Kill the worker without waiting for its current test.
+        """
+        self.terminated = True
+        self.process.terminate()
+
+
+class ForkedProcess(object):
+    """
+    Stands in for the process of a worker forked by the zygote, which is not a
+    child of this process. The zygote reports its pid and exit code. If the
+    zygote died, its workers are orphaned and their exit code is unknown.
+    """
+    def __init__(self):
+        self.pid = None
+        self.exitcode = None
+        self.orphaned = False
+
+    def is_alive(self):
+        if self.exitcode is None and self.orphaned:
+            try:
+                os.kill(self.pid, 0)
+            except OSError:
+                self.exitcode = 0
+        return self.exitcode is None
+
+    def join(self):
+        pass
+
+    def terminate(self):
+        # A worker that is not forked yet is killed once the zygote reports
+        # its pid.
+        if self.pid is not None and self.exitcode is None:
+            try:
+                os.kill(self.pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+
+class Zygote(object):
+    def __init__(self, process, connection):
+        self.process = process
+        self.connection = connection
+
+    def fork(self, worker_connection, slot, clones, stack_file):
+        self.connection.send((
+            'fork', (worker_connection, slot, clones, stack_file)
+        ))
+
+    def exit(self):
+        self.connection.send(('exit', ()))
+        self.process.join()
+        self.connection.close()
+
+
+class RemoteProcess(object):
+    """
+    Stands in for the process of a worker an agent started on another
+    machine. The agent reports its exit code, and kills it when asked to. If
+    the agent is lost, so are its workers.
+    """
+    pid = None
+
+    def __init__(self, agent, slot):
+        self.agent = agent
+        self.slot = slot
+        self.exitcode = None
+        self.lost = False
+
+    def is_alive(self):
+        return self.exitcode is None
+
+    def join(self):
+        pass
+
+    def terminate(self):
+        self.agent.terminate(self.slot)
+
+
+class Agent(object):
+    """
+    The pool's end of the connection to an agent (``manage.py test_worker``),
+    which starts a worker process in one of its `slots` when asked to.
+    """
+    def __init__(self, connection, hostname, slots):
+        self.connection = connection
+        self.hostname = hostname
+        self.free = list(slots)
+        self.starting = set()
+
+    def spawn(self):
+        slot = self.free.pop(0)
+        self.starting.add(slot)
+        self.connection.send(('spawn', slot))
+
+    def terminate(self, slot):
+        try:
+            self.connection.send(('terminate', slot))
+        except (IOError, OSError):
+            pass
+
+    def close(self):
+        self.connection.close()
+
+
+class AgentListener(object):
+    """
+    Accepts the connections of agents and their workers in a thread, so a
+    slow handshake doesn't hold up the pool. Accepted connections are queued
+    with their first message, and `ready` becomes readable.
+    """
+    def __init__(self, address, authkey):
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self.accepted = queue.Queue()
+        self.ready, self.notify = multiprocessing.Pipe(duplex=False)
+        self.closed = False
+        self.thread = threading.Thread(target=self.accept_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def accept_loop(self):
+        while not self.closed:
+            try:
+                connection = self.listener.accept()
+                message = connection.recv()
+            except Exception:
+                # Failed handshakes, or woken up to close
+                continue
+            self.accepted.put((connection, message))
+            self.notify.send(None)
+
+    def accept(self):
+        """
+        The connections accepted so far, with their first messages.
+        """
+        while self.ready.poll():
+            self.ready.recv()
+        accepted = []
+        while True:
+            try:
+                accepted.append(self.accepted.get_nowait())
+            except queue.Empty:
+                return accepted
+
+    def close(self):
+        self.closed = True
+        # Closing the socket does not interrupt accept(), connecting does
+        host, port = self.address
+        if host in ('0.0.0.0', '::'):
+            host = 'localhost'
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+        except (IOError, OSError):
+            pass
+        self.thread.join(5)
+        self.listener.close()
+        for connection, _ in self.accept():
+            connection.close()
+        self.ready.close()
+        self.notify.close()
+
+
 class Pool(object):
-    def __init__(self, real_result, max_processes=multiprocessing.cpu_count(),
-                 start_method='spawn'):
+    def __init__(self, real_result, max_processes=None,
+                 start_method='spawn', reuse_workers=True,
+                 max_tests_per_worker=0, max_worker_memory=0,
+                 preload_labels=None, clone_databases=False, probes=(),
+                 failfast=False, stop_timeout=5, timeout=0, listen=None,
+                 authkey=None, pin_workers=False):
         self.real_result = real_result
+        if max_processes is None:
+            max_processes = get_cpu_count()
         self.max_processes = max_processes
-        self.processes = []
+        self.workers = []
         self.context = get_multiprocessing_context(start_method)
-        self.results = self.context.Queue()
+        self.reuse_workers = reuse_workers
+        self.max_tests_per_worker = max_tests_per_worker
+        self.max_worker_memory = max_worker_memory
         self.failed_executors = []
+        self.scheduler = None
+        self.preload_labels = preload_labels
+        self.zygote = None
+        self.clone_databases = clone_databases
+        self.template = None
+        self.probes = probes
+        self.failfast = failfast
+        self.stop_timeout = stop_timeout
+        self.stopped_at = None
+        self.not_run = []
+        self.timeout = timeout
+        self.stack_dir = None
+        # Address to listen on for agents running workers on other machines
+        self.listen = listen
+        self.authkey = authkey
+        self.listener = None
+        self.agents = []
+        self.next_remote_slot = max_processes
+        self.runner = None
+        # Pin each local worker to one of the CPUs this process may run on
+        self.cpus = get_cpus() if pin_workers else None
+        # The most memory any local worker used, in bytes
+        self.peak_rss = None
+        # How long each worker took to start, see `handle_message`
+        self.startup_times = []
 
-    def run(self, chunks, runner_class, runner_options):
-        settings_dict = get_settings_dict()
-        chunk_num = 0
-        while chunks:
-            while len(self.processes) >= self.max_processes:
+    def run(self, scheduler, runner_class, runner_options):
+        from django.conf import settings
+        bootstrap = get_settings_bootstrap()
+        self.scheduler = scheduler
+        if self.clone_databases and DatabaseTemplate.supported():
+            self.template = DatabaseTemplate(runner_class, runner_options)
+            self.template.setup()
+        if can_dump_stacks:
+            self.stack_dir = tempfile.mkdtemp(prefix='better-test-')
+        self.runner = (
+            runner_class, runner_options,
+            getattr(settings, 'MIGRATION_MODULES', None)
+        )
+        try:
+            if self.listen is not None:
+                self.listener = AgentListener(self.listen, self.authkey)
+            if self.preload_labels and can_use_zygote:
+                self.start_zygote(runner_class, runner_options, bootstrap)
+            while scheduler.pending or self.workers or any(
+                    agent.starting for agent in self.agents):
+                for worker in self.workers:
+                    if worker.idle:
+                        self.feed(worker)
+                while (scheduler.pending and
+                       self.local_workers < self.max_processes):
+                    self.start_worker(
+                        scheduler.next_batch(),
+                        runner_class,
+                        runner_options,
+                        bootstrap
+                    )
+                for agent in self.agents:
+                    while scheduler.pending and agent.free:
+                        agent.spawn()
                 self.handle_results()
-            chunk = chunks.pop()
-            process = mixin_coverage(self.context.Process)(
-                target=executor,
-                args=(
-                    chunk,
-                    runner_class,
-                    runner_options,
-                    chunk_num,
-                    self.results,
-                    settings_dict
-                )
+                self.check_deadlines()
+                if (self.stopped_at is not None and
+                        time.time() >= self.stopped_at + self.stop_timeout):
+                    for worker in self.workers:
+                        if worker.chunk is not None and not worker.terminated:
+                            worker.terminate()
+        finally:
+            if self.listener is not None:
+                self.listener.close()
+                self.listener = None
+            for agent in self.agents:
+                agent.close()
+            if self.zygote is not None:
+                self.zygote.exit()
+                self.zygote = None
+            if self.template is not None:
+                self.template.teardown()
+                self.template = None
+            if self.stack_dir is not None:
+                shutil.rmtree(self.stack_dir, ignore_errors=True)
+                self.stack_dir = None
+        return self.failed_executors
+
+    @property
+    def local_workers(self):
+        return sum(
+            1 for worker in self.workers
+            if not isinstance(worker.process, RemoteProcess)
+        )
+
+    def feed(self, worker):
+        """
+        Give an idle worker its next chunk. If the queue ran dry, steal work
+        from the busy worker with the most work left for it, or let it exit if
+        there is nothing worth stealing.
+        """
+        if self.stopped_at is not None:
+            worker.retire()
+            return
+        batch = self.scheduler.next_batch()
+        if batch:
+            worker.send_chunk(batch)
+        elif any(other.releasing for other in self.workers):
+            # Work is about to be handed back, wait for it
+            pass
+        elif not self.steal():
+            worker.retire()
+
+    def stop(self):
+        """
+        Stop the run after the first failure: hand out no more tests, and ask
+        the busy workers to stop after their current test. Workers that don't
+        stop within `stop_timeout` seconds are terminated.
+        """
+        if self.stopped_at is not None:
+            return
+        self.stopped_at = time.time()
+        self.not_run.extend(self.scheduler.drain())
+        for worker in self.workers:
+            if worker.chunk is not None and not worker.releasing:
+                worker.release()
+
+    def steal(self):
+        if not self.scheduler.stealing:
+            return False
+        # Taking the only label of a chunk that has not started yet would just
+        # move the chunk around.
+        candidates = [
+            worker for worker in self.workers
+            if len(worker.unstarted) > (0 if worker.current else 1)
+        ]
+        if not candidates:
+            return False
+        victim = max(candidates, key=lambda worker: (
+            self.scheduler.estimate(worker.unstarted), len(worker.unstarted)
+        ))
+        victim.release()
+        return True
+
+    def start_zygote(self, runner_class, runner_options, bootstrap):
+        connection, zygote_connection = self.context.Pipe()
+        process = self.context.Process(
+            target=zygote,
+            args=(
+                zygote_connection,
+                runner_class,
+                runner_options,
+                self.preload_labels,
+                bootstrap,
+                self.probes,
+                self.timeout
             )
-            process.start()
-            self.processes.append((process, chunk))
-            chunk_num += 1
+        )
+        process.start()
+        zygote_connection.close()
+        self.zygote = Zygote(process, connection)
 
-        while len(self.processes):
-            self.handle_results()
+    def start_worker(self, chunk, runner_class, runner_options, bootstrap):
+        used_slots = set(worker.slot for worker in self.workers)
+        slot = min(set(range(self.max_processes)) - used_slots)
+        connection, worker_connection = self.context.Pipe()
+        clones = self.template.clone(slot) if self.template else None
+        stack_file = self.get_stack_file(slot)
+        created = time.time()
+        if self.zygote is not None:
+            self.zygote.fork(worker_connection, slot, clones, stack_file)
+            worker_connection.close()
+            worker = Worker(ForkedProcess(), connection, slot, created)
+            worker.send_chunk(chunk)
+            self.workers.append(worker)
+            return
+        process = mixin_coverage(self.context.Process)(
+            target=executor,
+            args=(
+                worker_connection,
+                runner_class,
+                runner_options,
+                slot,
+                clones,
+                bootstrap,
+                self.probes,
+                self.timeout,
+                stack_file
+            )
+        )
+        process.start()
+        worker_connection.close()
+        self.pin(process.pid, slot)
+        worker = Worker(process, connection, slot, created)
+        worker.send_chunk(chunk)
+        self.workers.append(worker)
 
-        return self.failed_executors
+    def pin(self, pid, slot):
+        if self.cpus:
+            pin_process(pid, self.cpus[slot % len(self.cpus)])
+
+    def get_stack_file(self, slot):
+        if self.stack_dir is None:
+            return None
+        return os.path.join(self.stack_dir, 'stack-{0}.txt'.format(slot))
+
+    def check_deadlines(self):
+        now = time.time()
+        for worker in self.workers:
+            if worker.terminated:
+                continue
+            if worker.stack_dump is not None:
+                if now >= worker.stack_dump[3]:
+                    self.check_stack_dump(worker, now)
+            elif worker.deadline is not None and now >= worker.deadline:
+                self.time_out(worker)
+
+    def time_out(self, worker):
+        """
+        Kill a worker whose current test ran out of time, report the test as
+        an error (with the worker's stack if possible), and requeue the rest
+        of its chunk.
+        """
+        self.receive(worker)
+        if worker.deadline is None or worker.terminated:
+            # The test finished after all
+            return
+        if not self.dump_stack(worker):
+            self.kill_timed_out(worker, '')
+
+    def kill_timed_out(self, worker, stack):
+        worker.terminate()
+        message = 'Timeout: {0} did not finish within {1:g}s'.format(
+            worker.current, worker.timeout
+        )
+        if stack:
+            message += '\n\n' + stack
+        self.abort_test(worker, message)
+
+    def crashed(self, worker):
+        """
+        Blame the crash of a worker on the test it was running, reported as
+        an error, and requeue the rest of its chunk. Results the worker did
+        not send yet are lost, so those tests run again. If the worker
+        crashed outside of a test, like in a class fixture, its chunk fails
+        as a whole.
+        """
+        exitcode = worker.process.exitcode
+        if worker.current_id not in worker.tests:
+            self.failed_executors.append((worker.unfinished, exitcode))
+            return
+        message = (
+            'Crash: the worker exited with code {0} while running {1}'.format(
+                exitcode, worker.current
+            )
+        )
+        if worker.rss is not None:
+            message += ', it last used {0} MB of memory'.format(
+                worker.rss // (1024 * 1024)
+            )
+        self.abort_test(worker, message)
+
+    def abort_test(self, worker, message):
+        """
+        Report the current test of a worker that is gone as an error, and
+        hand the rest of its chunk to other workers.
+        """
+        test = worker.tests.pop(worker.current_id)
+        self.real_result.startTest(test)
+        self.real_result.addError(test, message)
+        self.real_result.registerTiming(test, time.time() - worker.started_at)
+        worker.finished.add(test.qualname)
+        remaining = worker.unfinished
+        worker.chunk = None
+        worker.deadline = None
+        worker.stack_dump = None
+        self.requeue(remaining)
+        if self.failfast:
+            self.stop()
+
+    def requeue(self, labels):
+        """
+        Hand labels a worker did not run to other workers, unless the run was
+        stopped.
+        """
+        if not labels:
+            return
+        if self.stopped_at is not None:
+            self.not_run.extend(labels)
+        else:
+            self.scheduler.requeue(labels)
+
+    def dump_stack(self, worker, timeout=1):
+        """
+        Make a worker dump the stack of all its threads, waiting for the dump
+        for up to `timeout` seconds. Returns whether the worker was asked to.
+        The main loop picks up the dump with `check_stack_dump`, so the other
+        workers are served in the meantime.
+        """
+        stack_file = self.get_stack_file(worker.slot)
+        if stack_file is None or worker.process.pid is None:
+            return False
+        try:
+            os.kill(worker.process.pid, signal.SIGUSR1)
+        except OSError:
+            return False
+        now = time.time()
+        worker.stack_dump = [
+            worker.current_id, now + timeout, -1, now + STACK_DUMP_INTERVAL
+        ]
+        return True
+
+    def check_stack_dump(self, worker, now):
+        """
+        Kill a worker that ran out of time once its stack dump stopped
+        growing, or took too long.
+        """
+        test_id, give_up, size, _ = worker.stack_dump
+        stack_file = self.get_stack_file(worker.slot)
+        new_size = os.path.getsize(stack_file)
+        if (not new_size or new_size != size) and now < give_up:
+            worker.stack_dump[2:] = [new_size, now + STACK_DUMP_INTERVAL]
+            return
+        worker.stack_dump = None
+        self.receive(worker)
+        if worker.current_id != test_id or test_id not in worker.tests:
+            # The test finished after all
+            return
+        with open(stack_file) as fobj:
+            self.kill_timed_out(worker, fobj.read().strip())
+
+    def should_recycle(self, worker, rss):
+        """
+        Whether a worker that just finished a chunk should be replaced by a
+        fresh process, according to the recycling policy.
+        """
+        if not self.reuse_workers:
+            return True
+        if (self.max_tests_per_worker and
+                worker.tests_run >= self.max_tests_per_worker):
+            return True
+        if (self.max_worker_memory and
+                rss >= self.max_worker_memory * 1024 * 1024):
+            return True
+        return False
+
+    def handle_connections(self):
+        """
+        Register new agents, giving each as many slots as it has cores, and
+        take on the workers they started.
+        """
+        for connection, (command, args) in self.listener.accept():
+            if command == 'register':
+                hostname, cores = args
+                start = self.next_remote_slot
+                self.next_remote_slot += cores
+                runner_class, runner_options, migration_modules = self.runner
+                try:
+                    connection.send(('config', (
+                        runner_class, runner_options, migration_modules,
+                        self.probes, self.timeout
+                    )))
+                except (IOError, OSError):
+                    connection.close()
+                    continue
+                self.agents.append(Agent(
+                    connection, hostname, range(start, start + cores)
+                ))
+            elif command == 'worker':
+                slot = args
+                agents = [
+                    agent for agent in self.agents if slot in agent.starting
+                ]
+                if not agents:
+                    connection.close()
+                    continue
+                agents[0].starting.discard(slot)
+                worker = Worker(
+                    RemoteProcess(agents[0], slot), connection, slot
+                )
+                self.workers.append(worker)
+                self.feed(worker)
+
+    def handle_agent(self, agent):
+        """
+        Process an agent's reports about its workers exiting. If the agent
+        was lost, so are its workers, and their tests are run elsewhere.
+        """
+        try:
+            while agent.connection.poll():
+                command, args = agent.connection.recv()
+                if command == 'exited':
+                    slot, exitcode = args
+                    agent.starting.discard(slot)
+                    agent.free.append(slot)
+                    for worker in self.workers:
+                        if (isinstance(worker.process, RemoteProcess) and
+                                worker.process.agent is agent and
+                                worker.slot == slot):
+                            worker.process.exitcode = exitcode
+        except (EOFError, IOError):
+            agent.starting.clear()
+            for worker in self.workers:
+                if (isinstance(worker.process, RemoteProcess) and
+                        worker.process.agent is agent and
+                        worker.process.exitcode is None):
+                    worker.process.exitcode = -1
+                    worker.process.lost = True
+            agent.close()
+            self.agents.remove(agent)
+
+    def handle_zygote(self):
+        """
+        Process the zygote's reports about the workers it forked. If the zygote
+        itself died, the workers it did not fork yet fail with its exit code
+        and new workers are started the regular way.
+        """
+        alive = self.zygote.process.is_alive()
+        try:
+            while self.zygote.connection.poll():
+                command, args = self.zygote.connection.recv()
+                if command == 'forked':
+                    slot, pid = args
+                    for worker in self.workers:
+                        if (isinstance(worker.process, ForkedProcess) and
+                                worker.process.pid is None and
+                                worker.slot == slot):
+                            worker.process.pid = pid
+                            self.pin(pid, slot)
+                            if worker.terminated:
+                                worker.process.terminate()
+                elif command == 'exited':
+                    pid, exitcode = args
+                    for worker in self.workers:
+                        if (isinstance(worker.process, ForkedProcess) and
+                                worker.process.pid == pid):
+                            worker.process.exitcode = exitcode
+        except (EOFError, IOError):
+            pass
+        if not alive:
+            self.zygote.process.join()
+            for worker in self.workers:
+                if not isinstance(worker.process, ForkedProcess):
+                    continue
+                if worker.process.pid is None:
+                    worker.process.exitcode = self.zygote.process.exitcode
+                else:
+                    worker.process.orphaned = True
+            self.zygote.connection.close()
+            self.zygote = None
+
+    def wait(self):
+        """
+        Block until a worker sent something or exited, the zygote or an agent
+        reported something, or a new agent connected.
+        """
+        if wait_for_connections is None:
+            time.sleep(0.01)
+            return
+        waitables = []
+        timeout = None
+        for worker in self.workers:
+            if not worker.disconnected:
+                waitables.append(worker.connection)
+            if isinstance(worker.process, ForkedProcess):
+                # Nobody reports when orphaned workers exit
+                if worker.process.orphaned:
+                    timeout = 0.1
+            elif not isinstance(worker.process, RemoteProcess):
+                waitables.append(worker.process.sentinel)
+        if self.zygote is not None:
+            waitables.append(self.zygote.connection)
+            waitables.append(self.zygote.process.sentinel)
+        if self.listener is not None:
+            waitables.append(self.listener.ready)
+        for agent in self.agents:
+            waitables.append(agent.connection)
+        deadlines = []
+        for worker in self.workers:
+            if worker.terminated:
+                continue
+            if worker.stack_dump is not None:
+                deadlines.append(worker.stack_dump[3])
+            elif worker.deadline is not None:
+                deadlines.append(worker.deadline)
+        if self.stopped_at is not None and any(
+                worker.chunk is not None and not worker.terminated
+                for worker in self.workers):
+            deadlines.append(self.stopped_at + self.stop_timeout)
+        if deadlines:
+            until_deadline = max(min(deadlines) - time.time(), 0)
+            timeout = (
+                until_deadline if timeout is None
+                else min(timeout, until_deadline)
+            )
+        wait_for_connections(waitables, timeout)
 
     def handle_results(self):
-        while not self.results.empty():
-            result = self.results.get_nowait()
-            self.handle_result(result)
+        self.wait()
+        if self.zygote is not None:
+            self.handle_zygote()
+        if self.listener is not None:
+            self.handle_connections()
+        for agent in list(self.agents):
+            self.handle_agent(agent)
         done = []
-        for process, chunk in self.processes:
-            if not process.is_alive():
-                done.append((process, chunk))
-                if process.exitcode != 0:
-                    self.failed_executors.append((
-                        chunk, process.exitcode
-                    ))
-        for process in done:
-            self.processes.remove(process)
-
-    def handle_result(self, result):
-        method_name, args = result
-        arglist = list(args)
-        test_info = arglist.pop(0)
-        fake_test = FakeTest.deserialize(test_info)
-        method = getattr(self.real_result, method_name)
-        method(fake_test, *arglist)
-
-
-def multi_processing_runner_factory(stream, results):
+        for worker in self.workers:
+            alive = worker.process.is_alive()
+            self.receive(worker)
+            if not alive:
+                done.append(worker)
+        for worker in done:
+            worker.process.join()
+            if worker.terminated:
+                self.not_run.extend(worker.unfinished)
+            elif getattr(worker.process, 'lost', False):
+                # Not the tests' fault
+                self.requeue(worker.unfinished)
+            # Workers only exit cleanly after finishing their chunk
+            elif worker.process.exitcode != 0 or worker.chunk is not None:
+                self.crashed(worker)
+            worker.connection.close()
+            self.workers.remove(worker)
+
+    def receive(self, worker):
+        try:
+            while worker.connection.poll():
+                self.handle_message(worker, worker.connection.recv())
+        except (EOFError, IOError):
+            worker.disconnected = True
+
+    def handle_message(self, worker, message):
+        method_name, args = message
+        if method_name == 'chunkDone':
+            tests_run, rss, released = args
+            self.requeue(released)
+            worker.chunk = None
+            worker.deadline = None
+            worker.releasing = False
+            worker.tests_run += tests_run
+            if rss is not None and not isinstance(
+                    worker.process, RemoteProcess):
+                self.peak_rss = max(self.peak_rss or 0, rss)
+            if self.should_recycle(worker, rss):
+                worker.retire()
+        elif method_name == 'startTest':
+            # Only tracked here, replayed on the real result together with the
+            # outcome so a verbose result's output is not interleaved.
+            test_id, test_info, timeout = args
+            test = worker.tests[test_id] = FakeTest.deserialize(test_info)
+            worker.current = test.qualname
+            worker.current_id = test_id
+            worker.started_at = time.time()
+            worker.timeout = timeout
+            worker.deadline = worker.started_at + timeout if timeout else None
+        elif method_name == 'results':
+            identities, records = args
+            for test_id, test_info in identities:
+                worker.tests[test_id] = FakeTest.deserialize(test_info)
+            for record in records:
+                self.handle_result(worker, record)
+        elif method_name == 'classTimings':
+            self.real_result.registerClassTimings(args)
+        elif method_name == 'classMetrics':
+            self.real_result.registerClassMetrics(args)
+        elif method_name == 'ready':
+            # Seconds from starting the worker until it could run tests, and
+            # the part of that spent setting up Django and the test databases
+            django_time, databases_time = args
+            self.startup_times.append({
+                'slot': worker.slot,
+                'total': time.time() - worker.created,
+                'django': django_time,
+                'databases': databases_time,
+            })
+
+    def handle_result(self, worker, record):
+        """
+        Replay the outcomes of a test on the real result. Tests that ran also
+        have their timing registered; placeholders for fixture errors don't.
+        """
+        test_id, outcomes, timing, metrics = record
+        test = worker.tests[test_id]
+        if timing is not None:
+            self.real_result.startTest(test)
+        for method_name, args in outcomes:
+            getattr(self.real_result, method_name)(test, *args)
+        if metrics:
+            self.real_result.registerMetrics(test, metrics)
+            if 'memory' in metrics:
+                worker.rss = metrics['memory'][1]
+        if self.failfast and any(
+                method_name in URGENT_OUTCOMES for method_name, _ in outcomes):
+            self.stop()
+        if timing is not None:
+            self.real_result.registerTiming(test, timing)
+            worker.finished.add(test.qualname)
+            del worker.tests[test_id]
+            if test_id == worker.current_id:
+                worker.deadline = None
+
+
+def multi_processing_runner_factory(stream, channel, probes=()):
     """
     Creates a test runner with the MultiProcessinTestResult result class and
     overwriting the output stream.
@@ -102,7 +950,7 @@ def multi_processing_runner_factory(stream, results):
     test_result_class = type(
         'MultiProcessingTestResult',
         (MultiProcessingTestResult, ),
-        {'_results_queue': results}
+        {'_channel': channel, '_probes': probes}
     )
     
     def inner(*args, **kwargs):
@@ -119,40 +967,292 @@ def multi_processing_runner_factory(stream, results):
     return inner
 
 
-def executor(labels, runner_class, runner_options, chunk_num, results, conf):
+def setup_django(bootstrap):
     """
-    Test runner inside the task process.
+    Set up Django from the `(settings module, overrides)` the pool got from
+    `get_settings_bootstrap`, unless it is set up already.
     """
+    from django.conf import settings
+    if settings.configured:
+        return
+    import django
+    settings_module, overrides = bootstrap
+    if settings_module is None:
+        settings.configure(**overrides)
+    else:
+        os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+        for key, value in overrides.items():
+            setattr(settings, key, value)
+    django.setup()
+
+
+def patch_database_names(slot):
     # We need to patch the db name in case we're in --parallel or --isolate
-    # mode (or any other mode with more than one chunk). But if there's only
-    # a single chunk, don't change the db name. Therefore we don't modify the
-    # name for the first chunk (chunk_num=0).
+    # mode (or any other mode with more than one worker). But if there's only
+    # a single worker, don't change the db name. Therefore we don't modify the
+    # name for the first worker slot (slot=0).
     from django.conf import settings
-    if not settings.configured:
-        import django
-        settings.configure(**conf)
-        django.setup()
-    if chunk_num:
+    if slot:
         for config in settings.DATABASES.values():
             if config.get('NAME', None) != ':memory:':
-                config['NAME'] += '_{num}'.format(num=chunk_num)
+                config['NAME'] += '_{num}'.format(num=slot)
+
+
+def executor(connection, runner_class, runner_options, slot, clones,
+             bootstrap, probes=(), timeout=0, stack_file=None):
+    """
+    Test runner inside the task process.
+    """
+    started = time.time()
+    setup_django(bootstrap)
+    serve(
+        connection, runner_class, runner_options, slot, clones, probes,
+        timeout, stack_file, django_time=time.time() - started
+    )
+
+
+def serve(connection, runner_class, runner_options, slot, clones, probes=(),
+          timeout=0, stack_file=None, django_time=0.0):
+    """
+    Sets up the test databases once (or uses the `clones` of the template
+    databases made for this worker), then runs chunks of labels received
+    through `connection` until told to exit.
+
+    Tests get `timeout` seconds unless they set their own. The pool makes
+    the worker dump its stack to `stack_file` when a test runs out of time.
+
+    Once set up, the worker reports `django_time`, how long setting up
+    Django took before, and how long setting up the databases took.
+    """
+    started = time.time()
+    if stack_file is not None:
+        faulthandler.register(
+            signal.SIGUSR1, file=open(stack_file, 'w'), all_threads=True
+        )
+    if clones:
+        use_clones(clones)
+    else:
+        patch_database_names(slot)
+    for probe in probes:
+        probe.setup()
+    channel = ResultChannel(connection, timeout=timeout)
+    # Send the results of the finished tests before class fixtures run, so a
+    # crash in those is not blamed on the last test
+    fixture_timer = FixtureTimer(probes, before=channel.flush)
+    fixture_timer.setup()
     try:
         with null_stdout() as nullout:
             real_runner_class = type(
                 runner_class.__name__,
                 (MultiProcessingTestRunner, runner_class),
                 {'test_runner': multi_processing_runner_factory(
-                    nullout, results
+                    nullout, channel, probes
                 )}
             )
             runner = real_runner_class(**runner_options)
-            runner.run_tests(labels)
+            runner.setup_test_environment()
+            old_config = None if clones else runner.setup_databases()
+            channel.send(('ready', (django_time, time.time() - started)))
+            try:
+                command, args = connection.recv()
+                while command != 'exit':
+                    # A release request that arrives after the chunk finished
+                    # has nothing left to release.
+                    if command == 'run':
+                        run_chunk(runner, channel, args, fixture_timer)
+                    command, args = connection.recv()
+            finally:
+                if old_config is not None:
+                    runner.teardown_databases(old_config)
+                runner.teardown_test_environment()
     except:
         import traceback
         traceback.print_exc()
         raise
 
 
+def zygote(connection, runner_class, runner_options, labels, bootstrap,
+           probes=(), timeout=0):
+    """
+    Preloading process for isolate mode. Sets up Django and imports all test
+    modules once, then forks a copy-on-write worker for every request it gets
+    through `connection` and reports when those workers exit.
+    """
+    setup_django(bootstrap)
+    with null_stdout():
+        runner_class(**runner_options).build_suite(labels)
+    # Forked workers must not share database connections
+    from django.db import connections
+    for database_connection in connections.all():
+        database_connection.close()
+
+    # Wake up on SIGCHLD to report exited workers without polling
+    read_fd, write_fd = os.pipe()
+    flags = fcntl.fcntl(write_fd, fcntl.F_GETFL)
+    fcntl.fcntl(write_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    signal.set_wakeup_fd(write_fd)
+
+    while True:
+        ready = wait_for_connections([connection, read_fd])
+        if read_fd in ready:
+            os.read(read_fd, 4096)
+            reap_children(connection)
+        if connection not in ready:
+            continue
+        try:
+            command, args = connection.recv()
+        except EOFError:
+            break
+        if command == 'exit':
+            break
+        worker_connection, slot, clones, stack_file = args
+        pid = os.fork()
+        if pid == 0:
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            os.close(read_fd)
+            os.close(write_fd)
+            connection.close()
+            exitcode = 1
+            try:
+                serve(
+                    worker_connection, runner_class, runner_options, slot,
+                    clones, probes, timeout, stack_file
+                )
+                exitcode = 0
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(exitcode)
+        worker_connection.close()
+        connection.send(('forked', (slot, pid)))
+
+
+def reap_children(connection):
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except OSError:
+            return
+        if not pid:
+            return
+        if os.WIFSIGNALED(status):
+            exitcode = -os.WTERMSIG(status)
+        else:
+            exitcode = os.WEXITSTATUS(status)
+        connection.send(('exited', (pid, exitcode)))
+
+
+def run_agent(address, authkey, processes, start_method='spawn', retry=30):
+    """
+    Agent for a pool on another machine (``manage.py test_worker``). Connects
+    to the pool at `address`, retrying for `retry` seconds, registers
+    `processes` worker slots and starts a worker in a slot whenever the pool
+    asks for one. The workers connect to the pool themselves and use this
+    machine's settings. Returns once the pool closed the connection.
+    """
+    deadline = time.time() + retry
+    while True:
+        try:
+            connection = Client(address, authkey=authkey)
+            break
+        except (IOError, OSError):
+            if time.time() >= deadline:
+                raise
+            time.sleep(1)
+    connection.send(('register', (socket.gethostname(), processes)))
+    try:
+        _, config = connection.recv()
+    except EOFError:
+        return
+    (runner_class, runner_options, migration_modules, probes,
+     timeout) = config
+    # The agent's own settings, with the pool's migration modules
+    bootstrap = get_settings_bootstrap()
+    bootstrap[1]['MIGRATION_MODULES'] = migration_modules
+    context = get_multiprocessing_context(start_method)
+    workers = {}
+    try:
+        while True:
+            wait_for_connections(
+                [connection] +
+                [process.sentinel for process in workers.values()]
+            )
+            for slot, process in list(workers.items()):
+                if not process.is_alive():
+                    process.join()
+                    del workers[slot]
+                    connection.send(('exited', (slot, process.exitcode)))
+            if not connection.poll():
+                continue
+            command, slot = connection.recv()
+            if command == 'spawn':
+                process = mixin_coverage(context.Process)(
+                    target=remote_executor,
+                    args=(
+                        address,
+                        authkey,
+                        runner_class,
+                        runner_options,
+                        slot,
+                        bootstrap,
+                        probes,
+                        timeout
+                    )
+                )
+                process.start()
+                workers[slot] = process
+            elif command == 'terminate' and slot in workers:
+                workers[slot].terminate()
+    except (EOFError, IOError):
+        pass
+    finally:
+        for process in workers.values():
+            process.terminate()
+            process.join()
+        connection.close()
+
+
+def remote_executor(address, authkey, runner_class, runner_options, slot,
+                    bootstrap, probes=(), timeout=0):
+    """
+    Test runner inside a task process started by an agent, which connects to
+    the pool on its own.
+    """
+    started = time.time()
+    setup_django(bootstrap)
+    django_time = time.time() - started
+    connection = Client(address, authkey=authkey)
+    connection.send(('worker', slot))
+    serve(
+        connection, runner_class, runner_options, slot, None, probes, timeout,
+        django_time=django_time
+    )
+
+
+def run_chunk(runner, channel, labels, fixture_timer=None):
+    suite = runner.build_suite(labels)
+    tests = list(iter_tests(suite))
+    suite_labels = [test_to_dotted(test) for test in tests]
+    if fixture_timer is not None:
+        fixture_timer.instrument(tests)
+    result = runner.run_suite(suite)
+    if fixture_timer is not None:
+        class_timings = fixture_timer.collect()
+        if class_timings:
+            channel.send(('classTimings', class_timings))
+        class_metrics = fixture_timer.collect_metrics()
+        if class_metrics:
+            channel.send(('classMetrics', class_metrics))
+    released = []
+    if result.shouldStop and result.last_started in suite_labels:
+        index = suite_labels.index(result.last_started)
+        released = suite_labels[index + 1:]
+    tests_run = len(suite_labels) - len(released)
+    channel.send(('chunkDone', (tests_run, get_rss(), released)))
+
+
 class MultiProcessingTextTestResult(unittest.TextTestResult):
     """
     Thin wrapper around TextTestResult. Python tracebacks are not pickleable,
@@ -163,9 +1263,75 @@ class MultiProcessingTextTestResult(unittest.TextTestResult):
         super(MultiProcessingTextTestResult, self).__init__(*args, **kwargs)
         self.timings = {}
         self.successes = []
+        self.metrics = {}
+        # {class: {phase: seconds}} spent in class fixtures, see
+        # fixtures.FixtureTimer
+        self.class_timings = {}
+        # {test: [rss delta, rss, traced peak]}, see memory.MemoryProbe
+        self.memory = {}
+        # {test: [queries, seconds]}, see queries.QueryProbe
+        self.queries = {}
+        # {class: [queries, seconds]} made in class fixtures
+        self.class_queries = {}
+        # A database.Run to record results to as they arrive
+        self.recorder = None
+        # A profiling.ProfileCollector to merge the tests' profiles into
+        self.profiler = None
 
     def registerTiming(self, test, timing):
         self.timings[test.qualname] = timing
+        if self.recorder is not None:
+            self.recorder.record_timing(test.qualname, timing)
+
+    def registerMetrics(self, test, metrics):
+        """
+        Measurements the workers' probes took of a test. Profiles are only
+        passed on to the profiler, they are too large to keep around.
+        """
+        if 'profile' in metrics:
+            metrics = dict(metrics)
+            profile = metrics.pop('profile')
+            if self.profiler is not None:
+                self.profiler.add(test.qualname, profile)
+        if 'memory' in metrics:
+            self.memory[test.qualname] = metrics['memory']
+        if 'queries' in metrics:
+            self.queries[test.qualname] = metrics['queries']
+        self.metrics[test.qualname] = metrics
+        if self.recorder is not None:
+            self.recorder.record_metrics(test.qualname, metrics)
+
+    def registerClassTimings(self, class_timings):
+        """
+        Time a worker spent setting up and tearing down test classes. A class
+        split across workers has its fixtures timed by each of them.
+        """
+        for name, phases in class_timings.items():
+            totals = self.class_timings.setdefault(name, {})
+            for phase, duration in phases.items():
+                totals[phase] = totals.get(phase, 0.0) + duration
+        if self.recorder is not None:
+            self.recorder.record_class_timings(class_timings)
+
+    def registerClassMetrics(self, class_metrics):
+        """
+        Measurements the workers' probes took of the class fixtures of test
+        classes, `{class: metrics}`. They are recorded like those of a test
+        named like the class. Queries of a class split across workers are
+        added up.
+        """
+        for name, metrics in class_metrics.items():
+            if 'queries' in metrics:
+                totals = self.class_queries.setdefault(name, [0, 0.0])
+                totals[0] += metrics['queries'][0]
+                totals[1] += metrics['queries'][1]
+                metrics = dict(metrics, queries=list(totals))
+            if self.recorder is not None:
+                self.recorder.record_metrics(name, metrics)
+
+    def _record_outcome(self, test, outcome):
+        if self.recorder is not None:
+            self.recorder.record_outcome(test.qualname, outcome)
 
     def addSuccess(self, test):
         """
@@ -173,11 +1339,34 @@ class MultiProcessingTextTestResult(unittest.TextTestResult):
         """
         super(MultiProcessingTextTestResult, self).addSuccess(test)
         self.successes.append(test)
+        self._record_outcome(test, 'success')
+
+    def addError(self, test, err):
+        super(MultiProcessingTextTestResult, self).addError(test, err)
+        self._record_outcome(test, 'error')
+
+    def addFailure(self, test, err):
+        super(MultiProcessingTextTestResult, self).addFailure(test, err)
+        self._record_outcome(test, 'failure')
+
+    def addSkip(self, test, reason):
+        super(MultiProcessingTextTestResult, self).addSkip(test, reason)
+        self._record_outcome(test, 'skip')
+
+    def addExpectedFailure(self, test, err):
+        super(MultiProcessingTextTestResult, self).addExpectedFailure(
+            test, err
+        )
+        self._record_outcome(test, 'expected_failure')
+
+    def addUnexpectedSuccess(self, test):
+        super(MultiProcessingTextTestResult, self).addUnexpectedSuccess(test)
+        self._record_outcome(test, 'unexpected_success')
 
     def _exc_info_to_string(self, err, test):
         """
         Actual transformation from exception info to string happens in the
-        executor, as exceptions can't be transferred through a Queue.
+        executor, as exceptions can't be transferred through a pipe.
         """
         return err
 
@@ -191,10 +1380,95 @@ class SilentMultiProcessingTextTestResult(MultiProcessingTextTestResult):
         self.showAll = False
 
 
+class ResultChannel(object):
+    """
+    Worker side of the result protocol. A test is announced (with its
+    serialized form) once, when it starts, and referred to by an integer id
+    afterwards. Outcomes and timings of finished tests are sent in batches,
+    once `batch_size` of them piled up or the oldest one waited for
+    `batch_interval` seconds. Failures are sent right away, as are the
+    results of tests that used more than half of their timeout, so the pool
+    knows they finished in time. For the others it is enough that the next
+    test starts, or class fixtures run, before the timeout is up.
+    """
+    def __init__(self, connection, batch_size=100, batch_interval=0.5,
+                 timeout=0):
+        self.connection = connection
+        self.timeout = timeout
+        # {test id: timeout} of the tests that have one
+        self.timed = {}
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.test_ids = {}
+        self.next_id = itertools.count()
+        self.unannounced = []
+        self.records = []
+        self.batch_started = None
+
+    def _get_id(self, test, forget=False):
+        test_info = serialize(test)
+        if forget:
+            test_id = self.test_ids.pop(test_info[0], None)
+        else:
+            test_id = self.test_ids.get(test_info[0])
+        if test_id is None:
+            test_id = next(self.next_id)
+            if not forget:
+                self.test_ids[test_info[0]] = test_id
+            return test_id, test_info
+        return test_id, None
+
+    def start(self, test):
+        test_id, test_info = self._get_id(test)
+        self._flush_if_due()
+        timeout = get_timeout(test, self.timeout)
+        if timeout:
+            self.timed[test_id] = timeout
+        self.connection.send(('startTest', (test_id, test_info, timeout)))
+
+    def record(self, test, outcomes, timing, metrics=None):
+        # Once a test ran, its id is not needed anymore
+        test_id, test_info = self._get_id(test, forget=timing is not None)
+        if test_info is not None:
+            self.unannounced.append((test_id, test_info))
+        if not self.records:
+            self.batch_started = time.time()
+        self.records.append((test_id, outcomes, timing, metrics))
+        timeout = self.timed.pop(test_id, None)
+        urgent = (
+            timeout is not None and timing is not None and
+            timing > timeout / 2.0
+        ) or any(
+            method_name in URGENT_OUTCOMES for method_name, _ in outcomes
+        )
+        if urgent or len(self.records) >= self.batch_size:
+            self.flush()
+        else:
+            self._flush_if_due()
+
+    def _flush_if_due(self):
+        if (self.records and
+                time.time() - self.batch_started >= self.batch_interval):
+            self.flush()
+
+    def flush(self):
+        if self.records or self.unannounced:
+            self.connection.send(('results', (self.unannounced, self.records)))
+            self.unannounced = []
+            self.records = []
+
+    def send(self, message):
+        self.flush()
+        self.connection.send(message)
+
+
+URGENT_OUTCOMES = frozenset(['addError', 'addFailure', 'addUnexpectedSuccess'])
+
+
 class MultiProcessingTestResult(unittest.TestResult):
     """
     Result class for used by the task processes. Instead of printing/storing
-    any information, feeds results into QUEUE.
+    any information, sends results through the worker's result channel.
 
     Important to note is that `test` is transformed into a tuple of
     `(str(test), test.shortDescription())` as test case instances are not
@@ -203,6 +1477,7 @@ class MultiProcessingTestResult(unittest.TestResult):
     """
     separator1 = '=' * 70
     separator2 = '-' * 70
+    _probes = ()
 
     def __init__(self, *args, **kwargs):
         if PY_26:
@@ -210,17 +1485,19 @@ class MultiProcessingTestResult(unittest.TestResult):
         else:
             super(MultiProcessingTestResult, self).__init__(*args, **kwargs)
         self._timings = {}
+        self._outcomes = {}
+        self.last_started = None
 
     def printErrors(self):
         pass
 
     def startTest(self, test):
         self._timings[test] = time.time()
-        self._results_queue.put((
-            'startTest', (
-                serialize(test),
-            )
-        ))
+        self._outcomes[test] = []
+        self.last_started = serialize(test)[0]
+        self._channel.start(test)
+        for probe in self._probes:
+            probe.start_test(test)
 
     def _setupStdout(self):
         pass
@@ -229,12 +1506,23 @@ class MultiProcessingTestResult(unittest.TestResult):
         pass
 
     def stopTest(self, test):
-        self._results_queue.put((
-            'registerTiming', (
-                serialize(test),
-                time.time() - self._timings[test],
-            )
-        ))
+        timing = time.time() - self._timings.pop(test)
+        metrics = {}
+        for probe in reversed(self._probes):
+            value = probe.stop_test(test)
+            if value is not None:
+                metrics[probe.name] = value
+        self._channel.record(test, self._outcomes.pop(test), timing, metrics)
+        # Hand back the rest of the chunk to be recycled, see should_recycle
+        if any(probe.exhausted() for probe in self._probes):
+            self.stop()
+        # The only message the pool sends while a chunk is running is a
+        # request to hand back the rest of the chunk.
+        connection = self._channel.connection
+        if connection.poll():
+            command, _ = connection.recv()
+            if command == 'release':
+                self.stop()
 
     def _restoreStdout(self):
         pass
@@ -242,54 +1530,34 @@ class MultiProcessingTestResult(unittest.TestResult):
     def stopTestRun(self):
         pass
 
+    def _add_outcome(self, test, method_name, *args):
+        if test in self._outcomes:
+            self._outcomes[test].append((method_name, args))
+        else:
+            # Errors in class or module fixtures are reported for a
+            # placeholder test that is never started nor stopped.
+            self._channel.record(test, [(method_name, args)], None)
+
     def addError(self, test, err):
         safe_err = self._exc_info_to_string(err, test)
-        self._results_queue.put((
-            'addError', (
-                serialize(test),
-                safe_err
-            )
-        ))
+        self._add_outcome(test, 'addError', safe_err)
 
     def addFailure(self, test, err):
         safe_err = self._exc_info_to_string(err, test)
-        self._results_queue.put((
-            'addFailure', (
-                serialize(test),
-                safe_err
-            )
-        ))
+        self._add_outcome(test, 'addFailure', safe_err)
 
     def addSuccess(self, test):
-        self._results_queue.put((
-            'addSuccess', (
-                serialize(test),
-            )
-        ))
+        self._add_outcome(test, 'addSuccess')
 
     def addSkip(self, test, reason=None):
-        self._results_queue.put((
-            'addSkip', (
-                serialize(test),
-                reason
-            )
-        ))
+        self._add_outcome(test, 'addSkip', reason)
 
     def addExpectedFailure(self, test, err):
         safe_err = self._exc_info_to_string(err, test)
-        self._results_queue.put((
-            'addExpectedFailure', (
-                serialize(test),
-                safe_err
-            )
-        ))
+        self._add_outcome(test, 'addExpectedFailure', safe_err)
 
     def addUnexpectedSuccess(self, test):
-        self._results_queue.put((
-            'addUnexpectedSuccess', (
-                serialize(test),
-            )
-        ))
+        self._add_outcome(test, 'addUnexpectedSuccess')
 
     def wasSuccessful(self):
         pass
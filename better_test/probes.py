@@ -0,0 +1,48 @@
+from __future__ import absolute_import
+
+
+class Probe(object):
+    """
+    Measures something about each test inside the worker process. Probes are
+    pickled to the workers, so they should only set up their state in
+    `setup`, which is called once per worker.
+
+    Whatever `stop_test` returns (other than `None`) is sent to the parent
+    process with the test's result, as `metrics[probe.name]`.
+    """
+    name = None
+
+    def setup(self):
+        pass
+
+    def start_test(self, test):
+        pass
+
+    def stop_test(self, test):
+        return None
+
+    def start_fixture(self, name):
+        """
+        Called when the test class `name` starts running its class fixtures
+        (`setUpClass`, loading fixtures, `setUpTestData` or `tearDownClass`),
+        see `fixtures.FixtureTimer`.
+        """
+        pass
+
+    def stop_fixture(self, name):
+        pass
+
+    def collect_fixtures(self):
+        """
+        What was measured in class fixtures since the last call, as
+        `{class: metric}`. It is sent to the parent process like the metrics
+        of tests, under the name of the class.
+        """
+        return {}
+
+    def exhausted(self):
+        """
+        Whether the worker should stop after the test that just stopped, and
+        hand back the rest of its chunk.
+        """
+        return False
@@ -0,0 +1,130 @@
+"""
+Profile tests with cProfile in the workers and merge the profiles into one
+for the whole run.
+"""
+from __future__ import absolute_import
+import cProfile
+import pstats
+
+from .probes import Probe
+from .utils import estimate_timings
+from .utils import test_to_dotted
+
+
+class ProfileProbe(Probe):
+    """
+    Runs the tests in `tests` (all tests if `None`) under cProfile, and sends
+    the profile of each back as its `profile` metric, in the format of
+    `pstats.Stats.stats`.
+    """
+    name = 'profile'
+
+    def __init__(self, tests=None):
+        self.tests = tests
+        self.profiler = None
+
+    def start_test(self, test):
+        if self.tests is not None and test_to_dotted(test) not in self.tests:
+            return
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop_test(self, test):
+        profiler = self.profiler
+        if profiler is None:
+            return None
+        self.profiler = None
+        profiler.disable()
+        profiler.create_stats()
+        return profiler.stats
+
+
+class ProfileCollector(object):
+    """
+    Merges the profiles of the tests into `path`, in the format read by
+    `pstats`, and keeps the `top` functions with the highest own time of
+    each test.
+
+    With `min_duration`, only the tests expected to take at least that many
+    seconds are profiled, which keeps the overhead of profiling low.
+    """
+    def __init__(self, path, min_duration=0, top=10):
+        self.path = path
+        self.min_duration = min_duration
+        self.top = top
+        self.stats = None
+        # {test: (seconds, [(function, calls, own seconds, cumulative)])}
+        self.hot = {}
+
+    def get_probe(self, labels, timings):
+        """
+        The probe that profiles those of `labels` that are expected to take
+        long enough, judging by `timings`.
+        """
+        if not self.min_duration:
+            return ProfileProbe()
+        estimates = estimate_timings(labels, timings)
+        return ProfileProbe(set(
+            label for label in labels
+            if estimates[label] >= self.min_duration
+        ))
+
+    def add(self, name, stats):
+        total = sum(tottime for _, _, tottime, _, _ in stats.values())
+        hottest = sorted(
+            stats.items(), key=lambda item: item[1][2], reverse=True
+        )[:self.top]
+        self.hot[name] = (total, [
+            (pstats.func_std_string(function), calls, tottime, cumtime)
+            for function, (_, calls, tottime, cumtime, _) in hottest
+        ])
+        profile = _Profile(stats)
+        if self.stats is None:
+            self.stats = pstats.Stats(profile)
+        else:
+            self.stats.add(profile)
+
+    def save(self):
+        """
+        Write the merged profile, returns whether there was one.
+        """
+        if self.stats is None:
+            return False
+        self.stats.dump_stats(self.path)
+        return True
+
+    def report(self, stream):
+        """
+        List the hottest functions of the `top` slowest profiled tests.
+        """
+        writeln = lambda s: stream.write('{0}\n'.format(s))
+        slowest = sorted(
+            ((total, name, functions)
+             for name, (total, functions) in self.hot.items()),
+            reverse=True
+        )
+        for total, name, functions in slowest[:self.top]:
+            writeln("{name} ({total:.3f}s profiled)".format(
+                name=name, total=total
+            ))
+            writeln("   ncalls  tottime  cumtime  function")
+            for function, calls, tottime, cumtime in functions:
+                writeln(
+                    "{calls:9d} {tottime:8.3f} {cumtime:8.3f}  "
+                    "{function}".format(
+                        calls=calls, tottime=tottime, cumtime=cumtime,
+                        function=function
+                    )
+                )
+            writeln('')
+
+
+class _Profile(object):
+    """
+    What `pstats.Stats` needs to load the stats a worker sent.
+    """
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
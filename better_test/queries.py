@@ -0,0 +1,79 @@
+"""
+Count the database queries of each test and the time spent waiting for them,
+and those of each test class's fixtures.
+"""
+from __future__ import absolute_import
+import time
+
+from .probes import Probe
+
+
+class QueryProbe(Probe):
+    """
+    Wraps the execution of the queries a test makes on any database, through
+    `connection.execute_wrapper` (Django 2.0 and later). Queries made in class
+    fixtures, like `setUpTestData`, are counted for the class, so classes that
+    set up their data one query at a time stand out too.
+
+    The metric is `[queries, seconds]`.
+    """
+    name = 'queries'
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+        self.wrapped = []
+        # {class: [queries, seconds]} made in class fixtures
+        self.fixture_queries = {}
+
+    def start_test(self, test):
+        self._start()
+
+    def stop_test(self, test):
+        return self._stop()
+
+    def start_fixture(self, name):
+        self._start()
+
+    def stop_fixture(self, name):
+        counted = self._stop()
+        if counted is not None:
+            totals = self.fixture_queries.setdefault(name, [0, 0.0])
+            totals[0] += counted[0]
+            totals[1] += counted[1]
+
+    def collect_fixtures(self):
+        fixture_queries = self.fixture_queries
+        self.fixture_queries = {}
+        return fixture_queries
+
+    def _start(self):
+        from django.db import connections
+        self.queries = 0
+        self.duration = 0.0
+        self.wrapped = [
+            connection for connection in connections.all()
+            if hasattr(connection, 'execute_wrappers')
+        ]
+        for connection in self.wrapped:
+            connection.execute_wrappers.append(self.execute)
+
+    def _stop(self):
+        """
+        Stop counting, returns `[queries, seconds]` since `_start`.
+        """
+        if not self.wrapped:
+            return None
+        for connection in self.wrapped:
+            if self.execute in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self.execute)
+        self.wrapped = []
+        return [self.queries, self.duration]
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.time()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.duration += time.time() - start
@@ -0,0 +1,177 @@
+"""
+How many CPUs and how much memory the test run may use, which in a container
+is often less than the host has.
+"""
+from __future__ import absolute_import
+import math
+import multiprocessing
+import os
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+
+def get_cpus():
+    """
+    The CPUs this process may run on, sorted.
+    """
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(multiprocessing.cpu_count()))
+
+
+def get_cpu_count(root=CGROUP_ROOT, cgroups=None):
+    """
+    Number of CPUs this process may use: those it may run on, limited by the
+    CPU quota of its cgroup, if any.
+    """
+    count = len(get_cpus())
+    quota = get_cpu_quota(root, cgroups)
+    if quota is not None:
+        count = min(count, max(1, int(math.ceil(quota))))
+    return count
+
+
+def get_cpu_quota(root=CGROUP_ROOT, cgroups=None):
+    """
+    The CPU quota of this process's cgroup (or of any of its parents), in
+    CPUs, or `None` if there is none. `cgroups` defaults to the cgroups of
+    this process (see `get_cgroups`), `root` is where the cgroup hierarchies
+    are mounted.
+    """
+    if cgroups is None:
+        cgroups = get_cgroups()
+    quotas = []
+    for directory in _cgroup_directories(root, cgroups.get('')):
+        # cgroup v2: "<quota> <period>", or "max <period>"
+        values = _read(os.path.join(directory, 'cpu.max'))
+        if values is not None:
+            values = values.split()
+            if len(values) == 2 and values[0] != 'max':
+                quotas.append(_ratio(values[0], values[1]))
+    # cgroup v1, the quota is -1 if there is none
+    for name in ('cpu', 'cpu,cpuacct'):
+        for directory in _cgroup_directories(
+                os.path.join(root, name), cgroups.get('cpu', '/')):
+            quota = _read(os.path.join(directory, 'cpu.cfs_quota_us'))
+            period = _read(os.path.join(directory, 'cpu.cfs_period_us'))
+            if quota is not None and period is not None:
+                quotas.append(_ratio(quota, period))
+    quotas = [quota for quota in quotas if quota is not None and quota > 0]
+    return min(quotas) if quotas else None
+
+
+def get_available_memory(root=CGROUP_ROOT, cgroups=None):
+    """
+    Bytes of memory that are available to this process, going by the
+    system's available memory and the limits of its cgroup and its parents,
+    or `None` if that can't be told.
+    """
+    if cgroups is None:
+        cgroups = get_cgroups()
+    available = []
+    meminfo = _read('/proc/meminfo')
+    if meminfo is not None:
+        for line in meminfo.splitlines():
+            if line.startswith('MemAvailable:'):
+                available.append(int(line.split()[1]) * 1024)
+    limits = [
+        (os.path.join(directory, 'memory.max'),
+         os.path.join(directory, 'memory.current'))
+        for directory in _cgroup_directories(root, cgroups.get(''))
+    ] + [
+        (os.path.join(directory, 'memory.limit_in_bytes'),
+         os.path.join(directory, 'memory.usage_in_bytes'))
+        for directory in _cgroup_directories(
+            os.path.join(root, 'memory'), cgroups.get('memory', '/')
+        )
+    ]
+    for limit_path, usage_path in limits:
+        limit = _read(limit_path)
+        usage = _read(usage_path)
+        if limit is None or usage is None or not limit.isdigit():
+            continue
+        # cgroup v1 reports a huge number rather than no limit
+        if int(limit) >= 2 ** 60:
+            continue
+        available.append(max(int(limit) - int(usage), 0))
+    return min(available) if available else None
+
+
+def auto_processes(worker_rss=None, root=CGROUP_ROOT, cgroups=None):
+    """
+    The number of worker processes to run: one per CPU this process may use,
+    but no more than fit into the available memory if each worker takes
+    `worker_rss` bytes.
+    """
+    count = get_cpu_count(root, cgroups)
+    if worker_rss:
+        memory = get_available_memory(root, cgroups)
+        if memory is not None:
+            count = min(count, max(1, int(memory // worker_rss)))
+    return count
+
+
+def pin_process(pid, cpu):
+    """
+    Make the process `pid` only run on `cpu`, where that is supported.
+    Returns whether it worked.
+    """
+    try:
+        os.sched_setaffinity(pid, [cpu])
+    except (AttributeError, OSError):
+        return False
+    return True
+
+
+def get_cgroups(path='/proc/self/cgroup'):
+    """
+    The paths of this process's cgroups, `{controller: path}` for the
+    controllers of the v1 hierarchies, and under `''` in the v2 hierarchy.
+    """
+    content = _read(path)
+    cgroups = {}
+    if content is None:
+        return cgroups
+    for line in content.splitlines():
+        hierarchy, _, rest = line.partition(':')
+        controllers, _, path = rest.partition(':')
+        if hierarchy == '0' and not controllers:
+            cgroups[''] = path
+        for controller in controllers.split(','):
+            if controller:
+                cgroups[controller] = path
+    return cgroups
+
+
+def _cgroup_directories(root, cgroup):
+    """
+    The directories of `cgroup` and its parents in the hierarchy mounted at
+    `root`, from its own up to the root. In a container, the hierarchy may
+    only show the container's own cgroup as the root, so directories that
+    don't exist are simply not found.
+    """
+    if cgroup is None:
+        return []
+    directories = []
+    path = cgroup.strip('/')
+    while path:
+        directories.append(os.path.join(root, path))
+        path = os.path.dirname(path)
+    directories.append(root)
+    return directories
+
+
+def _ratio(numerator, denominator):
+    try:
+        return float(numerator) / float(denominator)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _read(path):
+    try:
+        with open(path) as fobj:
+            return fobj.read().strip()
+    except (IOError, OSError):
+        return None
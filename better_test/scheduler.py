@@ -0,0 +1,199 @@
+from __future__ import absolute_import
+from collections import deque
+
+from .utils import estimate_timings
+from .utils import weighted_partition
+
+
+class ChunkScheduler(object):
+    """
+    Hands out a fixed list of chunks in order. Used when the split of the
+    labels is dictated by the mode (a single chunk in standard mode, a chunk
+    per label in isolate mode).
+    """
+    stealing = False
+
+    def __init__(self, chunks):
+        self.chunks = deque(chunks)
+
+    @property
+    def pending(self):
+        return bool(self.chunks)
+
+    def next_batch(self):
+        if self.chunks:
+            return self.chunks.popleft()
+        return None
+
+    def requeue(self, labels):
+        self.chunks.appendleft(labels)
+
+    def drain(self):
+        """
+        Remove and return all labels that were not handed out yet.
+        """
+        labels = [label for chunk in self.chunks for label in chunk]
+        self.chunks.clear()
+        return labels
+
+    def estimate(self, labels):
+        return len(labels)
+
+
+class WorkStealingScheduler(object):
+    """
+    Shared work queue for parallel mode.
+
+    Labels are handed out longest first, in batches whose estimated duration
+    shrinks as the queue drains (guided self-scheduling): early batches are
+    large to keep the per-batch overhead low, late batches are small so all
+    workers finish at about the same time. Once the queue is empty, the pool
+    steals the not yet started labels of the busy worker with the most work
+    left and requeues them here.
+
+    The tests of a class are kept together, as each worker that runs any of
+    them pays for the class's fixtures (`setUpClass`, `setUpTestData`), which
+    take `setup_costs[class]` seconds. A class is only split up if it takes
+    longer than a worker's fair share of the whole run, and only as far as
+    that pays for the extra setups, see `split`.
+
+    Labels without a known timing are estimated from the timings of their
+    class, module or app, see `estimate_timings`.
+
+    The labels in `first` are handed out before all others, in their order
+    and one per batch, so they are spread across all workers.
+    """
+    stealing = True
+
+    def __init__(self, timings, labels, workers, batch_factor=2, first=(),
+                 setup_costs=None):
+        self.weights = estimate_timings(labels, timings)
+        self.default = (
+            sum(self.weights.values()) / len(self.weights)
+            if self.weights else 1.0
+        )
+        self.setup_costs = setup_costs or {}
+        self.first = set(first)
+        self.workers = workers
+        self.batch_factor = batch_factor
+        units = group_by_class(
+            [label for label in labels if label not in self.first]
+        )
+        total = sum(self.estimate(unit) for unit in units)
+        units = [part for unit in units for part in self.split(unit, total)]
+        self.queue = deque([[label] for label in first] + sorted(
+            units, key=self.estimate, reverse=True
+        ))
+        self.unit_weights = dict(
+            (tuple(unit), self.estimate(unit)) for unit in self.queue
+        )
+        self.remaining = sum(self.unit_weights.values())
+
+    def split(self, unit, total):
+        """
+        Split the labels of a class into parts for several workers if that
+        shortens the run despite setting up the class once per part: the run
+        takes at least as long as its longest part, and as long as the
+        `total` estimated work (plus the extra setups) spread evenly.
+        """
+        estimate = self.estimate(unit)
+        if len(unit) < 2 or estimate <= total / float(self.workers):
+            return [unit]
+        setup = self.setup_costs.get(_class_of(unit[0]), 0)
+        body = estimate - setup
+        best, parts = estimate, 1
+        for count in range(2, min(len(unit), self.workers) + 1):
+            makespan = max(
+                setup + body / float(count),
+                (total + (count - 1) * setup) / float(self.workers)
+            )
+            if makespan < best:
+                best, parts = makespan, count
+        if parts == 1:
+            return [unit]
+        partitions = weighted_partition(
+            [(self.weights[label], label) for label in unit], parts
+        )
+        order = dict((label, index) for index, label in enumerate(unit))
+        return [
+            sorted(partition, key=order.__getitem__)
+            for partition in partitions if partition
+        ]
+
+    @property
+    def pending(self):
+        return bool(self.queue)
+
+    def next_batch(self):
+        if not self.queue:
+            return None
+        target = self.remaining / (self.batch_factor * self.workers)
+        batch = []
+        batch_time = 0
+        if self.queue[0][0] in self.first:
+            target = 0
+        while self.queue and (not batch or batch_time < target) and (
+                self.queue[0][0] not in self.first or not batch):
+            unit = self.queue.popleft()
+            batch.extend(unit)
+            batch_time += self.estimate(unit)
+        self.remaining -= batch_time
+        return batch
+
+    def requeue(self, labels):
+        for label in labels:
+            self.weights.setdefault(label, self.default)
+        units = [[label] for label in labels if label in self.first] + (
+            group_by_class(
+                [label for label in labels if label not in self.first]
+            )
+        )
+        longest_first = sorted(
+            units,
+            key=lambda unit: (unit[0] in self.first, self.estimate(unit)),
+            reverse=True
+        )
+        for unit in reversed(longest_first):
+            self.queue.appendleft(unit)
+            self.remaining += self.estimate(unit)
+
+    def drain(self):
+        labels = [label for unit in self.queue for label in unit]
+        self.queue.clear()
+        self.remaining = 0
+        return labels
+
+    def estimate(self, labels):
+        """
+        Estimated duration of running `labels` in one go, including the setup
+        of their classes.
+        """
+        return sum(
+            self.weights.get(label, self.default) for label in labels
+        ) + sum(
+            self.setup_costs.get(name, 0)
+            for name in set(_class_of(label) for label in labels)
+        )
+
+
+def _class_of(label):
+    return label.rpartition('.')[0]
+
+
+def group_by_class(labels):
+    """
+    Group labels by their class, in the order the classes first appear.
+    Labels that don't name a method of a class are groups of their own.
+    """
+    groups = []
+    positions = {}
+    for label in labels:
+        name = _class_of(label)
+        if not name:
+            groups.append([label])
+            continue
+        if name not in positions:
+            positions[name] = len(groups)
+            groups.append([])
+        groups[positions[name]].append(label)
+    return groups
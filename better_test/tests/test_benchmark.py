@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+
+from better_test.compat import unittest
+
+from better_test.benchmark import benchmark
+from better_test.benchmark import compare
+from better_test.benchmark import generate_suites
+from better_test.benchmark import partition_quality
+from better_test.utils import get_test_runner
+
+
+class BenchmarkTests(unittest.TestCase):
+    def test_generate_suites(self):
+        directory = tempfile.mkdtemp()
+        try:
+            generated = generate_suites(directory, scale=0.1)
+            self.assertEqual(generated['noop'][1], 1000)
+            self.assertEqual(generated['small_classes'][1], 1000)
+            for module, _ in generated.values():
+                path = os.path.join(directory, module + '.py')
+                with open(path) as fobj:
+                    compile(fobj.read(), path, 'exec')
+        finally:
+            shutil.rmtree(directory)
+
+    def test_partition_quality(self):
+        quality = partition_quality(
+            {'a': 3.0, 'b': 3.0, 'c': 2.0, 'd': 2.0, 'e': 2.0}, 2
+        )
+        self.assertAlmostEqual(
+            quality['weighted_partition']['makespan'], 1.0
+        )
+        self.assertTrue(
+            quality['simple_weighted_partition']['makespan'] > 1.0
+        )
+
+    def test_benchmark(self):
+        results = benchmark(
+            get_test_runner(), suites=['noop'], modes=['standard'],
+            scale=0.01
+        )
+        result, = results['results']
+        self.assertEqual(result['tests_run'], 100)
+        self.assertEqual(result['results_handled'], 100)
+        self.assertTrue(result['success'])
+        self.assertTrue(result['worker_startup'] > 0)
+        changes = compare(results, results)
+        self.assertEqual(len(changes), 4)
+        self.assertTrue(all(before == after
+                            for _, _, _, before, after in changes))
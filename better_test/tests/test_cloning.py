@@ -0,0 +1,148 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from better_test.compat import unittest
+
+from better_test.cloning import DatabaseTemplate
+from better_test.cloning import use_clones
+from better_test.utils import get_test_runner
+
+# Connection parameters of the PostgreSQL server to test cloning against
+POSTGRES = {
+    'ENGINE': 'django.db.backends.postgresql',
+    'NAME': 'better_test_cloning',
+    'USER': os.environ.get('PGUSER', 'postgres'),
+    'PASSWORD': os.environ.get('PGPASSWORD', ''),
+    'HOST': os.environ.get('PGHOST', 'localhost'),
+    'PORT': os.environ.get('PGPORT', ''),
+}
+
+
+def add_database(alias, config):
+    from django.conf import settings
+    from django.db import connections
+    settings.DATABASES[alias] = config
+    # Forget the cached settings of the connections, so the new alias is
+    # picked up, whatever the Django version calls them
+    for name in ('settings', 'databases'):
+        connections.__dict__.pop(name, None)
+    return connections[alias]
+
+
+def remove_database(alias):
+    from django.conf import settings
+    from django.db import connections
+    connections[alias].close()
+    try:
+        del connections[alias]
+    except (AttributeError, TypeError):
+        delattr(connections._connections, alias)
+    del settings.DATABASES[alias]
+    for name in ('settings', 'databases'):
+        connections.__dict__.pop(name, None)
+
+
+def postgres_available():
+    try:
+        import psycopg2 as driver
+    except ImportError:
+        try:
+            import psycopg as driver
+        except ImportError:
+            return False
+    try:
+        driver.connect(
+            dbname='postgres', user=POSTGRES['USER'],
+            password=POSTGRES['PASSWORD'], host=POSTGRES['HOST'],
+            port=POSTGRES['PORT'] or None, connect_timeout=2
+        ).close()
+    except Exception:
+        return False
+    return True
+
+
+class CloningTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_template(self, alias):
+        template = DatabaseTemplate(get_test_runner(), {}, aliases=[alias])
+        template.verbosity = 0
+        return template
+
+    def test_sqlite_file(self):
+        path = os.path.join(self.directory, 'template.sqlite3')
+        with sqlite3.connect(path) as connection:
+            connection.execute('CREATE TABLE things (name TEXT)')
+        add_database('cloning', {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': path,
+        })
+        self.addCleanup(remove_database, 'cloning')
+        template = self.get_template('cloning')
+
+        clone = template.clone(1)['cloning']['NAME']
+        self.assertNotEqual(clone, path)
+        with sqlite3.connect(clone) as connection:
+            connection.execute("INSERT INTO things VALUES ('dirty')")
+        # A new worker in the slot gets a fresh copy of the template
+        self.assertEqual(template.clone(1)['cloning']['NAME'], clone)
+        connection = sqlite3.connect(clone)
+        try:
+            self.assertEqual(
+                connection.execute('SELECT COUNT(*) FROM things').fetchone(),
+                (0, )
+            )
+        finally:
+            connection.close()
+
+    def test_sqlite_in_memory(self):
+        path = os.path.join(self.directory, 'memory.sqlite3')
+        with sqlite3.connect(path) as connection:
+            connection.execute('CREATE TABLE things (name TEXT)')
+        connection = add_database('memory', {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:',
+        })
+        self.addCleanup(remove_database, 'memory')
+        template = self.get_template('memory')
+        template.dumps['memory'] = path
+
+        use_clones(template.clone(1))
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO things VALUES ('dirty')")
+        use_clones(template.clone(1))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM things')
+            self.assertEqual(cursor.fetchone(), (0, ))
+
+    @unittest.skipUnless(postgres_available(), "Needs a PostgreSQL server")
+    def test_postgresql(self):
+        connection = add_database('postgres', dict(POSTGRES))
+        self.addCleanup(remove_database, 'postgres')
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        self.addCleanup(
+            connection.creation.destroy_test_db, POSTGRES['NAME'], verbosity=0
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE things (name TEXT)')
+        connection.close()
+        template = self.get_template('postgres')
+
+        clone = template.clone(1)['postgres']['NAME']
+        self.addCleanup(template.destroy_clones)
+        settings_dict = dict(connection.settings_dict, NAME=clone)
+        other = connection.__class__(settings_dict, 'clone')
+        with other.cursor() as cursor:
+            cursor.execute("INSERT INTO things VALUES ('dirty')")
+        other.close()
+        template.clone(1)
+        with other.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM things')
+            self.assertEqual(cursor.fetchone(), (0, ))
+        other.close()
@@ -65,12 +65,65 @@ class TestCrashingExecutors(unittest.TestCase):
                 real_result_class=SilentMultiProcessingTextTestResult
             )
         self.assertFalse(result.success)
-        self.assertEqual(len(result.failed_executors), 1)
-        _, exit_code = result.failed_executors[0]
+        # The crash is reported once, as an error of the test
+        self.assertEqual(result.failed_executors, [])
+        self.assertEqual(result.total_failures, 1)
+        self.assertEqual(len(result.errors), 1)
+        _, error = result.errors[0]
         if sys.platform == 'linux':
-            self.assertEqual(exit_code, -signal.SIGSEGV)
+            exit_code = -signal.SIGSEGV
         elif sys.platform == 'darwin':
-            self.assertEqual(exit_code, -signal.SIGILL)
+            exit_code = -signal.SIGILL
         elif sys.platform == 'win32':
-            self.assertEqual(exit_code, 3221225477)
+            exit_code = 3221225477
+        self.assertIn('exited with code {0} '.format(exit_code), error)
 
+    def test_resume_chunk(self):
+        with no_report_crash():
+            result = core.run(
+                ['better_test.harness.crash.ChunkTests'],
+                {},
+                core.Config(
+                    test_runner_class=get_test_runner(),
+                    mode=core.STANDARD,
+                    timings={},
+                    processes=1
+                ),
+                real_result_class=SilentMultiProcessingTextTestResult
+            )
+        self.assertFalse(result.success)
+        crashed = 'better_test.harness.crash.ChunkTests.test_abort'
+        self.assertEqual(result.failed_executors, [])
+        self.assertEqual(len(result.successes), 3)
+        self.assertEqual(len(result.errors), 1)
+        test, error = result.errors[0]
+        self.assertEqual(test.qualname, crashed)
+        self.assertIn('Crash', error)
+
+    def test_class_fixture_crash(self):
+        with no_report_crash():
+            result = core.run(
+                ['better_test.harness.crash.PassingTests',
+                 'better_test.harness.crash.SetUpClassTests'],
+                {},
+                core.Config(
+                    test_runner_class=get_test_runner(),
+                    mode=core.STANDARD,
+                    timings={},
+                    processes=1
+                ),
+                real_result_class=SilentMultiProcessingTextTestResult
+            )
+        self.assertFalse(result.success)
+        # The test that ran before is not blamed, the class fails instead
+        self.assertEqual(
+            [test.qualname for test in result.successes],
+            ['better_test.harness.crash.PassingTests.test_pass']
+        )
+        self.assertEqual(result.errors, [])
+        self.assertEqual(len(result.failed_executors), 1)
+        chunk, exit_code = result.failed_executors[0]
+        self.assertEqual(
+            chunk, ['better_test.harness.crash.SetUpClassTests.test_unreached']
+        )
+        self.assertNotEqual(exit_code, 0)
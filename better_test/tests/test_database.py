@@ -0,0 +1,278 @@
+import json
+import os
+import shutil
+import tempfile
+
+from better_test.compat import unittest
+
+from better_test.database import Database
+from better_test.database import percentile
+from better_test.database import update_statistics
+
+
+class DatabaseTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, '.better_test.db')
+        # Cleanups run last in, first out: the databases are closed first
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def open(self, **kwargs):
+        database = Database(self.path, **kwargs)
+        self.addCleanup(database.close)
+        return database
+
+    def record(self, database, results, labels=None):
+        run = database.start_run()
+        for name, outcome, duration in results:
+            run.record_outcome(name, outcome)
+            if duration is not None:
+                run.record_timing(name, duration)
+        run.finish(
+            all(outcome == 'success' for _, outcome, _ in results),
+            {'isolate': False, 'parallel': True, 'list_slow': 0,
+             'labels': labels or []}
+        )
+
+    def test_empty(self):
+        database = self.open()
+        self.assertFalse(database)
+        self.assertEqual(database.timings(), {})
+        self.assertEqual(database.failed(), [])
+        self.assertEqual(database.last_run(), None)
+
+    def test_record(self):
+        database = self.open()
+        self.record(database, [
+            ('a.A.test_a', 'success', 1.0),
+            ('a.A.test_b', 'failure', 2.0),
+            ('a.A.test_c', 'error', None),
+        ], ['a'])
+        database.close()
+        database = self.open()
+        self.assertEqual(database.timings(), {
+            'a.A.test_a': 1.0, 'a.A.test_b': 2.0
+        })
+        self.assertEqual(database.failed(), ['a.A.test_b', 'a.A.test_c'])
+        self.assertEqual(database.last_run()['labels'], ['a'])
+
+    def test_latest_run_wins(self):
+        database = self.open()
+        self.record(database, [('a.A.test_a', 'failure', 1.0)])
+        self.record(database, [('a.A.test_a', 'success', 3.0)])
+        self.assertEqual(database.timings(), {'a.A.test_a': 3.0})
+        self.assertEqual(database.failed(), [])
+
+    def test_unfinished_run_ignored(self):
+        database = self.open()
+        self.record(database, [('a.A.test_a', 'success', 1.0)], ['a'])
+        database.start_run()
+        self.assertEqual(database.last_run()['labels'], ['a'])
+
+    def test_failed_uses_latest_result(self):
+        database = self.open()
+        self.record(database, [
+            ('a.A.test_a', 'failure', 1.0),
+            ('a.A.test_b', 'failure', 1.0),
+        ])
+        self.record(database, [('a.A.test_a', 'success', 1.0)])
+        self.assertEqual(database.failed(), ['a.A.test_b'])
+        self.assertEqual(
+            database.recently_failed(), ['a.A.test_a', 'a.A.test_b']
+        )
+        self.assertEqual(database.recently_failed(runs=1), [])
+
+    def test_recently_failed_uses_index(self):
+        database = self.open()
+        self.record(database, [('a.A.test_a', 'failure', 1.0)])
+        connection = database.connection
+        statements = []
+
+        class Connection(object):
+            def execute(self, sql, parameters=()):
+                statements.append((sql, parameters))
+                return connection.execute(sql, parameters)
+
+        database.connection = Connection()
+        try:
+            database.recently_failed()
+        finally:
+            database.connection = connection
+        (sql, parameters), = statements
+        plan = connection.execute(
+            'EXPLAIN QUERY PLAN ' + sql, parameters
+        ).fetchall()
+        self.assertIn('failed_results', str(plan))
+
+    def test_repeated_in_batch(self):
+        database = self.open()
+        run = database.start_run()
+        run.record_timing('a.A.test_a', 1.0)
+        run.record_outcome('a.A.test_a', 'failure')
+        run.record_timing('a.A.test_a', 3.0)
+        run.finish(False, None)
+        self.assertEqual(database.timings(), {'a.A.test_a': 3.0})
+        self.assertEqual(database.timings('p50'), {'a.A.test_a': 2.0})
+        self.assertEqual(database.failed(), ['a.A.test_a'])
+
+    def test_fixture_error_fixed(self):
+        database = self.open()
+        self.record(database, [('setUpClass (a.A)', 'error', None)])
+        self.assertEqual(database.failed(), ['setUpClass (a.A)'])
+        self.record(database, [('a.A.test_a', 'success', 1.0)])
+        self.assertEqual(database.failed(), [])
+
+    def test_forget_missing(self):
+        database = self.open()
+        self.record(database, [
+            ('a.A.test_a', 'failure', 1.0),
+            ('b.B.test_b', 'failure', 1.0),
+        ])
+        run = database.start_run()
+        run.forget_missing(['a'], ['a.A.test_c'])
+        self.assertEqual(database.failed(), ['b.B.test_b'])
+        run.forget_missing([], ['b.B.test_b'])
+        self.assertEqual(database.failed(), ['b.B.test_b'])
+        run.forget_missing([], [])
+        self.assertEqual(database.failed(), [])
+
+    def test_statistics(self):
+        database = self.open()
+        for duration in [1.0, 1.0, 1.0, 1.0, 5.0]:
+            self.record(database, [('a.A.test_a', 'success', duration)])
+        self.assertEqual(database.timings(), {'a.A.test_a': 5.0})
+        self.assertEqual(database.timings('p50'), {'a.A.test_a': 1.0})
+        self.assertAlmostEqual(database.timings('p95')['a.A.test_a'], 4.2)
+        mean = database.timings('mean')['a.A.test_a']
+        self.assertTrue(1.0 < mean < 5.0)
+        self.assertRaises(ValueError, database.timings, 'max')
+
+    def test_import_results(self):
+        database = self.open()
+        self.record(database, [('a.A.test_a', 'success', 1.0)], ['a'])
+        run_id = database.start_run().run_id
+        database.import_results([
+            ('a.A.test_a', 'success', 3.0),
+            ('b.B.test_b', 'failure', 2.0),
+            ('setUpClass (c.C)', 'error', None),
+        ])
+        self.assertEqual(database.timings(), {
+            'a.A.test_a': 3.0, 'b.B.test_b': 2.0
+        })
+        self.assertEqual(
+            database.failed(), ['b.B.test_b', 'setUpClass (c.C)']
+        )
+        self.assertEqual(database.results(run_id + 1), [
+            ('a.A.test_a', 'success', 3.0),
+            ('b.B.test_b', 'failure', 2.0),
+            ('setUpClass (c.C)', 'error', None),
+        ])
+        self.assertEqual(database.last_run()['labels'], ['a'])
+
+    def test_class_timings(self):
+        database = self.open()
+        for duration in [1.0, 2.0]:
+            run = database.start_run()
+            run.record_class_timings({
+                'a.A': {'setUpClass': duration, 'tearDownClass': 0.5}
+            })
+            run.finish(True, None)
+        timings = database.class_timings()['a.A']
+        self.assertEqual(timings['setUpClass'][:2], (2.0, 2))
+        self.assertAlmostEqual(timings['setUpClass'][2], 1.3)
+        self.assertAlmostEqual(database.setup_costs()['a.A'], 1.8)
+
+    def test_without_statistics(self):
+        database = self.open()
+        run = database.start_run(record_statistics=False)
+        run.record_timing('a.A.test_a', 1.0)
+        run.record_class_timings({'a.A': {'setUpClass': 0.5}})
+        run.finish(True, None)
+        self.assertEqual(database.timings(), {})
+        self.assertEqual(database.setup_costs(), {})
+        self.assertEqual(
+            database.results(run.run_id), [('a.A.test_a', 'success', 1.0)]
+        )
+
+    def test_queries(self):
+        database = self.open()
+        for count in [3, 5]:
+            run = database.start_run()
+            run.record_metrics('a.A.test_a', {'queries': [count, 0.5]})
+            run.record_timing('a.A.test_a', 1.0)
+            run.finish(True, None)
+        self.assertEqual(database.queries(), {'a.A.test_a': (5, 0.5)})
+
+    def test_class_queries(self):
+        database = self.open()
+        run = database.start_run()
+        run.record_metrics('a.A', {'queries': [10, 0.25]})
+        run.finish(True, None)
+        self.assertEqual(database.queries(), {'a.A': (10, 0.25)})
+        self.assertEqual(database.statistics(), {})
+
+    def test_worker_rss(self):
+        database = self.open()
+        self.assertEqual(database.worker_rss(), None)
+        for rss in [300, 100, 200]:
+            run = database.start_run()
+            run.record_worker_rss(rss)
+            run.finish(True, None)
+        self.assertEqual(database.worker_rss(), 300)
+        self.assertEqual(database.worker_rss(runs=2), 200)
+
+    def test_compaction(self):
+        database = self.open(keep_runs=3)
+        for duration in range(5):
+            self.record(database, [('a.A.test_a', 'success', duration)])
+        connection = database.connection
+        self.assertEqual(
+            connection.execute('SELECT COUNT(*) FROM runs').fetchone()[0], 3
+        )
+        self.assertEqual(
+            connection.execute('SELECT COUNT(*) FROM results').fetchone()[0], 3
+        )
+
+    def test_legacy_json(self):
+        with open(self.path, 'w') as fobj:
+            json.dump({
+                'timings': {'a.A.test_a': 1.5},
+                'failed': ['a.A.test_a'],
+                'last_run': {'isolate': True, 'parallel': False,
+                             'list_slow': 0, 'labels': ['a']},
+            }, fobj)
+        database = self.open()
+        self.assertEqual(database.timings(), {'a.A.test_a': 1.5})
+        self.assertEqual(database.failed(), ['a.A.test_a'])
+        self.assertTrue(database.last_run()['isolate'])
+
+
+class StatisticsTests(unittest.TestCase):
+    def fold(self, durations, **kwargs):
+        statistics = None
+        for duration in durations:
+            statistics = update_statistics(statistics, duration, **kwargs)
+        return statistics
+
+    def test_constant(self):
+        samples, mean, variance, p50, p95, _ = self.fold([2.0] * 10)
+        self.assertEqual(samples, 10)
+        self.assertAlmostEqual(mean, 2.0)
+        self.assertAlmostEqual(variance, 0.0)
+        self.assertEqual((p50, p95), (2.0, 2.0))
+
+    def test_outlier_fades(self):
+        durations = [1.0] * 5 + [10.0]
+        _, mean, variance, _, p95, _ = self.fold(durations)
+        self.assertTrue(p95 > 5.0)
+        _, later_mean, later_variance, _, later_p95, _ = self.fold(
+            durations + [1.0] * 20
+        )
+        self.assertEqual(later_p95, 1.0)
+        self.assertTrue(later_mean < mean)
+        self.assertTrue(later_variance < variance)
+
+    def test_percentile(self):
+        self.assertEqual(percentile([1.0], 0.95), 1.0)
+        self.assertEqual(percentile([1.0, 2.0, 3.0], 0.5), 2.0)
+        self.assertAlmostEqual(percentile([0.0, 10.0], 0.95), 9.5)
@@ -0,0 +1,111 @@
+import os
+import shutil
+import sys
+import tempfile
+
+from django.test.runner import DiscoverRunner
+
+from better_test.compat import unittest
+
+from better_test.database import Database
+from better_test.discovery import DiscoveryCache
+
+
+TESTS = '''from unittest import TestCase
+
+
+class {name}(TestCase):
+{methods}
+'''
+
+
+class CountingRunner(DiscoverRunner):
+    def __init__(self, *args, **kwargs):
+        super(CountingRunner, self).__init__(*args, **kwargs)
+        self.built = []
+
+    def build_suite(self, test_labels=None, *args, **kwargs):
+        self.built.append(list(test_labels))
+        return super(CountingRunner, self).build_suite(
+            test_labels, *args, **kwargs
+        )
+
+
+class DiscoveryCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.package = os.path.join(self.directory, 'discovery_package')
+        os.mkdir(self.package)
+        open(os.path.join(self.package, '__init__.py'), 'w').close()
+        self.write('tests_a', 'ATests', 'one', 'two')
+        self.write('tests_b', 'BTests', 'one')
+        sys.path.insert(0, self.directory)
+        self.database = Database(os.path.join(self.directory, 'db'))
+        self.result = unittest.TestResult()
+
+    def tearDown(self):
+        self.database.close()
+        sys.path.remove(self.directory)
+        self.forget_modules()
+        shutil.rmtree(self.directory)
+
+    def forget_modules(self):
+        for name in list(sys.modules):
+            if name.startswith('discovery_package'):
+                del sys.modules[name]
+
+    def write(self, module, name, *methods):
+        with open(os.path.join(self.package, module + '.py'), 'w') as fobj:
+            fobj.write(TESTS.format(name=name, methods='\n'.join(
+                '    def test_{0}(self):\n        pass\n'.format(method)
+                for method in methods
+            )))
+
+    def discover(self, labels=('discovery_package', )):
+        # Like a new test run, which has not imported anything yet
+        self.forget_modules()
+        runner = CountingRunner(pattern='tests*.py', verbosity=0)
+        cache = DiscoveryCache(self.database, root=self.directory)
+        return cache.discover(runner, list(labels), self.result), runner.built
+
+    def test_unchanged(self):
+        labels, built = self.discover()
+        self.assertEqual(labels, [
+            'discovery_package.tests_a.ATests.test_one',
+            'discovery_package.tests_a.ATests.test_two',
+            'discovery_package.tests_b.BTests.test_one',
+        ])
+        self.assertEqual(built, [['discovery_package']])
+        self.assertEqual(self.discover(), (labels, []))
+
+    def test_changed_module(self):
+        self.discover()
+        self.write('tests_b', 'BTests', 'one', 'three')
+        labels, built = self.discover()
+        self.assertEqual(built, [['discovery_package.tests_b']])
+        self.assertEqual(
+            labels[-1], 'discovery_package.tests_b.BTests.test_three'
+        )
+        self.assertEqual(self.discover(), (labels, []))
+
+    def test_changed_module_of_class_label(self):
+        label = 'discovery_package.tests_b.BTests.test_one'
+        self.discover([label])
+        self.write('tests_b', 'BTests', 'one', 'three')
+        self.assertEqual(
+            self.discover([label]),
+            ([label], [['discovery_package.tests_b']])
+        )
+
+    def test_new_module(self):
+        self.discover()
+        self.write('tests_c', 'CTests', 'one')
+        labels, built = self.discover()
+        self.assertEqual(built, [['discovery_package']])
+        self.assertEqual(len(labels), 4)
+
+    def test_import_error_not_stored(self):
+        with open(os.path.join(self.package, 'tests_c.py'), 'w') as fobj:
+            fobj.write('import does_not_exist\n')
+        self.discover()
+        self.assertEqual(self.discover()[1], [['discovery_package']])
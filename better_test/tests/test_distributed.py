@@ -0,0 +1,81 @@
+import multiprocessing
+import socket
+
+from better_test.compat import unittest
+from better_test.compat import wait_for_connections
+
+from better_test.parallel import Pool
+from better_test.parallel import SilentMultiProcessingTextTestResult
+from better_test.parallel import run_agent
+from better_test.parallel import setup_django
+from better_test.scheduler import WorkStealingScheduler
+from better_test.utils import get_settings_bootstrap
+from better_test.utils import get_test_runner
+from better_test.utils import is_loopback
+from better_test.utils import parse_address
+
+
+AUTHKEY = b'better-test'
+
+LABELS = [
+    'better_test.harness.distributed.DistributedTests.test_' + name
+    for name in 'abcdef'
+]
+
+
+def agent(address, bootstrap):
+    setup_django(bootstrap)
+    run_agent(address, AUTHKEY, 2)
+
+
+def get_free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class ParseAddressTests(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_address('example.com:8000'),
+                         ('example.com', 8000))
+        self.assertEqual(parse_address(':8000'), ('127.0.0.1', 8000))
+        self.assertRaises(ValueError, parse_address, 'example.com')
+        self.assertRaises(ValueError, parse_address, 'example.com:http')
+
+    def test_is_loopback(self):
+        self.assertTrue(is_loopback('127.0.0.1'))
+        self.assertTrue(is_loopback('localhost'))
+        self.assertTrue(is_loopback('::1'))
+        self.assertFalse(is_loopback('0.0.0.0'))
+        self.assertFalse(is_loopback('192.0.2.1'))
+
+
+@unittest.skipIf(wait_for_connections is None, "Needs Python 3.3")
+class DistributedTests(unittest.TestCase):
+    def test_agents(self):
+        address = ('127.0.0.1', get_free_port())
+        context = multiprocessing.get_context('spawn')
+        agents = [
+            context.Process(
+                target=agent, args=(address, get_settings_bootstrap())
+            )
+            for _ in range(2)
+        ]
+        for process in agents:
+            process.start()
+        result = unittest.TextTestRunner(
+            resultclass=SilentMultiProcessingTextTestResult
+        )._makeResult()
+        # No local workers, everything runs on the agents' workers
+        pool = Pool(result, 0, listen=address, authkey=AUTHKEY)
+        failed_executors = pool.run(
+            WorkStealingScheduler({}, LABELS, 4), get_test_runner(), {}
+        )
+        for process in agents:
+            process.join(30)
+        self.assertEqual(failed_executors, [])
+        self.assertEqual(len(result.successes), len(LABELS))
+        self.assertTrue(pool.agents)
+        self.assertEqual([process.exitcode for process in agents], [0, 0])
@@ -0,0 +1,51 @@
+import time
+
+from better_test.compat import unittest
+
+from better_test import core
+from better_test.parallel import Pool
+from better_test.parallel import SilentMultiProcessingTextTestResult
+from better_test.scheduler import WorkStealingScheduler
+from better_test.utils import get_test_runner
+
+
+PREFIX = 'better_test.harness.failfast.FailFastTests.'
+QUICK = [PREFIX + 'test_{0:02d}'.format(index) for index in range(20)]
+
+
+class FailFastTests(unittest.TestCase):
+    def test_stop_dispatch(self):
+        result = core.run(
+            [PREFIX + 'test_fail'] + QUICK,
+            {},
+            core.Config(
+                test_runner_class=get_test_runner(),
+                mode=core.PARALLEL,
+                timings={PREFIX + 'test_fail': 10},
+                processes=2,
+                failfast=True,
+            ),
+            real_result_class=SilentMultiProcessingTextTestResult
+        )
+        self.assertEqual(len(result.failures), 1)
+        self.assertTrue(result.not_run)
+        self.assertEqual(
+            len(result.successes) + len(result.not_run), len(QUICK)
+        )
+        self.assertEqual(result.failed_executors, [])
+
+    def test_terminate(self):
+        result = unittest.TextTestRunner(
+            resultclass=SilentMultiProcessingTextTestResult
+        )._makeResult()
+        labels = [PREFIX + 'test_hang', PREFIX + 'test_fail']
+        scheduler = WorkStealingScheduler(
+            {PREFIX + 'test_hang': 30, PREFIX + 'test_fail': 1}, labels, 2
+        )
+        pool = Pool(result, 2, failfast=True, stop_timeout=0.5)
+        start = time.time()
+        failed_executors = pool.run(scheduler, get_test_runner(), {})
+        self.assertTrue(time.time() - start < 20)
+        self.assertEqual(failed_executors, [])
+        self.assertEqual(len(result.failures), 1)
+        self.assertEqual(pool.not_run, [PREFIX + 'test_hang'])
@@ -0,0 +1,69 @@
+import time
+
+from better_test.compat import unittest
+
+from better_test import core
+from better_test.fixtures import FixtureTimer
+from better_test.parallel import SilentMultiProcessingTextTestResult
+from better_test.utils import get_test_runner
+
+
+class FixtureTimerTests(unittest.TestCase):
+    def make_classes(self):
+        class Base(unittest.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                time.sleep(0.05)
+                cls.setUpTestData()
+
+            @classmethod
+            def setUpTestData(cls):
+                time.sleep(0.1)
+
+            def test_a(self):
+                pass
+
+        class Child(Base):
+            @classmethod
+            def setUpClass(cls):
+                super(Child, cls).setUpClass()
+                time.sleep(0.05)
+
+        return Base, Child
+
+    def test_phases(self):
+        Base, Child = self.make_classes()
+        timer = FixtureTimer()
+        timer.instrument([Base('test_a'), Child('test_a')])
+        Child.setUpClass()
+        Child.tearDownClass()
+        name = Child.__module__ + '.Child'
+        timings = timer.collect()
+        self.assertEqual(list(timings), [name])
+        phases = timings[name]
+        self.assertEqual(
+            sorted(phases), ['setUpClass', 'setUpTestData', 'tearDownClass']
+        )
+        # The overridden setUpClass counts once, without setUpTestData
+        self.assertTrue(0.1 <= phases['setUpClass'] < 0.15)
+        self.assertTrue(0.1 <= phases['setUpTestData'] < 0.15)
+        self.assertEqual(timer.collect(), {})
+
+
+class ClassTimingsTests(unittest.TestCase):
+    def test_run(self):
+        result = core.run(
+            ['better_test.harness.fixtures'],
+            {},
+            core.Config(
+                test_runner_class=get_test_runner(),
+                mode=core.PARALLEL,
+                timings={},
+                processes=1
+            ),
+            real_result_class=SilentMultiProcessingTextTestResult
+        )
+        self.assertTrue(result.success)
+        phases = result.class_timings['better_test.harness.fixtures.Tests']
+        self.assertTrue(phases['setUpClass'] >= 0.2)
+        self.assertTrue(phases['tearDownClass'] >= 0.1)
@@ -0,0 +1,223 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import warnings
+
+from better_test.compat import unittest
+
+from better_test.database import Database
+from better_test.fixtures import FixtureTimer
+from better_test.fixtures import class_name
+from better_test.impact import Hunk
+from better_test.impact import ImpactProbe
+from better_test.impact import _changed_functions
+from better_test.impact import format_lines
+from better_test.impact import get_changes
+from better_test.impact import parse_lines
+from better_test.impact import select_tests
+
+
+HELPERS = '''def make_data():
+    return [1, 2, 3]
+'''
+
+SOURCE = '''LIMIT = 10
+
+
+def add(a, b):
+    return a + b
+
+
+class Ops(object):
+    factor = 2
+
+    def mul(self, a):
+        # Multiply
+        return a * self.factor
+'''
+
+
+def hunk(start, count, *added):
+    result = Hunk(start, count)
+    result.added.extend(added)
+    return result
+
+
+class LinesTests(unittest.TestCase):
+    def test_round_trip(self):
+        lines = set([1, 2, 3, 7, 9, 10])
+        self.assertEqual(format_lines(lines), '1-3,7,9-10')
+        self.assertEqual(parse_lines(format_lines(lines)), lines)
+
+    def test_empty(self):
+        self.assertEqual(format_lines(set()), '')
+        self.assertEqual(parse_lines(''), set())
+
+
+@unittest.skipIf(sys.version_info < (3, 8), "Needs end_lineno")
+class ChangedFunctionsTests(unittest.TestCase):
+    def changed(self, *hunks):
+        functions = _changed_functions(SOURCE, hunks)
+        if functions is None:
+            return None
+        return sorted(start for start, _, _ in functions)
+
+    def test_function_body(self):
+        self.assertEqual(self.changed(hunk(5, 1)), [4])
+
+    def test_method_body(self):
+        self.assertEqual(self.changed(hunk(12, 2)), [11])
+
+    def test_module_level(self):
+        self.assertEqual(self.changed(hunk(1, 1)), None)
+
+    def test_class_level(self):
+        self.assertEqual(self.changed(hunk(9, 1)), None)
+
+    def test_blank_lines(self):
+        self.assertEqual(self.changed(hunk(2, 2)), [])
+
+    def test_insert_comment(self):
+        self.assertEqual(self.changed(hunk(6, 0, '# Note')), [])
+
+    def test_insert_at_end_of_function(self):
+        self.assertEqual(self.changed(hunk(5, 0, '    print(a)')), [4])
+
+    def test_insert_after_function(self):
+        self.assertEqual(self.changed(hunk(5, 0, 'X = 1')), None)
+
+
+class ImpactProbeTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'impact_module.py')
+        with open(path, 'w') as fobj:
+            fobj.write(SOURCE)
+        sys.path.insert(0, self.directory)
+
+    def tearDown(self):
+        sys.path.remove(self.directory)
+        sys.modules.pop('impact_module', None)
+        shutil.rmtree(self.directory)
+
+    def test_trace(self):
+        import impact_module
+        probe = ImpactProbe(self.directory)
+        probe.setup()
+        if sys.gettrace() is not None:
+            self.skipTest("Another tracer is active")
+        probe.start_test(self)
+        impact_module.Ops().mul(2)
+        coverage = probe.stop_test(self)
+        self.assertEqual(coverage, {
+            os.path.realpath(impact_module.__file__): '11,13'
+        })
+
+
+@unittest.skipIf(sys.version_info < (3, 8), "Needs end_lineno")
+class ClassFixtureImpactTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = os.path.realpath(tempfile.mkdtemp())
+        with open(os.path.join(self.directory, 'impact_helpers.py'),
+                  'w') as fobj:
+            fobj.write(HELPERS)
+        self.git('init', '-q')
+        self.git('add', 'impact_helpers.py')
+        self.git('-c', 'user.name=Test', '-c', 'user.email=test@example.com',
+                 'commit', '-q', '-m', 'Helpers')
+        sys.path.insert(0, self.directory)
+        self.cwd = os.getcwd()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        sys.path.remove(self.directory)
+        sys.modules.pop('impact_helpers', None)
+        shutil.rmtree(self.directory)
+
+    def git(self, *args):
+        subprocess.check_call(('git', ) + args, cwd=self.directory)
+
+    def make_tests(self):
+        import impact_helpers
+
+        class DataTests(unittest.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                cls.setUpTestData()
+
+            @classmethod
+            def setUpTestData(cls):
+                cls.data = impact_helpers.make_data()
+
+            def test_data(self):
+                pass
+
+        class OtherTests(unittest.TestCase):
+            def test_other(self):
+                pass
+
+        return [DataTests('test_data'), OtherTests('test_other')]
+
+    def record(self, database, tests):
+        probe = ImpactProbe(self.directory)
+        timer = FixtureTimer([probe])
+        timer.instrument(tests)
+        run = database.start_run()
+        for test in tests:
+            test.__class__.setUpClass()
+            probe.start_test(test)
+            label = self.label(test)
+            run.record_metrics(label, {'coverage': probe.stop_test(test)})
+            run.record_timing(label, 0.1)
+        for name, metrics in timer.collect_metrics().items():
+            run.record_metrics(name, metrics)
+        run.finish(True, None)
+
+    def label(self, test):
+        return class_name(test.__class__) + '.' + test._testMethodName
+
+    def test_helper_of_set_up_test_data(self):
+        if sys.gettrace() is not None:
+            self.skipTest("Another tracer is active")
+        tests = self.make_tests()
+        database = Database(os.path.join(self.directory, '.better_test.db'))
+        self.addCleanup(database.close)
+        self.record(database, tests)
+
+        with open('impact_helpers.py', 'w') as fobj:
+            fobj.write(HELPERS.replace('[1, 2, 3]', '[1, 2]'))
+        labels = [self.label(test) for test in tests]
+        self.assertEqual(
+            select_tests(labels, database, get_changes('HEAD'), 'HEAD'),
+            labels[:1]
+        )
+
+    def test_other_tracer(self):
+        if sys.gettrace() is not None:
+            self.skipTest("Another tracer is active")
+        tests = self.make_tests()
+        labels = [self.label(test) for test in tests]
+        database = Database(os.path.join(self.directory, '.better_test.db'))
+        self.addCleanup(database.close)
+        self.record(database, tests)
+        self.assertEqual(
+            select_tests(labels, database, get_changes('HEAD'), 'HEAD'), []
+        )
+        # Recording again under another tracer replaces the coverage, and
+        # the tests are always selected
+        sys.settrace(lambda frame, event, arg: None)
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                self.record(database, self.make_tests())
+        finally:
+            sys.settrace(None)
+        self.assertEqual(len(caught), 1)
+        self.assertEqual(
+            select_tests(labels, database, get_changes('HEAD'), 'HEAD'),
+            labels
+        )
+        self.assertEqual(database.traced(), set())
@@ -0,0 +1,53 @@
+import os
+import pstats
+import shutil
+import tempfile
+
+from better_test.compat import unittest
+
+from better_test import core
+from better_test.parallel import SilentMultiProcessingTextTestResult
+from better_test.profiling import ProfileCollector
+from better_test.utils import get_test_runner
+
+
+class ProfileCollectorTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'run.pstats')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_select(self):
+        collector = ProfileCollector(self.path, min_duration=1.0)
+        probe = collector.get_probe(
+            ['a.A.test_a', 'a.A.test_b', 'a.B.test_c'],
+            {'a.A.test_a': 2.0, 'a.A.test_b': 0.5}
+        )
+        self.assertEqual(probe.tests, set(['a.A.test_a', 'a.B.test_c']))
+        self.assertEqual(
+            ProfileCollector(self.path).get_probe([], {}).tests, None
+        )
+
+    def test_run(self):
+        collector = ProfileCollector(self.path, top=2)
+        result = core.run(
+            ['better_test.harness.distributed'],
+            {},
+            core.Config(
+                test_runner_class=get_test_runner(),
+                mode=core.PARALLEL,
+                timings={},
+                processes=2,
+                profile=collector,
+            ),
+            real_result_class=SilentMultiProcessingTextTestResult
+        )
+        self.assertTrue(result.success)
+        self.assertEqual(sorted(collector.hot), sorted(result.timings))
+        self.assertTrue(collector.save())
+        stats = pstats.Stats(self.path)
+        self.assertTrue(stats.total_calls > 0)
+        for _, functions in collector.hot.values():
+            self.assertTrue(len(functions) <= 2)
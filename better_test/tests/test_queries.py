@@ -0,0 +1,55 @@
+import django
+
+from better_test.compat import unittest
+
+from better_test import core
+from better_test.parallel import SilentMultiProcessingTextTestResult
+from better_test.queries import QueryProbe
+from better_test.utils import get_test_runner
+
+
+@unittest.skipIf(django.VERSION < (2, 0), "Needs execute_wrapper")
+class QueryProbeTests(unittest.TestCase):
+    def test_count(self):
+        from django.db import connection
+        probe = QueryProbe()
+        probe.start_test(self)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.execute('SELECT 2')
+        queries, duration = probe.stop_test(self)
+        self.assertEqual(queries, 2)
+        self.assertTrue(duration >= 0)
+        self.assertNotIn(probe.execute, connection.execute_wrappers)
+
+    def test_fixtures(self):
+        from django.db import connection
+        probe = QueryProbe()
+        for queries in [2, 1]:
+            probe.start_fixture('a.A')
+            with connection.cursor() as cursor:
+                for _ in range(queries):
+                    cursor.execute('SELECT 1')
+            probe.stop_fixture('a.A')
+        fixture_queries = probe.collect_fixtures()
+        self.assertEqual(list(fixture_queries), ['a.A'])
+        self.assertEqual(fixture_queries['a.A'][0], 3)
+        self.assertEqual(probe.collect_fixtures(), {})
+
+    def test_run(self):
+        result = core.run(
+            ['better_test.harness.fixtures.QueryTests'],
+            {},
+            core.Config(
+                test_runner_class=get_test_runner(),
+                mode=core.PARALLEL,
+                timings={},
+                processes=1,
+                probes=[QueryProbe()]
+            ),
+            real_result_class=SilentMultiProcessingTextTestResult
+        )
+        self.assertTrue(result.success)
+        name = 'better_test.harness.fixtures.QueryTests'
+        self.assertEqual(result.queries[name + '.test_query'][0], 1)
+        self.assertEqual(result.class_queries[name][0], 3)
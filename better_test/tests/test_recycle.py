@@ -0,0 +1,65 @@
+from better_test.compat import tracemalloc
+from better_test.compat import unittest
+
+from better_test.memory import MemoryProbe
+from better_test.parallel import Pool
+from better_test.parallel import SilentMultiProcessingTextTestResult
+from better_test.scheduler import ChunkScheduler
+from better_test.utils import get_test_runner
+
+
+class RecycleTests(unittest.TestCase):
+    chunks = [
+        ['better_test.harness.isolate.IsolateTests.test_one'],
+        ['better_test.harness.isolate.IsolateTests.test_two'],
+    ]
+
+    def run_chunks(self, chunks=None, **kwargs):
+        result = unittest.TextTestRunner(
+            resultclass=SilentMultiProcessingTextTestResult
+        )._makeResult()
+        pool = Pool(result, 1, **kwargs)
+        failed_executors = pool.run(
+            ChunkScheduler(chunks or self.chunks), get_test_runner(), {}
+        )
+        self.assertEqual(failed_executors, [])
+        return result
+
+    def test_worker_reuse(self):
+        result = self.run_chunks()
+        self.assertEqual(len(result.successes), 1)
+        self.assertEqual(len(result.failures), 1)
+
+    def test_recycle_after_tests(self):
+        result = self.run_chunks(max_tests_per_worker=1)
+        self.assertEqual(len(result.successes), 2)
+        self.assertEqual(len(result.failures), 0)
+
+    def test_recycle_within_chunk(self):
+        # Every worker uses more than a megabyte, so it is recycled after
+        # the first test of the chunk and the second one runs in a new one.
+        result = self.run_chunks(
+            [[label for chunk in self.chunks for label in chunk]],
+            max_worker_memory=1, probes=[MemoryProbe(max_rss=1024 * 1024)]
+        )
+        self.assertEqual(len(result.successes), 2)
+        self.assertEqual(len(result.failures), 0)
+        self.assertEqual(len(result.memory), 2)
+
+
+class MemoryProbeTests(unittest.TestCase):
+    @unittest.skipIf(tracemalloc is None, "Needs tracemalloc")
+    def test_traced_peak(self):
+        probe = MemoryProbe(trace=True)
+        was_tracing = tracemalloc.is_tracing()
+        probe.setup()
+        try:
+            probe.start_test(self)
+            data = bytearray(4 * 1024 * 1024)
+            del data
+            delta, rss, peak = probe.stop_test(self)
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+        self.assertTrue(rss > 0)
+        self.assertTrue(peak >= 4 * 1024 * 1024)
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+
+from better_test.compat import unittest
+
+from better_test.resources import auto_processes
+from better_test.resources import get_available_memory
+from better_test.resources import get_cgroups
+from better_test.resources import get_cpu_count
+from better_test.resources import get_cpu_quota
+from better_test.resources import get_cpus
+
+
+class CgroupTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, path, content):
+        path = os.path.join(self.root, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fobj:
+            fobj.write(content)
+
+    def test_no_limits(self):
+        cgroups = {'': '/'}
+        self.assertEqual(get_cpu_quota(self.root, cgroups), None)
+        self.assertEqual(get_cpu_count(self.root, cgroups), len(get_cpus()))
+        self.write('cpu.max', 'max 100000\n')
+        self.assertEqual(get_cpu_quota(self.root, cgroups), None)
+
+    def test_cpu_quota_v2(self):
+        self.write('cpu.max', '400000 100000\n')
+        self.write('ci/job/cpu.max', '150000 100000\n')
+        self.write('ci/job/test/cpu.max', 'max 100000\n')
+        # The tightest quota of the cgroup and its parents applies
+        self.assertEqual(get_cpu_quota(self.root, {'': '/ci/job/test'}), 1.5)
+        self.assertEqual(get_cpu_quota(self.root, {'': '/ci'}), 4.0)
+        self.assertEqual(
+            get_cpu_count(self.root, {'': '/ci/job/test'}),
+            min(2, len(get_cpus()))
+        )
+
+    def test_cpu_quota_v1(self):
+        self.write('cpu/cpu.cfs_quota_us', '-1\n')
+        self.write('cpu/cpu.cfs_period_us', '100000\n')
+        self.assertEqual(get_cpu_quota(self.root, {}), None)
+        self.write('cpu/cpu.cfs_quota_us', '50000\n')
+        self.assertEqual(get_cpu_quota(self.root, {}), 0.5)
+        self.assertEqual(get_cpu_count(self.root, {}), 1)
+
+    def test_memory(self):
+        mb = 1024 * 1024
+        self.write('ci/memory.max', str(1024 * mb))
+        self.write('ci/memory.current', str(200 * mb))
+        self.write('ci/job/memory.max', 'max')
+        self.write('ci/job/memory.current', str(100 * mb))
+        cgroups = {'': '/ci/job'}
+        self.assertEqual(get_available_memory(self.root, cgroups), 824 * mb)
+        # Workers of 400MB only fit twice
+        self.assertEqual(auto_processes(400 * mb, self.root, cgroups), min(
+            2, get_cpu_count(self.root, cgroups)
+        ))
+        # At least one worker is started, however large they get
+        self.assertEqual(auto_processes(4096 * mb, self.root, cgroups), 1)
+
+    def test_memory_v1(self):
+        mb = 1024 * 1024
+        self.write('memory/memory.limit_in_bytes', str(2 ** 63 - 4096))
+        self.write('memory/memory.usage_in_bytes', str(100 * mb))
+        available = get_available_memory(self.root, {})
+        self.assertTrue(available is None or available > 0)
+        self.write('memory/memory.limit_in_bytes', str(300 * mb))
+        self.assertEqual(get_available_memory(self.root, {}), 200 * mb)
+
+    def test_cpu_quota_v1_nested(self):
+        cgroups = {'cpu': '/docker/abc', 'memory': '/docker/abc'}
+        self.write('cpu,cpuacct/cpu.cfs_quota_us', '300000\n')
+        self.write('cpu,cpuacct/cpu.cfs_period_us', '100000\n')
+        self.write('cpu,cpuacct/docker/abc/cpu.cfs_quota_us', '200000\n')
+        self.write('cpu,cpuacct/docker/abc/cpu.cfs_period_us', '100000\n')
+        self.assertEqual(get_cpu_quota(self.root, cgroups), 2.0)
+        # Cgroups that aren't mounted fall back to the root of the hierarchy
+        self.assertEqual(
+            get_cpu_quota(self.root, {'cpu': '/docker/other'}), 3.0
+        )
+
+    def test_memory_v1_nested(self):
+        mb = 1024 * 1024
+        self.write('memory/memory.limit_in_bytes', str(2 ** 63 - 4096))
+        self.write('memory/memory.usage_in_bytes', str(900 * mb))
+        self.write('memory/docker/abc/memory.limit_in_bytes', str(300 * mb))
+        self.write('memory/docker/abc/memory.usage_in_bytes', str(100 * mb))
+        self.assertEqual(
+            get_available_memory(self.root, {'memory': '/docker/abc'}),
+            200 * mb
+        )
+
+    def test_get_cgroups(self):
+        self.write('cgroup', (
+            '12:memory:/docker/abc\n'
+            '4:cpu,cpuacct:/docker/abc\n'
+            '1:name=systemd:/docker/abc\n'
+            '0::/ci/job\n'
+        ))
+        cgroups = get_cgroups(os.path.join(self.root, 'cgroup'))
+        self.assertEqual(cgroups['memory'], '/docker/abc')
+        self.assertEqual(cgroups['cpu'], '/docker/abc')
+        self.assertEqual(cgroups['cpuacct'], '/docker/abc')
+        self.assertEqual(cgroups[''], '/ci/job')
+        self.assertEqual(get_cgroups(os.path.join(self.root, 'none')), {})
@@ -0,0 +1,87 @@
+from better_test.compat import unittest
+
+from better_test.scheduler import WorkStealingScheduler
+
+
+class WorkStealingSchedulerTests(unittest.TestCase):
+    def test_longest_first(self):
+        scheduler = WorkStealingScheduler(
+            {'a': 1, 'b': 5, 'c': 3}, ['a', 'b', 'c'], 10
+        )
+        batches = []
+        while scheduler.pending:
+            batches.append(scheduler.next_batch())
+        self.assertEqual(batches, [['b'], ['c'], ['a']])
+
+    def test_batches_shrink(self):
+        labels = ['test{0}'.format(i) for i in range(100)]
+        scheduler = WorkStealingScheduler({}, labels, 2)
+        sizes = []
+        while scheduler.pending:
+            sizes.append(len(scheduler.next_batch()))
+        self.assertEqual(sum(sizes), 100)
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+        self.assertEqual(sizes[-1], 1)
+
+    def test_unknown_timings_use_average(self):
+        scheduler = WorkStealingScheduler(
+            {'a': 2, 'b': 4}, ['a', 'b', 'c'], 1
+        )
+        self.assertEqual(scheduler.estimate(['c']), 3)
+
+    def test_requeue(self):
+        scheduler = WorkStealingScheduler(
+            {'a': 1, 'b': 5, 'c': 3}, ['a', 'b', 'c'], 1, batch_factor=1
+        )
+        self.assertEqual(scheduler.next_batch(), ['b', 'c', 'a'])
+        self.assertFalse(scheduler.pending)
+        scheduler.requeue(['c', 'a'])
+        self.assertEqual(scheduler.next_batch(), ['c', 'a'])
+
+    def test_first(self):
+        scheduler = WorkStealingScheduler(
+            {'a': 1, 'b': 5, 'c': 3, 'd': 4}, ['a', 'b', 'c', 'd'], 1,
+            batch_factor=1, first=['a', 'c']
+        )
+        self.assertEqual(scheduler.next_batch(), ['a'])
+        self.assertEqual(scheduler.next_batch(), ['c'])
+        self.assertEqual(scheduler.next_batch(), ['b', 'd'])
+
+    def test_classes_kept_together(self):
+        labels = ['app.A.test_{0}'.format(i) for i in range(4)] + [
+            'app.B.test_{0}'.format(i) for i in range(4)
+        ]
+        scheduler = WorkStealingScheduler(
+            dict((label, 1) for label in labels), labels, 2,
+            setup_costs={'app.A': 2, 'app.B': 1}
+        )
+        self.assertEqual(scheduler.estimate(labels[:2]), 4)
+        batches = []
+        while scheduler.pending:
+            batches.append(scheduler.next_batch())
+        self.assertEqual(batches, [labels[:4], labels[4:]])
+
+    def test_large_class_split(self):
+        labels = ['app.A.test_{0}'.format(i) for i in range(8)] + [
+            'app.B.test_0'
+        ]
+        scheduler = WorkStealingScheduler(
+            dict((label, 1) for label in labels), labels, 2,
+            setup_costs={'app.A': 1}
+        )
+        parts = sorted(
+            list(unit) for unit in scheduler.unit_weights
+            if unit[0].startswith('app.A.')
+        )
+        self.assertEqual(len(parts), 2)
+        self.assertEqual(sorted(sum(parts, [])), labels[:8])
+
+    def test_split_pays_for_setup(self):
+        labels = ['app.A.test_{0}'.format(i) for i in range(4)] + [
+            'app.B{0}.test_0'.format(i) for i in range(21)
+        ]
+        scheduler = WorkStealingScheduler(
+            dict((label, 1) for label in labels), labels, 4,
+            setup_costs={'app.A': 3}
+        )
+        self.assertIn(tuple(labels[:4]), scheduler.unit_weights)
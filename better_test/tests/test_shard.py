@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+
+from better_test.compat import unittest
+
+from better_test import core
+from better_test.database import Database
+from better_test.parallel import SilentMultiProcessingTextTestResult
+from better_test.utils import get_test_runner
+
+
+class ShardRunTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, '.better_test.db')
+
+    def run_shard(self, index, count):
+        # Like the test command: a shard starts from the stored timings and
+        # records its results to the same database
+        database = Database(self.path)
+        self.addCleanup(database.close)
+        recorder = database.start_run(record_statistics=False)
+        result = core.run(
+            ['better_test.harness.shard'],
+            {},
+            core.Config(
+                test_runner_class=get_test_runner(),
+                mode=core.PARALLEL,
+                timings=database.timings(),
+                processes=1,
+                recorder=recorder,
+                shard=(index, count),
+                setup_costs=database.setup_costs()
+            ),
+            real_result_class=SilentMultiProcessingTextTestResult
+        )
+        recorder.finish(result.success, None)
+        return list(result.timings)
+
+    def test_one_after_another(self):
+        ran = []
+        for index in range(3):
+            ran.extend(self.run_shard(index, 3))
+        self.assertEqual(sorted(ran), sorted(set(ran)))
+        self.assertEqual(len(ran), 7)
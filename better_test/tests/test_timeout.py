@@ -0,0 +1,74 @@
+import time
+
+from better_test.compat import unittest
+
+from better_test import core
+from better_test.harness import timeout as harness
+from better_test.parallel import ResultChannel
+from better_test.parallel import SilentMultiProcessingTextTestResult
+from better_test.parallel import can_dump_stacks
+from better_test.utils import get_test_runner
+
+
+class TimeoutTests(unittest.TestCase):
+    def test_timeout(self):
+        start = time.time()
+        result = core.run(
+            ['better_test.harness.timeout'],
+            {},
+            core.Config(
+                test_runner_class=get_test_runner(),
+                mode=core.STANDARD,
+                timings={},
+                processes=1,
+                timeout=20,
+            ),
+            real_result_class=SilentMultiProcessingTextTestResult
+        )
+        self.assertTrue(time.time() - start < 15)
+        self.assertEqual(result.failed_executors, [])
+        self.assertEqual(len(result.successes), 3)
+        self.assertEqual(len(result.errors), 1)
+        test, error = result.errors[0]
+        self.assertEqual(
+            test.qualname, 'better_test.harness.timeout.TimeoutTests.test_hang'
+        )
+        self.assertIn('did not finish within 0.5s', error)
+        if can_dump_stacks:
+            self.assertIn('test_hang', error.split('\n', 1)[1])
+
+
+class Connection(object):
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+class ResultChannelTests(unittest.TestCase):
+    def setUp(self):
+        self.connection = Connection()
+        self.channel = ResultChannel(
+            self.connection, batch_interval=60, timeout=1
+        )
+
+    def run_test(self, name, timing):
+        test = harness.TimeoutTests(name)
+        self.channel.start(test)
+        self.channel.record(test, [('addSuccess', ())], timing)
+
+    def sent(self):
+        return [method_name for method_name, _ in self.connection.sent]
+
+    def test_batch_timed_tests(self):
+        self.run_test('test_a', 0.1)
+        self.run_test('test_c', 0.1)
+        self.assertEqual(self.sent(), ['startTest', 'startTest'])
+
+    def test_send_close_to_timeout(self):
+        self.run_test('test_a', 0.1)
+        self.run_test('test_c', 0.9)
+        self.assertEqual(self.sent(), ['startTest', 'startTest', 'results'])
+        _, (_, records) = self.connection.sent[-1]
+        self.assertEqual(len(records), 2)
@@ -0,0 +1,174 @@
+from better_test.compat import unittest
+
+from better_test.utils import estimate_timings
+from better_test.utils import fixture_names
+from better_test.utils import name_to_label
+from better_test.utils import parse_processes
+from better_test.utils import parse_shard
+from better_test.utils import prioritize
+from better_test.utils import shard
+from better_test.utils import suite_to_labels
+from better_test.utils import weighted_partition
+
+
+class EstimateTimingsTests(unittest.TestCase):
+    timings = {
+        'app.tests.ModelTests.test_a': 1.0,
+        'app.tests.ModelTests.test_b': 3.0,
+        'app.tests.ViewTests.test_a': 8.0,
+        'app.other.FormTests.test_a': 12.0,
+        'lib.tests.UtilTests.test_a': 0.5,
+    }
+
+    def estimate(self, label):
+        return estimate_timings([label], self.timings)[label]
+
+    def test_known(self):
+        self.assertEqual(self.estimate('app.tests.ViewTests.test_a'), 8.0)
+
+    def test_class_average(self):
+        self.assertEqual(self.estimate('app.tests.ModelTests.test_c'), 2.0)
+
+    def test_module_average(self):
+        self.assertEqual(self.estimate('app.tests.NewTests.test_a'), 4.0)
+
+    def test_app_average(self):
+        self.assertEqual(self.estimate('app.new.NewTests.test_a'), 6.0)
+
+    def test_overall_average(self):
+        self.assertEqual(self.estimate('new.tests.NewTests.test_a'), 4.9)
+
+    def test_no_timings(self):
+        self.assertEqual(estimate_timings(['a.B.test_c'], {}), {
+            'a.B.test_c': 1.0
+        })
+
+
+class WeightedPartitionTests(unittest.TestCase):
+    def loads(self, partitions, weighted_data):
+        weights = dict((value, weight) for weight, value in weighted_data)
+        return sorted(
+            sum(weights[value] for value in partition)
+            for partition in partitions
+        )
+
+    def test_all_values_partitioned(self):
+        data = [(index % 7, index) for index in range(100)]
+        partitions = weighted_partition(data, 3)
+        self.assertEqual(
+            sorted(value for partition in partitions for value in partition),
+            list(range(100))
+        )
+
+    def test_refinement(self):
+        # Plain LPT ends up with 3 + 2 + 2 = 7 against 3 + 2 = 5 here, the
+        # even split needs the refinement pass.
+        data = [(3, 'a'), (3, 'b'), (2, 'c'), (2, 'd'), (2, 'e')]
+        self.assertEqual(self.loads(weighted_partition(data, 2), data), [
+            6, 6
+        ])
+
+    def test_deterministic(self):
+        data = [(index % 5, 'label{0}'.format(index)) for index in range(50)]
+        self.assertEqual(
+            weighted_partition(data, 4),
+            weighted_partition(list(reversed(data)), 4)
+        )
+
+
+class ShardTests(unittest.TestCase):
+    labels = ['app.T{0}.test'.format(index) for index in range(20)]
+    timings = dict(
+        ('app.T{0}.test'.format(index), float(index % 4 + 1))
+        for index in range(10)
+    )
+
+    def test_all_labels_once(self):
+        shards = [shard(self.labels, self.timings, index, 3)
+                  for index in range(3)]
+        self.assertEqual(
+            sorted(label for labels in shards for label in labels),
+            sorted(self.labels)
+        )
+        for labels in shards:
+            self.assertEqual(labels, sorted(labels, key=self.labels.index))
+
+    def test_balanced(self):
+        estimates = estimate_timings(self.labels, self.timings)
+        loads = [
+            sum(estimates[label]
+                for label in shard(self.labels, self.timings, index, 3))
+            for index in range(3)
+        ]
+        self.assertTrue(max(loads) - min(loads) <= 1)
+
+    def test_stable(self):
+        self.assertEqual(
+            shard(self.labels, self.timings, 1, 3),
+            shard(list(reversed(self.labels)), self.timings, 1, 3)[::-1]
+        )
+
+    def test_classes_together(self):
+        labels = ['app.A.test_{0}'.format(index) for index in range(4)] + [
+            'app.B.test', 'app.C.test', 'app.D.test'
+        ]
+        timings = dict((label, 1.0) for label in labels)
+        shards = [shard(labels, timings, index, 2, {'app.D': 3.0})
+                  for index in range(2)]
+        # A stays in one shard, D's setup makes it weigh as much as A
+        for labels_of_shard in shards:
+            self.assertIn(len(set(labels[:4]) & set(labels_of_shard)), (0, 4))
+        self.assertEqual(sorted(map(len, shards)), [2, 5])
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard('1/4'), (0, 4))
+        self.assertEqual(parse_shard('4/4'), (3, 4))
+        for text in ('0/4', '5/4', '1', 'a/b', '1/0'):
+            self.assertRaises(ValueError, parse_shard, text)
+
+    def test_parse_processes(self):
+        self.assertEqual(parse_processes('4'), 4)
+        self.assertEqual(parse_processes('auto'), None)
+        for text in ('0', '-1', 'a', '1.5', ''):
+            self.assertRaises(ValueError, parse_processes, text)
+
+
+class SuiteToLabelsTests(unittest.TestCase):
+    def test_nested_suites(self):
+        suite = unittest.TestSuite([
+            unittest.TestSuite([SuiteToLabelsTests('test_nested_suites')]),
+            SuiteToLabelsTests('test_nested_suites'),
+        ])
+        self.assertEqual(
+            suite_to_labels(suite, unittest.TestResult()),
+            ['better_test.tests.test_utils.SuiteToLabelsTests.'
+             'test_nested_suites'] * 2
+        )
+
+
+class LabelTests(unittest.TestCase):
+    def test_name_to_label(self):
+        self.assertEqual(name_to_label('a.B.test_c'), 'a.B.test_c')
+        self.assertEqual(name_to_label('setUpClass (a.B)'), 'a.B')
+        self.assertEqual(name_to_label('tearDownModule (a)'), 'a')
+        self.assertEqual(
+            name_to_label('unittest.loader._FailedTest.a.tests'), 'a.tests'
+        )
+        self.assertEqual(
+            name_to_label('unittest.loader.ModuleImportFailure'), None
+        )
+
+    def test_fixture_names(self):
+        self.assertEqual(fixture_names('a.tests.B.test_c'), [
+            'setUpClass (a.tests.B)',
+            'tearDownClass (a.tests.B)',
+            'setUpModule (a.tests)',
+            'tearDownModule (a.tests)',
+        ])
+
+    def test_prioritize(self):
+        labels = ['a.A.test_a', 'a.B.test_a', 'a.B.test_b', 'b.C.test_a']
+        self.assertEqual(
+            prioritize(labels, ['b.C.test_a', 'a.B', 'x.Y.test_z']),
+            ['b.C.test_a', 'a.B.test_a', 'a.B.test_b']
+        )
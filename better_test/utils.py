@@ -1,8 +1,13 @@
 from contextlib import contextmanager
+from bisect import bisect_left
+import heapq
 import os
+import socket
 import sys
 import itertools
 
+from .compat import unittest
+
 
 class DisableMigrations(object):
     def __contains__(self, _):
@@ -23,13 +28,285 @@ def simple_weighted_partition(weighted_data, partitions):
     return results
 
 
+def estimate_timings(labels, timings, default=1.0):
+    """
+    Estimate the duration of each label. Labels with a recorded timing use it,
+    others use the average recorded timing of their class, module or app
+    (whichever is the most specific one with any timings), falling back to the
+    overall average and finally to `default` if there are no timings at all.
+    """
+    totals = {}
+    for label, timing in timings.items():
+        class_name = label.rpartition('.')[0]
+        for key in (class_name, class_name.rpartition('.')[0],
+                    label.partition('.')[0], ''):
+            total = totals.get(key)
+            if total is None:
+                totals[key] = [timing, 1]
+            else:
+                total[0] += timing
+                total[1] += 1
+    averages = dict(
+        (key, total / count) for key, (total, count) in totals.items()
+    )
+    fallback = averages.get('', default)
+    estimates = {}
+    for label in labels:
+        timing = timings.get(label)
+        if timing is None:
+            class_name = label.rpartition('.')[0]
+            timing = averages.get(class_name)
+        if timing is None:
+            timing = averages.get(class_name.rpartition('.')[0])
+        if timing is None:
+            timing = averages.get(label.partition('.')[0], fallback)
+        estimates[label] = timing
+    return estimates
+
+
+def weighted_partition(weighted_data, partitions, max_rounds=None):
+    """
+    Split `(weight, value)` pairs into `partitions` lists of roughly equal
+    total weight.
+
+    Uses the longest processing time first heuristic (each item, heaviest
+    first, goes to the currently lightest partition), then repeatedly moves an
+    item from the heaviest to the lightest partition or swaps a pair of items
+    between them, as long as that narrows the gap between the two. The result
+    only depends on the weights and values, not on the order of the input.
+    """
+    weights = [[] for _ in range(partitions)]
+    values = [[] for _ in range(partitions)]
+    loads = [0] * partitions
+    heap = [(0, index) for index in range(partitions)]
+    for weight, value in sorted(weighted_data,
+                                key=lambda item: (-item[0], item[1])):
+        load, index = heapq.heappop(heap)
+        weights[index].append(weight)
+        values[index].append(value)
+        loads[index] = load + weight
+        heapq.heappush(heap, (loads[index], index))
+
+    # Each partition is sorted heaviest first, refinement wants them sorted
+    # lightest first.
+    for index in range(partitions):
+        weights[index].reverse()
+        values[index].reverse()
+
+    if max_rounds is None:
+        max_rounds = 4 * partitions
+    for _ in range(max_rounds if partitions > 1 else 0):
+        heaviest = max(range(partitions), key=loads.__getitem__)
+        lightest = min(range(partitions), key=loads.__getitem__)
+        gap = loads[heaviest] - loads[lightest]
+        if gap <= 0:
+            break
+        move = _best_exchange(weights[heaviest], weights[lightest], gap)
+        if move is None:
+            break
+        give, take = move
+        given = _pop(weights, values, heaviest, give)
+        delta = given[0]
+        if take is not None:
+            taken = _pop(weights, values, lightest, take)
+            delta -= taken[0]
+            _insert(weights, values, heaviest, taken)
+        _insert(weights, values, lightest, given)
+        loads[heaviest] -= delta
+        loads[lightest] += delta
+
+    return values
+
+
+def _best_exchange(heavy, light, gap):
+    """
+    Find the item in `heavy` to move to `light` (and optionally the item in
+    `light` to move back in exchange) that brings both closest to even. Both
+    lists are sorted lightest first. Returns `(give, take)` indexes, `take`
+    being `None` for a plain move, or `None` if no exchange narrows the gap.
+    """
+    half = gap / 2.0
+    best = None
+    best_distance = half
+    # Plain move: the item closest to half the gap.
+    index = bisect_left(heavy, half)
+    for candidate in (index - 1, index):
+        if 0 <= candidate < len(heavy) and 0 < heavy[candidate] < gap:
+            distance = abs(heavy[candidate] - half)
+            if distance < best_distance:
+                best, best_distance = (candidate, None), distance
+    # Swap: for each item given, the taken item closest to `give - half`. The
+    # target grows with the given item, so a single pointer suffices.
+    pointer = 0
+    for give, weight in enumerate(heavy):
+        target = weight - half
+        while pointer < len(light) and light[pointer] < target:
+            pointer += 1
+        for take in (pointer - 1, pointer):
+            if 0 <= take < len(light):
+                difference = weight - light[take]
+                if 0 < difference < gap:
+                    distance = abs(difference - half)
+                    if distance < best_distance:
+                        best, best_distance = (give, take), distance
+    return best
+
+
+def _pop(weights, values, partition, index):
+    return weights[partition].pop(index), values[partition].pop(index)
+
+
+def _insert(weights, values, partition, item):
+    weight, value = item
+    position = bisect_left(weights[partition], weight)
+    weights[partition].insert(position, weight)
+    values[partition].insert(position, value)
+
+
+def shard(labels, timings, index, count, setup_costs=None):
+    """
+    The labels of shard `index` (counting from 0) out of `count` shards of
+    roughly equal estimated duration, in their original order. The tests of
+    a class stay together, so only one shard sets the class up; a class
+    weighs its tests' durations plus `setup_costs[class]`. Every label goes
+    to exactly one shard, and the split only depends on the labels, timings
+    and setup costs, so jobs starting with the same database agree on it.
+    """
+    from .scheduler import group_by_class
+    setup_costs = setup_costs or {}
+    estimates = estimate_timings(labels, timings)
+    units = [
+        (sum(estimates[label] for label in unit) +
+         setup_costs.get(unit[0].rpartition('.')[0], 0), tuple(unit))
+        for unit in group_by_class(sorted(set(labels)))
+    ]
+    chosen = set(
+        label for unit in weighted_partition(units, count)[index]
+        for label in unit
+    )
+    return [label for label in labels if label in chosen]
+
+
+def parse_shard(text):
+    """
+    Turn `i/N` into the zero based `(index, count)` of a shard. Raises
+    ValueError for anything else.
+    """
+    index, separator, count = text.partition('/')
+    if not separator or not index.isdigit() or not count.isdigit() or not (
+            1 <= int(index) <= int(count)):
+        raise ValueError("Not a shard i/N with 1 <= i <= N: {0}".format(text))
+    return int(index) - 1, int(count)
+
+
+def parse_processes(text):
+    """
+    Turn a positive number of processes into an int, or `auto` into `None`.
+    Raises ValueError for anything else.
+    """
+    if text == 'auto':
+        return None
+    if not text.isdigit() or int(text) < 1:
+        raise ValueError(
+            "Not a number of processes or 'auto': {0}".format(text)
+        )
+    return int(text)
+
+
+def timeout(seconds):
+    """
+    Decorator to give a test method, or all tests of a class, their own
+    timeout instead of the one given by ``--timeout``. Use 0 to disable the
+    timeout.
+    """
+    def decorator(test):
+        test.better_test_timeout = seconds
+        return test
+    return decorator
+
+
+def get_timeout(test, default=0):
+    """
+    The timeout in seconds for `test`, 0 if it has none.
+    """
+    method = getattr(test, getattr(test, '_testMethodName', ''), None)
+    for obj in (method, test.__class__):
+        value = getattr(obj, 'better_test_timeout', None)
+        if value is not None:
+            return value
+    return default
+
+
+FIXTURES = ('setUpClass', 'tearDownClass', 'setUpModule', 'tearDownModule')
+
+
+def name_to_label(name):
+    """
+    Turn the name a test result was recorded under back into a label to run
+    it with. Errors in class or module fixtures are recorded as
+    `setUpClass (app.tests.Class)`, and import errors as tests of
+    `unittest.loader`; those become labels of the class or module. Returns
+    `None` where that's not possible.
+    """
+    if name.endswith(')') and ' (' in name:
+        return name[name.index(' (') + 2:-1]
+    elif name.startswith('unittest.loader.'):
+        parts = name.split('.', 3)
+        return parts[3] if len(parts) == 4 else None
+    return name
+
+
+def fixture_names(label):
+    """
+    The names errors in the class or module fixtures of the test `label` are
+    recorded under.
+    """
+    class_name = label.rpartition('.')[0]
+    module = class_name.rpartition('.')[0]
+    return [
+        '{0} ({1})'.format(fixture, name)
+        for fixture, name in zip(FIXTURES, (class_name, class_name,
+                                            module, module))
+    ]
+
+
+def prioritize(labels, priority):
+    """
+    The labels out of `labels` that match one of the labels in `priority`
+    (the test itself or its class, module or app), in the order of
+    `priority`.
+    """
+    ranks = dict((label, rank) for rank, label in enumerate(priority))
+    matches = []
+    for index, label in enumerate(labels):
+        name = label
+        while name:
+            if name in ranks:
+                matches.append((ranks[name], index, label))
+                break
+            name = name.rpartition('.')[0]
+    return [label for _, _, label in sorted(matches)]
+
+
+def iter_tests(suite):
+    """
+    Yield the individual tests of a (possibly nested) test suite.
+    """
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for subtest in iter_tests(test):
+                yield subtest
+        else:
+            yield test
+
+
 def suite_to_labels(suite, result):
     """
     Transform a unittest.TestSuite to a list of test labels that can be used
     by django.test.DiscoveryRunner.run_tests.
     """
     labels = []
-    for test in suite._tests:
+    for test in iter_tests(suite):
         klass = test.__class__
         name = klass.__name__
         module = klass.__module__
@@ -62,7 +339,7 @@ def null_stdout():
 def serialize(test):
     """
     Serializes a test (which can either be a TestCase-like or an ErrorHolder)
-    for safe transport via a Queue.
+    for safe transport through a pipe.
     ErrorHolder (if actual test setup failed, not anything during test run) is
     special cased because it's a dynamic class and isn't quite the same as
     normal tests.
@@ -99,9 +376,101 @@ def get_test_runner(name=None):
     return get_runner(settings, name)
 
 
+def get_rss():
+    """
+    Resident set size of the current process in bytes. Falls back to the peak
+    resident set size where the current one is not available, and to 0 where
+    neither is.
+    """
+    try:
+        with open('/proc/self/statm') as fobj:
+            return int(fobj.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak
+    return peak * 1024
+
+
 def get_settings_dict():
     from django.conf import settings
     return dict(
         (key, getattr(settings, key)) for key in dir(settings)
         if key.upper() == key
     )
+
+
+def get_settings_bootstrap():
+    """
+    What a worker process needs to set up the same settings as this one, as
+    `(settings module, overrides)`. Rather than all settings, only those
+    assigned since the settings module was loaded are sent along, and
+    `DATABASES`, whose names setting up the test databases changes in place.
+    Settings that were not loaded from a module (see `settings.configure`)
+    are all overrides, with no module.
+    """
+    import importlib
+    from django.conf import global_settings
+    from django.conf import settings
+    module_name = getattr(settings, 'SETTINGS_MODULE', None)
+    if not module_name:
+        return None, get_settings_dict()
+    module = importlib.import_module(module_name)
+    overrides = {}
+    for key in dir(settings):
+        if key.upper() != key or key == 'SETTINGS_MODULE':
+            continue
+        value = getattr(settings, key)
+        original = getattr(module, key, getattr(global_settings, key, None))
+        if value is original:
+            continue
+        try:
+            if value == original:
+                continue
+        except Exception:
+            pass
+        overrides[key] = value
+    overrides['DATABASES'] = settings.DATABASES
+    return module_name, overrides
+
+
+def parse_address(address):
+    """
+    Turn `host:port` into a `(host, port)` tuple. The host defaults to the
+    loopback interface. Raises ValueError for anything else.
+    """
+    host, separator, port = address.rpartition(':')
+    if not separator or not port.isdigit():
+        raise ValueError("Not a host:port address: {0}".format(address))
+    return host or '127.0.0.1', int(port)
+
+
+def is_loopback(host):
+    """
+    Whether `host` only resolves to loopback addresses, which only this
+    machine can connect to.
+    """
+    try:
+        addresses = socket.getaddrinfo(host, None)
+    except socket.gaierror:
+        return False
+    return all(
+        sockaddr[0].startswith('127.') or sockaddr[0] == '::1'
+        for _, _, _, _, sockaddr in addresses
+    )
+
+
+def get_authkey(authkey=None):
+    """
+    The key pools and agents authenticate each other with: `authkey` if
+    given, the SECRET_KEY setting otherwise.
+    """
+    if authkey is None:
+        from django.conf import settings
+        authkey = settings.SECRET_KEY
+    return authkey.encode('utf-8')